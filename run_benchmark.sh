@@ -0,0 +1,6 @@
+#!/bin/bash
+#
+# Please use this shell script to benchmark the ETL and the database insertion methods on synthetic data.
+# Extra arguments are passed to the benchmark, e.g. ./run_benchmark.sh --rows 1000000 --db-uri postgresql://...
+#
+python3 ./src/benchmark/run_benchmark.py --rows 20000 "$@"
@@ -6,27 +6,47 @@ Date: 3/13/2019
 """
 import os
 import sys
-import logging
-import numpy as np
-import pandas as pd
+import argparse
+import itertools
 
 
-# Import user libraries
+# Import user libraries. Only the light modules are imported here, the ETL, pandas and the database
+# libraries are imported by the commands that need them so that e.g. --help and stats start quickly.
 from configuration import Configuration
-from db.sql_metadata_service import SQLMetadataService
-from logger.logger import get_logger
-from etl.ETL import ETL
+from logger.logger import CONSOLE, get_logger
+from logger.profiler import StageProfiler
 
-# Get the configuration object to access config variables
-configuration = Configuration()
+# Commands of the application, a command line without one loads the input file as the load command does
+COMMANDS = ['load', 'validate', 'stats']
+
+# Configuration and logger objects, created by initialize() once the command line has been parsed
+configuration = None
+logger = None
+
+
+def initialize():
+    """ Creates the configuration object to access config variables and the logger object with the given configuration
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    ----------
+    None
+    """
+    global configuration, logger
+
+    configuration = Configuration()
+    logger = get_logger(
+        logging_level=configuration.get_logging_level(),
+        logs_output_file_path=configuration.get_logs_output_file_path(),
+        logs_rotate_when=configuration.get_logs_rotate_when(),
+        logs_rotate_backup_count=configuration.get_logs_rotate_backup_count(),
+        logs_format=configuration.get_logs_format(),
+        logs_rate_limit=configuration.get_logs_rate_limit()
+    )
 
-# Create logger object with given configuration
-logger = get_logger(
-    logging_level=configuration.get_logging_level(),
-    logs_output_file_path=configuration.get_logs_output_file_path(),
-    logs_rotate_when=configuration.get_logs_rotate_when(),
-    logs_rotate_backup_count=configuration.get_logs_rotate_backup_count()
-)
 
 def main(argv):
     """ Main function and the entry point of the lending club loan ETL application.
@@ -40,42 +60,78 @@ def main(argv):
     None
     """
 
-    logger.info("Lending Club ETL application has started!")
-    print("Lending Club ETL application has started!")
+    arguments = parse_arguments(argv)
 
-    # Second command line argument is the input file (csv file)
-    if len(argv) < 2:
-        logger.error("Missing input csv file! Exiting...")
+    # Second command line argument is the input file (csv file). It is checked before the logger is created.
+    if arguments.command in ('load', 'validate') and arguments.csv_filename is None:
         print("Missing input csv file! Exiting...")
         sys.exit()
 
+    if configuration is None:
+        initialize()
+
+    logger.info("Lending Club ETL application has started!", extra=CONSOLE)
+
+    # In service mode new csv files of the watched folder are ingested until the service is stopped
+    if arguments.command == 'watch':
+        watch(arguments.watch)
+        return
+
+    if arguments.command == 'validate':
+        validate(arguments.csv_filename)
+        return
+
+    if arguments.command == 'stats':
+        stats(arguments.reasons)
+        return
+
     # Get csv file name
-    csv_filename = argv[1]
+    csv_filename = arguments.csv_filename
 
+    # Every stage is timed by the profiler, cProfile and tracemalloc results are dumped if requested
+    profiler = StageProfiler(logger, configuration.get_profiling_enabled())
+    if arguments.profile:
+        profiler.start_dumps(os.path.dirname(configuration.get_logs_output_file_path()))
 
-    # Load csv file as a pandas dataframe
-    logger.info("Csv file is being loaded to a pandas dataframe")
-    print("Csv file is being loaded to a pandas dataframe")
-    loan_df = pd.read_csv(csv_filename, low_memory=False)
-    logger.info(str(argv[1]) + " has been loaded into dataframe")
-    print("Csv file has been loaded into dataframe")
+    try:
+        load(csv_filename, arguments.rebuild_cache, arguments.restart, profiler)
+    finally:
+        profiler.stop_dumps()
 
-    # In case we need the original data create a copy
-    original_df = loan_df.copy()
 
-    # Instantiate an etl object to be used for data cleaning and validation
-    etl = ETL(logger)
-    logger.info("Imported dataframe is being cleaned and validated...")
-    print("Imported dataframe is being cleaned and validated...")
-    loan_df = etl.clean_and_validate(loan_df)
-    logger.info("Imported dataframe has been cleaned and validated.")
-    print("Imported dataframe has been cleaned and validated")
+def load(csv_filename, rebuild_cache, restart, profiler):
+    """ Loads, cleans and validates the csv file and inserts it to DB
+
+    Parameters
+    ----------
+    csv_filename (Type: str): Input csv file
+    rebuild_cache (Type: bool): Whether cached dataframes should be ignored and rebuilt
+    restart (Type: bool): Whether an interrupted chunked load of the file should be started over rather than resumed
+    profiler (Type: StageProfiler): Profiler timing every stage
+
+    Returns
+    ----------
+    None
+    """
+    from db.sql_metadata_service import SQLMetadataService
+    from etl.parallel_etl import ParallelETL
+    from etl.fingerprint_index import FingerprintIndex
+    from cache.frame_cache import FrameCache
+    from etl.hashing import hash_file
 
     # Get the db configuration
     chunksize = configuration.get_insertion_chunksize()
     method = configuration.get_insertion_method()
+    load_mode = configuration.get_load_mode()
     table_name = configuration.get_db_table_name()
     sql_alchemy_conn = configuration.get_db_uri()
+    streaming_chunksize = configuration.get_streaming_chunksize()
+    out_of_core_memory_mb = configuration.get_out_of_core_memory_mb()
+    etl_workers = configuration.get_etl_workers()
+    load_workers = configuration.get_load_workers()
+    cache_dir = configuration.get_cache_dir()
+    dedup_index_file = configuration.get_dedup_index_file()
+    dedup_key_columns = configuration.get_dedup_key_columns()
 
     # Instantiate SQLMetadataService.
     metadata_service = SQLMetadataService(sql_alchemy_conn,logger)
@@ -83,15 +139,446 @@ def main(argv):
     # Initialize SQLMetadataService object which creates the loan table in the DB
     metadata_service.initialize_metadata_source()
 
+    # Rows whose fingerprint is in the persistent index have been loaded before and are dropped as duplicates.
+    # A replaced table only holds the rows of this load, so the index is cleared first.
+    fingerprint_index = FingerprintIndex(dedup_index_file) if dedup_index_file else None
+    if fingerprint_index is not None and load_mode != 'incremental':
+        fingerprint_index.clear()
+
+    # Chunked loads commit every chunk with a checkpoint. The chunks of the file committed by an interrupted load are skipped,
+    # and the fingerprints of their rows are restored so that their duplicates in the remaining chunks are still removed.
+    chunked = bool(out_of_core_memory_mb or streaming_chunksize)
+    file_hash = hash_file(csv_filename) if chunked else None
+    checkpoints = metadata_service.get_checkpoints(table_name, file_hash) if chunked and not restart else []
+    skip_rows = 0
+    for chunk_start, chunk_stop, fingerprints in checkpoints:
+        if chunk_start != skip_rows:
+            break
+        skip_rows = chunk_stop
+    if skip_rows:
+        logger.info("Resuming the interrupted load of " + str(csv_filename) + " after its first " + str(skip_rows) + " rows",
+                    extra=CONSOLE)
+
+    # Files larger than the memory are cleaned in partitions spilled to disk, which are inserted one at a time
+    if out_of_core_memory_mb:
+        from etl.out_of_core_etl import OutOfCoreETL
+
+        etl = OutOfCoreETL(logger, out_of_core_memory_mb, configuration.get_spill_dir(), etl_workers, profiler,
+                           dedup_key_columns, fingerprint_index)
+        restore_checkpoint_fingerprints(etl, checkpoints, skip_rows)
+        stream_csv_into_db(etl.clean_csv(csv_filename, skip_rows), etl, metadata_service, chunksize, table_name, method, load_mode,
+                           load_workers, file_hash, profiler)
+        return
+
+    # Instantiate an etl object to be used for data cleaning and validation.
+    # In streaming mode a single etl object is used for all chunks so that duplicates are removed across chunks.
+    etl = ParallelETL(logger, etl_workers, streaming=bool(streaming_chunksize), profiler=profiler,
+                      key_columns=dedup_key_columns, fingerprint_index=fingerprint_index)
+
+    if streaming_chunksize:
+        logger.info("Csv file is being streamed to DB in chunks of " + str(streaming_chunksize) + " rows", extra=CONSOLE)
+        restore_checkpoint_fingerprints(etl, checkpoints, skip_rows)
+        stream_csv_into_db(read_and_clean_chunks(csv_filename, streaming_chunksize, etl, profiler, skip_rows), etl, metadata_service,
+                           chunksize, table_name, method, load_mode, load_workers, file_hash, profiler)
+        return
+
+    # Cleaned dataframes of unchanged input files, and the rows rejected while cleaning them, are loaded from the cache.
+    # They do not depend on the fingerprint index or the key columns only if whole rows are deduplicated within the file.
+    frame_cache = FrameCache(cache_dir, logger, configuration.get_cache_max_mb()) if cache_dir else None
+    cache_key = frame_cache.get_key(csv_filename) if frame_cache else None
+    loan_df = None
+    rejected_df = None
+    if frame_cache and not rebuild_cache and fingerprint_index is None and dedup_key_columns is None:
+        loan_df = frame_cache.load('clean', cache_key)
+        rejected_df = frame_cache.load('rejected', cache_key)
+
+    if loan_df is None or rejected_df is None:
+        loan_df, rejected_df = load_and_clean(csv_filename, etl, frame_cache, cache_key, rebuild_cache, profiler)
+
+    # Insert cleaned and validated data to DB. Secondary indexes are dropped during the bulk load and rebuilt after it.
+    # The rows, the rejected rows and the rollups are committed together, and the fingerprints of the rows only once they are.
+    logger.info("Data is being inserted to DB...", extra=CONSOLE)
+    try:
+        metadata_service.drop_indexes(table_name)
+        with profiler.stage('insert_into_db', rows=len(loan_df)) as record:
+            record['rejected_rows'] = len(rejected_df)
+            metadata_service.load_chunk(loan_df, rejected_df, chunksize, table_name, method, load_mode,
+                                        'append' if load_mode == 'incremental' else 'replace', load_workers)
+
+    except (Exception) as e:
+            etl.discard_fingerprints()
+            logger.error("DB insertion failed! " + str(e), extra=CONSOLE)
+            return
+
+    etl.commit_fingerprints()
+    with profiler.stage('create_indexes'):
+        metadata_service.create_indexes(table_name)
+    logger.info("Insertion to DB is completed", extra=CONSOLE)
+
+    with profiler.stage('export_features'):
+        metadata_service.export_features(table_name)
+
+
+def watch(watch_dir):
+    """ Runs the ingestion service that watches the given folder and ingests new csv files until it is stopped
+
+    Parameters
+    ----------
+    watch_dir (Type: str): Folder watched for new csv files
+
+    Returns
+    ----------
+    None
+    """
+    import asyncio
+    from db.sql_metadata_service import SQLMetadataService
+    from etl.fingerprint_index import FingerprintIndex
+    from service.ingestion_service import IngestionService
+
+    # Instantiate SQLMetadataService and create the loan table in the DB
+    metadata_service = SQLMetadataService(configuration.get_db_uri(), logger)
+    metadata_service.initialize_metadata_source()
+
+    dedup_index_file = configuration.get_dedup_index_file()
+    service = IngestionService(logger, metadata_service, watch_dir,
+                               streaming_chunksize=configuration.get_streaming_chunksize(),
+                               etl_workers=configuration.get_etl_workers(),
+                               chunksize=configuration.get_insertion_chunksize(),
+                               table_name=configuration.get_db_table_name(),
+                               method=configuration.get_insertion_method(),
+                               load_mode=configuration.get_load_mode(),
+                               load_workers=configuration.get_load_workers(),
+                               poll_interval=configuration.get_watch_poll_interval(),
+                               queue_size=configuration.get_pipeline_queue_size(),
+                               profiling_enabled=configuration.get_profiling_enabled(),
+                               key_columns=configuration.get_dedup_key_columns(),
+                               fingerprint_index=FingerprintIndex(dedup_index_file) if dedup_index_file else None)
+    asyncio.run(service.run())
+
+
+def validate(csv_filename):
+    """ Cleans and validates the csv file without connecting to DB, i.e. a dry run of the load,
+    and prints the number of rows that would be loaded and rejected
+
+    Parameters
+    ----------
+    csv_filename (Type: str): Input csv file
+
+    Returns
+    ----------
+    None
+    """
+    from etl.ETL import ETL
+    from etl.schema import read_loan_csv
+
+    # Duplicates are only removed within the file, the persistent fingerprint index is neither read nor updated
+    etl = ETL(logger, key_columns=configuration.get_dedup_key_columns())
+
+    logger.info("Csv file is being loaded to a pandas dataframe", extra=CONSOLE)
+    loan_df = read_loan_csv(csv_filename, logger)
+    rows = len(loan_df)
+
+    logger.info("Imported dataframe is being cleaned and validated...", extra=CONSOLE)
+    loan_df = etl.clean_and_validate(loan_df)
+    rejected_df = etl.pop_rejected_rows()
+    log_validation_counts(etl)
+
+    print(str(rows) + " rows read, " + str(rows - len(loan_df) - len(rejected_df)) + " duplicates, " +
+          str(len(loan_df)) + " valid and " + str(len(rejected_df)) + " rejected")
+    for key, count in sorted(etl.repair_counts.items()):
+        print("  cleaning rule " + key + " repaired " + str(count) + " values")
+    for reason_code, count in sorted(etl.violation_counts.items()):
+        print("  validation rule " + reason_code + " rejected " + str(count) + " rows")
+
+
+def stats(reasons):
+    """ Prints the number of rows and the version of the loan table, its quarantine table and its rollup tables
+
+    Parameters
+    ----------
+    reasons (Type: bool): Whether the number of quarantined rows by reason codes should be printed as well
+
+    Returns
+    ----------
+    None
+    """
+    import sqlalchemy
+    from db.table_stats import get_table_stats, get_quarantine_reasons
+
+    table_name = configuration.get_db_table_name()
+    try:
+        engine = sqlalchemy.create_engine(configuration.get_db_uri())
+        table_stats = get_table_stats(engine, table_name)
+        quarantine_reasons = get_quarantine_reasons(engine, table_name) if reasons else []
+        engine.dispose()
+    except (Exception) as e:
+        logger.error("Table statistics could not be read! " + str(e), extra=CONSOLE)
+        return
+
+    if not table_stats:
+        print("Table " + table_name + " does not exist")
+    for name, rows, version in table_stats:
+        print(name + ": " + str(rows) + " rows, version " + (str(version) if version is not None else "unknown"))
+    for reason_codes, rows in quarantine_reasons:
+        print("  " + str(reason_codes) + ": " + str(rows) + " rows")
+
+
+def parse_arguments(argv):
+    """ Parses the command line arguments. Without a command the legacy command line is parsed,
+    i.e. an input file to be loaded or --watch DIR.
+
+    Parameters
+    ----------
+    argv (Type: str list): Command line arguments
+
+    Returns
+    ----------
+    arguments (Type: argparse.Namespace): Parsed arguments, with the command in arguments.command
+    """
+    parser = argparse.ArgumentParser(prog=argv[0], description="Lending Club loan ETL application. "
+                                     "Commands: " + ", ".join(COMMANDS) + " (see <command> --help). "
+                                     "Without a command the input file is loaded.")
+
+    if len(argv) > 1 and argv[1] in COMMANDS:
+        subparsers = parser.add_subparsers(dest='command')
+
+        load_parser = subparsers.add_parser('load', help="Load, clean, validate the input file and insert it to DB")
+        load_parser.add_argument('csv_filename', nargs='?', help="Input csv file")
+        add_load_arguments(load_parser)
+
+        validate_parser = subparsers.add_parser('validate', help="Clean and validate the input file without writing to DB")
+        validate_parser.add_argument('csv_filename', nargs='?', help="Input csv file")
+
+        stats_parser = subparsers.add_parser('stats', help="Print the row counts and versions of the loan tables")
+        stats_parser.add_argument('--reasons', action='store_true',
+                                  help="Also print the number of quarantined rows by reason codes")
+
+        return parser.parse_args(argv[1:])
+
+    parser.add_argument('csv_filename', nargs='?', help="Input csv file")
+    add_load_arguments(parser)
+    parser.add_argument('--watch', metavar='DIR',
+                        help="Run as a service that ingests the csv files arriving in the given folder")
+
+    arguments = parser.parse_args(argv[1:])
+    arguments.command = 'watch' if arguments.watch is not None else 'load'
+    return arguments
+
+
+def add_load_arguments(parser):
+    """ Adds the options of the load command to the given parser
+
+    Parameters
+    ----------
+    parser (Type: argparse.ArgumentParser): Parser of the load command or of the legacy command line
+
+    Returns
+    ----------
+    None
+    """
+    parser.add_argument('--rebuild-cache', action='store_true',
+                        help="Parse and clean the input file even if it is cached, and rebuild the cache")
+    parser.add_argument('--profile', action='store_true',
+                        help="Write cProfile and tracemalloc results to the logs folder")
+    parser.add_argument('--restart', action='store_true',
+                        help="Start an interrupted chunked load of the input file over instead of resuming it")
+
+
+def load_and_clean(csv_filename, etl, frame_cache, cache_key, rebuild_cache, profiler):
+    """ Loads the csv file (or its cached raw dataframe), cleans and validates it, and caches both dataframes
+
+    Parameters
+    ----------
+    csv_filename (Type: str): Input csv file
+    etl (Type: ParallelETL): ETL object used to clean and validate the dataframe
+    frame_cache (Type: FrameCache): Dataframe cache, None if caching is disabled
+    cache_key (Type: str): Cache key of the input file
+    rebuild_cache (Type: bool): Whether the cached raw dataframe should be ignored
+    profiler (Type: StageProfiler): Profiler timing every stage
+
+    Returns
+    ----------
+    loan_df (Type: pandas.DataFrame): Cleaned and validated dataframe
+    rejected_df (Type: pandas.DataFrame): Rows rejected by the validation rules, with their reason codes
+    """
+    from etl.schema import read_loan_csv
+    from etl.compaction import compact_frame, get_memory_usage_mb
 
-    # Insert cleaned and validated data to DB
-    print("Data is being inserted to DB...")
+    loan_df = None
+    if frame_cache and not rebuild_cache:
+        loan_df = frame_cache.load('raw', cache_key)
+
+    if loan_df is None:
+        # Load csv file as a pandas dataframe
+        logger.info("Csv file is being loaded to a pandas dataframe", extra=CONSOLE)
+        with profiler.stage('read_csv') as record:
+            loan_df = read_loan_csv(csv_filename, logger)
+            record['rows'] = len(loan_df)
+        logger.info(str(csv_filename) + " has been loaded into dataframe", extra=CONSOLE)
+
+        if frame_cache:
+            frame_cache.save('raw', cache_key, loan_df)
+
+    logger.info("Imported dataframe is being cleaned and validated...", extra=CONSOLE)
+    loan_df = etl.clean_and_validate(loan_df)
+    rejected_df = etl.pop_rejected_rows()
+    logger.info("Imported dataframe has been cleaned and validated", extra=CONSOLE)
+    log_validation_counts(etl)
+
+    # Downcast numerics and store text columns as categoricals or Arrow strings while the frame is held in memory
+    with profiler.stage('compact', rows=len(loan_df)) as record:
+        record['frame_mb_before'] = get_memory_usage_mb(loan_df)
+        loan_df = compact_frame(loan_df)
+        record['frame_mb_after'] = get_memory_usage_mb(loan_df)
+    logger.info("Cleaned dataframe has been compacted from " + str(record['frame_mb_before']) + " MB to " +
+                str(record['frame_mb_after']) + " MB")
+
+    if frame_cache and etl.fingerprint_index is None and etl.key_columns is None:
+        frame_cache.save('clean', cache_key, loan_df)
+        frame_cache.save('rejected', cache_key, rejected_df)
+
+    return loan_df, rejected_df
+
+
+def log_validation_counts(etl):
+    """ Logs the number of values repaired by the cleaning rules and of rows rejected by every validation rule
+
+    Parameters
+    ----------
+    etl (Type: ETL): ETL object that has cleaned and validated the data
+
+    Returns
+    ----------
+    None
+    """
+    for key, count in sorted(etl.repair_counts.items()):
+        logger.info("Cleaning rule " + key + " repaired " + str(count) + " values")
+    for reason_code, count in sorted(etl.violation_counts.items()):
+        logger.warning("Validation rule " + reason_code + " rejected " + str(count) + " rows")
+
+
+def restore_checkpoint_fingerprints(etl, checkpoints, skip_rows):
+    """ Restores the fingerprints of the rows of the chunks skipped by a resumed load
+
+    Parameters
+    ----------
+    etl (Type: ETL): Streaming ETL object cleaning and validating the remaining chunks
+    checkpoints (Type: list): (chunk_start, chunk_stop, fingerprints) tuples of the committed chunks, see SQLMetadataService.get_checkpoints
+    skip_rows (Type: int): Number of csv rows skipped by the resumed load
+
+    Returns
+    ----------
+    None
+    """
+    for chunk_start, chunk_stop, fingerprints in checkpoints:
+        if chunk_stop <= skip_rows and fingerprints is not None:
+            etl.restore_fingerprints(fingerprints)
+
+
+def read_and_clean_chunks(csv_filename, streaming_chunksize, etl, profiler, skip_rows=0):
+    """ Reads, cleans and validates the csv file chunk by chunk
+
+    Parameters
+    ----------
+    csv_filename (Type: str): Input csv file
+    streaming_chunksize (Type: int): Number of csv rows read and cleaned at a time
+    etl (Type: ParallelETL): Streaming ETL object used to clean and validate the chunks
+    profiler (Type: StageProfiler): Profiler timing every stage of every chunk
+    skip_rows (Type: int): Number of csv rows that are skipped, e.g. the rows committed by an interrupted load
+
+    Returns
+    ----------
+    Generator of (cleaned and validated chunk, rows rejected by the validation rules, position of the first csv row of the chunk,
+    position after its last csv row) tuples
+    """
+    from etl.compaction import compact_frame
+    from etl.schema import read_loan_csv
+
+    chunks = read_loan_csv(csv_filename, logger, streaming_chunksize, skip_rows)
+    chunk_start = skip_rows
+    for chunk_number in itertools.count():
+        profiler.chunk = chunk_number
+        with profiler.stage('read_csv') as record:
+            loan_df = next(chunks, None)
+            record['rows'] = len(loan_df) if loan_df is not None else 0
+        if loan_df is None:
+            break
+
+        # Chunks are compacted as the whole dataframe is by the in-memory load, so that the table gets the same column types
+        chunk_stop = chunk_start + len(loan_df)
+        loan_df = compact_frame(etl.clean_and_validate(loan_df))
+        yield loan_df, etl.pop_rejected_rows(), chunk_start, chunk_stop
+        chunk_start = chunk_stop
+
+    profiler.chunk = None
+
+
+def stream_csv_into_db(chunks, etl, metadata_service, chunksize, table_name, method, load_mode, load_workers, file_hash, profiler):
+    """ Inserts the cleaned chunks of the csv file one at a time so that memory usage is bounded by the chunk size.
+    Every chunk is committed in its own transaction with a checkpoint, so that an interrupted load can be resumed after
+    the last committed chunk.
+
+    Parameters
+    ----------
+    chunks (Type: generator): (cleaned and validated chunk, rejected rows, chunk start, chunk stop) tuples, e.g. returned by read_and_clean_chunks
+    etl (Type: ETL): Streaming ETL object cleaning and validating the chunks
+    metadata_service (Type: SQLMetadataService): Metadata service used to insert the chunks
+    chunksize (Type: int): Number of rows written to DB in a single batch
+    table_name (Type: str): Table name in the database
+    method (Type: str): Insertion method to database
+    load_mode (Type: str): 'replace' or 'incremental'
+    load_workers (Type: int): Number of threads writing shards of a chunk to DB concurrently
+    file_hash (Type: str): Content hash of the csv file, the checkpoints of the chunks are stored with it
+    profiler (Type: StageProfiler): Profiler timing every stage of every chunk
+
+    Returns
+    ----------
+    None
+    """
+    committed_rows = None
     try:
-        metadata_service.insert_into_db(loan_df, chunksize, table_name, method)
-        print("Insertion to DB is completed")
+        # Secondary indexes are dropped while the chunks are loaded and rebuilt after the last one
+        metadata_service.drop_indexes(table_name)
+
+        for chunk_number, (loan_df, rejected_df, chunk_start, chunk_stop) in enumerate(chunks):
+            profiler.chunk = chunk_number
+
+            # In replace mode the first chunk of the file replaces the table (and its quarantine table), the rest are appended to it.
+            # The rows of the chunk, its rejected rows and its checkpoint are committed together.
+            if_exists = 'replace' if chunk_start == 0 and load_mode != 'incremental' else 'append'
+            checkpoint = {'file_hash': file_hash, 'chunk_start': chunk_start, 'chunk_stop': chunk_stop,
+                          'fingerprints': etl.get_pending_fingerprints()}
+            with profiler.stage('insert_into_db', rows=len(loan_df)) as record:
+                record['rejected_rows'] = len(rejected_df)
+                metadata_service.load_chunk(loan_df, rejected_df, chunksize, table_name, method, load_mode, if_exists,
+                                            load_workers, checkpoint)
+            etl.commit_fingerprints()
+            committed_rows = chunk_stop
+            logger.info("Chunk " + str(chunk_number) + " (csv rows " + str(chunk_start) + " to " + str(chunk_stop) +
+                        ") has been cleaned, validated and inserted to DB")
+
+        profiler.chunk = None
+        log_validation_counts(etl)
+        with profiler.stage('create_indexes'):
+            metadata_service.create_indexes(table_name)
+
+        # The load is complete, running it again loads the file again rather than resuming it
+        metadata_service.clear_checkpoints(table_name, file_hash)
+        logger.info("Insertion to DB is completed", extra=CONSOLE)
+
+        with profiler.stage('export_features'):
+            metadata_service.export_features(table_name)
 
     except (Exception) as e:
-            print("DB insertion failed! " + str(e))
+            # The fingerprints of the rows of the chunk that could not be inserted are forgotten, so that they are loaded by the next run
+            etl.discard_fingerprints()
+            logger.error("DB insertion failed! " + str(e), extra=CONSOLE)
+            if committed_rows is not None:
+                logger.error("The first " + str(committed_rows) + " csv rows have been committed, running the load again resumes it after them",
+                             extra=CONSOLE)
+    finally:
+        # A failed load stops reading and cleaning the remaining chunks
+        chunks.close()
 
 
 if __name__=="__main__":
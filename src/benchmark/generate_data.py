@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+
+""" This script generates synthetic Lending Club loan csv files with the 74-column layout of loan.csv
+
+The value distributions roughly follow the Lending Club dataset, including the messy values the ETL has to clean:
+text-based "term" and "emp_length" values, "n/a" fields, negative numerics, duplicate rows and
+"Loans that do not meet the credit policy" rows without a member id.
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import user-defined libraries
+from etl.schema import get_usecols
+
+GRADES = np.array(list('ABCDEFG'))
+GRADE_WEIGHTS = [0.17, 0.29, 0.28, 0.16, 0.07, 0.02, 0.01]
+EMP_LENGTHS = np.array(['< 1 year', '1 year', '2 years', '3 years', '4 years', '5 years', '6 years',
+                        '7 years', '8 years', '9 years', '10+ years', 'n/a'])
+EMP_LENGTH_WEIGHTS = [0.08, 0.06, 0.09, 0.08, 0.06, 0.06, 0.05, 0.05, 0.05, 0.04, 0.33, 0.05]
+EMP_TITLES = np.array(['Teacher', 'Manager', 'Registered Nurse', 'RN', 'Supervisor', 'Sales', 'Project Manager',
+                       'Owner', 'Driver', 'Office Manager', 'US Army', 'Engineer', 'AIR RESOURCES BOARD'])
+HOME_OWNERSHIPS = np.array(['MORTGAGE', 'RENT', 'OWN', 'OTHER', 'NONE'])
+HOME_OWNERSHIP_WEIGHTS = [0.50, 0.40, 0.099, 0.0005, 0.0005]
+VERIFICATION_STATUSES = np.array(['Source Verified', 'Verified', 'Not Verified'])
+LOAN_STATUSES = np.array(['Current', 'Fully Paid', 'Charged Off', 'Late (31-120 days)', 'Issued',
+                          'In Grace Period', 'Late (16-30 days)', 'Default'])
+LOAN_STATUS_WEIGHTS = [0.68, 0.23, 0.05, 0.015, 0.01, 0.007, 0.003, 0.005]
+PURPOSES = np.array(['debt_consolidation', 'credit_card', 'home_improvement', 'other', 'major_purchase',
+                     'small_business', 'car', 'medical', 'moving', 'vacation', 'house', 'wedding',
+                     'renewable_energy', 'educational'])
+PURPOSE_WEIGHTS = [0.59, 0.23, 0.058, 0.048, 0.019, 0.012, 0.01, 0.01, 0.006, 0.005, 0.004, 0.002, 0.0005, 0.0055]
+STATES = np.array(['CA', 'NY', 'TX', 'FL', 'IL', 'NJ', 'PA', 'OH', 'GA', 'VA', 'NC', 'MI', 'MD', 'MA', 'AZ',
+                   'WA', 'CO', 'MN', 'MO', 'IN', 'CT', 'TN', 'NV', 'WI', 'AL', 'OR', 'SC', 'LA', 'KY', 'OK'])
+DESCRIPTIONS = np.array(['  Borrower added on 12/22/11 > I need to upgrade my business technologies.<br>',
+                         '  Borrower added on 12/21/11 > I plan on combining three large interest bills together.<br>',
+                         'Consolidating credit card debt at a lower rate.'])
+MONTHS = np.array(['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'])
+
+# Fractions of messy values
+NEGATIVE_FRACTION = 0.005
+NA_STRING_FRACTION = 0.01
+DUPLICATE_FRACTION = 0.001
+NO_MEMBER_ID_FRACTION = 0.0005
+
+
+def month_year(rng, rows, first_year, last_year, null_fraction=0.0):
+    """ Returns random "Mon-YYYY" dates between the given years, some of them missing
+
+    Parameters
+    ----------
+    rng (Type: numpy.random.Generator): Random number generator
+    rows (Type: int): Number of values
+    first_year (Type: int): First year
+    last_year (Type: int): Last year
+    null_fraction (Type: float): Fraction of missing values
+
+    Returns
+    -------
+    dates (Type: numpy.ndarray): Object array of date strings and None
+    """
+    months = MONTHS[rng.integers(0, 12, rows)]
+    years = rng.integers(first_year, last_year + 1, rows).astype(str)
+    dates = np.char.add(np.char.add(months, '-'), years).astype(object)
+    dates[rng.random(rows) < null_fraction] = None
+    return dates
+
+
+def sparse(rng, values, null_fraction):
+    """ Replaces the given fraction of values with NaN
+
+    Parameters
+    ----------
+    rng (Type: numpy.random.Generator): Random number generator
+    values (Type: numpy.ndarray): Values
+    null_fraction (Type: float): Fraction of missing values
+
+    Returns
+    -------
+    values (Type: numpy.ndarray): Float array with missing values
+    """
+    values = values.astype(float)
+    values[rng.random(len(values)) < null_fraction] = np.nan
+    return values
+
+
+def generate_loans(rows, seed=0, first_id=1):
+    """ Generates a dataframe of synthetic loans with the columns of loan.csv
+
+    Parameters
+    ----------
+    rows (Type: int): Number of rows
+    seed (Type: int): Seed of the random number generator
+    first_id (Type: int): Loan id of the first row
+
+    Returns
+    -------
+    df (Type: pandas.DataFrame): Synthetic loans
+    """
+    rng = np.random.default_rng(seed)
+    ids = np.arange(first_id, first_id + rows)
+
+    grade_index = rng.choice(len(GRADES), rows, p=GRADE_WEIGHTS)
+    grades = GRADES[grade_index]
+    sub_grades = np.char.add(grades, rng.integers(1, 6, rows).astype(str))
+    int_rate = np.round(6 + grade_index * 3.5 + rng.uniform(0, 3.5, rows), 2)
+    term_months = rng.choice([36, 60], rows, p=[0.7, 0.3])
+    loan_amnt = rng.integers(40, 1401, rows) * 25.0
+    funded_amnt = loan_amnt.copy()
+    funded_amnt_inv = np.round(funded_amnt - rng.choice([0, 25, 50], rows, p=[0.9, 0.05, 0.05]), 2)
+    monthly_rate = int_rate / 1200
+    installment = np.round(loan_amnt * monthly_rate / (1 - (1 + monthly_rate) ** -term_months), 2)
+    annual_inc = np.round(rng.lognormal(11.1, 0.55, rows), 0)
+    total_pymnt = np.round(installment * rng.integers(0, 61, rows), 2)
+    total_rec_prncp = np.round(np.minimum(total_pymnt * 0.8, loan_amnt), 2)
+    is_joint = rng.random(rows) < 0.001
+
+    df = pd.DataFrame({
+        'id': ids,
+        'member_id': ids + 200000,
+        'loan_amnt': loan_amnt,
+        'funded_amnt': funded_amnt,
+        'funded_amnt_inv': funded_amnt_inv,
+        'term': np.where(term_months == 36, ' 36 months', ' 60 months'),
+        'int_rate': int_rate,
+        'installment': installment,
+        'grade': grades,
+        'sub_grade': sub_grades,
+        'emp_title': np.where(rng.random(rows) < 0.06, None, EMP_TITLES[rng.integers(0, len(EMP_TITLES), rows)]),
+        'emp_length': EMP_LENGTHS[rng.choice(len(EMP_LENGTHS), rows, p=EMP_LENGTH_WEIGHTS)],
+        'home_ownership': HOME_OWNERSHIPS[rng.choice(len(HOME_OWNERSHIPS), rows, p=HOME_OWNERSHIP_WEIGHTS)],
+        'annual_inc': annual_inc,
+        'verification_status': VERIFICATION_STATUSES[rng.integers(0, 3, rows)],
+        'issue_d': month_year(rng, rows, 2007, 2015),
+        'loan_status': LOAN_STATUSES[rng.choice(len(LOAN_STATUSES), rows, p=LOAN_STATUS_WEIGHTS)],
+        'pymnt_plan': np.where(rng.random(rows) < 0.0001, 'y', 'n'),
+        'url': np.char.add('https://www.lendingclub.com/browse/loanDetail.action?loan_id=', ids.astype(str)),
+        'desc': np.where(rng.random(rows) < 0.86, None, DESCRIPTIONS[rng.integers(0, len(DESCRIPTIONS), rows)]),
+        'purpose': PURPOSES[rng.choice(len(PURPOSES), rows, p=PURPOSE_WEIGHTS)],
+        'title': np.where(rng.random(rows) < 0.01, None, 'Debt consolidation'),
+        'zip_code': np.char.add(rng.integers(100, 1000, rows).astype(str), 'xx'),
+        'addr_state': STATES[rng.integers(0, len(STATES), rows)],
+        'dti': np.round(rng.uniform(0, 35, rows), 2),
+        'delinq_2yrs': rng.poisson(0.3, rows).astype(float),
+        'earliest_cr_line': month_year(rng, rows, 1960, 2012, 0.0001),
+        'inq_last_6mths': rng.poisson(0.7, rows).astype(float),
+        'mths_since_last_delinq': sparse(rng, rng.integers(0, 150, rows), 0.51),
+        'mths_since_last_record': sparse(rng, rng.integers(0, 130, rows), 0.85),
+        'open_acc': rng.poisson(11, rows).astype(float),
+        'pub_rec': rng.poisson(0.2, rows).astype(float),
+        'revol_bal': np.round(rng.lognormal(9.4, 1.0, rows), 0),
+        'revol_util': sparse(rng, np.round(rng.uniform(0, 100, rows), 1), 0.0006),
+        'total_acc': rng.poisson(25, rows).astype(float),
+        'initial_list_status': rng.choice(['f', 'w'], rows),
+        'out_prncp': np.round(loan_amnt - total_rec_prncp, 2),
+        'out_prncp_inv': np.round(funded_amnt_inv - total_rec_prncp, 2),
+        'total_pymnt': total_pymnt,
+        'total_pymnt_inv': total_pymnt,
+        'total_rec_prncp': total_rec_prncp,
+        'total_rec_int': np.round(total_pymnt - total_rec_prncp, 2),
+        'total_rec_late_fee': np.where(rng.random(rows) < 0.01, np.round(rng.uniform(0, 50, rows), 2), 0.0),
+        'recoveries': np.where(rng.random(rows) < 0.03, np.round(rng.uniform(0, 2000, rows), 2), 0.0),
+        'collection_recovery_fee': np.where(rng.random(rows) < 0.03, np.round(rng.uniform(0, 200, rows), 2), 0.0),
+        'last_pymnt_d': month_year(rng, rows, 2008, 2016, 0.02),
+        'last_pymnt_amnt': np.round(installment * rng.uniform(0.5, 2, rows), 2),
+        'next_pymnt_d': month_year(rng, rows, 2016, 2016, 0.29),
+        'last_credit_pull_d': month_year(rng, rows, 2008, 2016, 0.0001),
+        'collections_12_mths_ex_med': sparse(rng, rng.poisson(0.01, rows), 0.0002),
+        'mths_since_last_major_derog': sparse(rng, rng.integers(0, 180, rows), 0.75),
+        'policy_code': np.ones(rows),
+        'application_type': np.where(is_joint, 'JOINT', 'INDIVIDUAL'),
+        'annual_inc_joint': np.where(is_joint, annual_inc * 1.6, np.nan),
+        'dti_joint': np.where(is_joint, np.round(rng.uniform(0, 30, rows), 2), np.nan),
+        'verification_status_joint': np.where(is_joint, 'Not Verified', None),
+        'acc_now_delinq': rng.poisson(0.005, rows).astype(float),
+        'tot_coll_amt': sparse(rng, np.round(rng.exponential(200, rows), 0), 0.08),
+        'tot_cur_bal': sparse(rng, np.round(rng.lognormal(11, 1.2, rows), 0), 0.08),
+    })
+
+    # The newest credit attributes are missing for almost all loans
+    for col in ['open_acc_6m', 'open_il_6m', 'open_il_12m', 'open_il_24m', 'mths_since_rcnt_il', 'total_bal_il',
+                'il_util', 'open_rv_12m', 'open_rv_24m', 'max_bal_bc', 'all_util', 'inq_fi', 'total_cu_tl',
+                'inq_last_12m']:
+        df[col] = sparse(rng, np.round(rng.exponential(5, rows), 0), 0.98)
+    df['total_rev_hi_lim'] = sparse(rng, np.round(rng.lognormal(10, 0.8, rows), 0), 0.08)
+
+    # Messy values: negative numerics, "n/a" fields, duplicate rows and rows without a member id
+    for col in ['loan_amnt', 'funded_amnt_inv', 'revol_bal', 'total_pymnt', 'dti']:
+        negative = rng.random(rows) < NEGATIVE_FRACTION
+        df.loc[negative, col] = -df.loc[negative, col]
+    for col in ['emp_title', 'title', 'desc']:
+        df.loc[rng.random(rows) < NA_STRING_FRACTION, col] = 'n/a'
+    df.loc[rng.random(rows) < NO_MEMBER_ID_FRACTION, 'member_id'] = np.nan
+    df['member_id'] = df['member_id'].astype('Int64')
+
+    # The last rows are replaced by copies of earlier rows, so that the number of rows stays the same
+    duplicate_count = int(rows * DUPLICATE_FRACTION)
+    originals = df.iloc[:rows - duplicate_count]
+    duplicates = originals.iloc[rng.integers(0, len(originals), duplicate_count)]
+    df = pd.concat([originals, duplicates])
+
+    return df[get_usecols()]
+
+
+def write_loans_csv(csv_filename, rows, seed=0, chunk_rows=100000):
+    """ Writes a synthetic loan csv file chunk by chunk, so that files of any size can be generated
+
+    Parameters
+    ----------
+    csv_filename (Type: str): Output csv file
+    rows (Type: int): Number of rows
+    seed (Type: int): Seed of the random number generator
+    chunk_rows (Type: int): Number of rows generated at a time
+
+    Returns
+    -------
+    None
+    """
+    for chunk_number, start in enumerate(range(0, rows, chunk_rows)):
+        df = generate_loans(min(chunk_rows, rows - start), seed=seed + chunk_number, first_id=start + 1)
+        df.to_csv(csv_filename, index=False, header=(chunk_number == 0), mode='w' if chunk_number == 0 else 'a')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generates a synthetic Lending Club loan csv file")
+    parser.add_argument('csv_filename', help="Output csv file")
+    parser.add_argument('--rows', type=int, default=100000, help="Number of rows, e.g. 10000 to 10000000")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the random number generator")
+    arguments = parser.parse_args()
+
+    write_loans_csv(arguments.csv_filename, arguments.rows, arguments.seed)
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+
+""" This script measures the throughput of the ETL and of every insertion method on synthetic loan data
+and compares it with a stored baseline
+
+The data is written to a local SQLite database unless a database URI is given, e.g. one of a local PostgreSQL server.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import user-defined libraries
+from benchmark.generate_data import write_loans_csv
+from db.sql_metadata_service import SQLMetadataService
+from etl.ETL import ETL
+from etl.compaction import compact_frame
+from etl.schema import read_loan_csv
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+INSERTION_METHODS = ['binary', 'copy', 'multi', None]
+INSERTION_CHUNKSIZE = 1000
+
+# Throughput drops larger than this fraction of the baseline are reported as regressions
+REGRESSION_TOLERANCE = 0.2
+
+
+def time_stage(results, name, rows, func, *args):
+    """ Runs a stage and records its duration and throughput
+
+    Parameters
+    ----------
+    results (Type: dict): Results the measurement is added to
+    name (Type: str): Name of the stage
+    rows (Type: int): Number of rows processed by the stage, the length of its return value if None
+    func (Type: function): Stage to be run
+    args: Arguments of the stage
+
+    Returns
+    -------
+    Return value of the stage
+    """
+    start_time = time.perf_counter()
+    value = func(*args)
+    wall_time = time.perf_counter() - start_time
+    if rows is None:
+        rows = len(value)
+
+    results[name] = {'rows': rows, 'wall_time': round(wall_time, 4), 'rows_per_sec': round(rows / wall_time, 1)}
+    print("{:<24} {:>10} rows {:>10.3f} s {:>12.1f} rows/sec".format(name, rows, wall_time, rows / wall_time))
+    return value
+
+
+def run_benchmark(csv_filename, db_uri, methods, chunksize, load_workers=(1,)):
+    """ Reads, cleans, validates and compacts the csv file and inserts it with every insertion method
+
+    Parameters
+    ----------
+    csv_filename (Type: str): Input csv file
+    db_uri (Type: str): SQLAlchemy URI of the database the data is inserted into
+    methods (Type: list): Insertion methods to be measured
+    chunksize (Type: int): Number of rows written in a single batch
+    load_workers (Type: int list): Numbers of shards written concurrently to be measured for every method
+
+    Returns
+    -------
+    results (Type: dict): Duration and throughput of every stage
+    """
+    logger = logging.getLogger(__name__)
+    results = {}
+
+    df = time_stage(results, 'read_csv', None, read_loan_csv, csv_filename, logger)
+    df = time_stage(results, 'clean_and_validate', len(df), ETL(logger).clean_and_validate, df)
+
+    # The insertion methods are measured on the compacted frame, as it is inserted by app.load()
+    df = time_stage(results, 'compact', len(df), compact_frame, df)
+
+    metadata_service = SQLMetadataService(db_uri, logger)
+    for method in methods:
+        for workers in load_workers:
+            name = 'insert_' + str(method) + ('_' + str(workers) + '_workers' if workers > 1 else '')
+
+            # write_frame is the implementation of insert_into_db that raises errors instead of logging them.
+            # A method that is not supported by the database (e.g. 'multi' beyond the SQLite variable limit) is skipped.
+            try:
+                time_stage(results, name, len(df), metadata_service.write_frame,
+                           df, chunksize, 'loan_benchmark', method, 'replace', workers)
+            except (Exception) as e:
+                print("{:<24} failed: {}".format(name, str(e).splitlines()[0]))
+
+    with metadata_service.get_engine().begin() as connection:
+        connection.execute('DROP TABLE IF EXISTS loan_benchmark')
+
+    return results
+
+
+def compare_with_baseline(results, baseline):
+    """ Prints the throughput of every stage relative to the baseline. Throughputs depend on the data size,
+    so runs on a different number of rows than the baseline are rejected rather than compared.
+
+    Parameters
+    ----------
+    results (Type: dict): Results of run_benchmark
+    baseline (Type: dict): Stored results of a previous run, with the number of csv rows it was measured on and its stages
+
+    Returns
+    -------
+    regressions (Type: str list): Stages whose throughput dropped by more than REGRESSION_TOLERANCE
+    """
+    rows = results['read_csv']['rows']
+    if baseline.get('rows') != rows:
+        raise ValueError("The baseline was measured on " + str(baseline.get('rows')) + " rows and can not be compared with a run on " +
+                         str(rows) + " rows, use --rows " + str(baseline.get('rows')) + " or store a new baseline with --update-baseline")
+
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline['stages']:
+            continue
+        ratio = result['rows_per_sec'] / baseline['stages'][name]['rows_per_sec']
+        print("{:<24} {:>6.2f}x baseline".format(name, ratio))
+        if ratio < 1 - REGRESSION_TOLERANCE:
+            regressions.append(name)
+
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the ETL and the insertion methods on synthetic loan data")
+    parser.add_argument('--rows', type=int, default=20000,
+                        help="Number of synthetic rows, e.g. 10000 to 10000000. Only runs of the size of the baseline are compared with it.")
+    parser.add_argument('--csv', help="Existing csv file to be used instead of generating one")
+    parser.add_argument('--db-uri', help="SQLAlchemy URI of the target database, a temporary SQLite file by default")
+    parser.add_argument('--methods', nargs='+', default=[str(method) for method in INSERTION_METHODS],
+                        help="Insertion methods to be measured: binary, copy, multi, None. "
+                             "On databases other than PostgreSQL, binary falls back to copy.")
+    parser.add_argument('--chunksize', type=int, default=INSERTION_CHUNKSIZE, help="Number of rows written in a single batch")
+    parser.add_argument('--load-workers', type=int, nargs='+', default=[1],
+                        help="Numbers of shards written concurrently, e.g. 1 2 4 8 to measure the scaling of the sharded load")
+    parser.add_argument('--update-baseline', action='store_true', help="Store the results as the new baseline")
+    arguments = parser.parse_args()
+
+    methods = [None if method == 'None' else method for method in arguments.methods]
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        csv_filename = arguments.csv
+        if csv_filename is None:
+            csv_filename = os.path.join(work_dir, 'loan.csv')
+            write_loans_csv(csv_filename, arguments.rows)
+
+        db_uri = arguments.db_uri or 'sqlite:///' + os.path.join(work_dir, 'benchmark.db')
+        results = run_benchmark(csv_filename, db_uri, methods, arguments.chunksize, arguments.load_workers)
+
+    regressions = []
+    if os.path.exists(BASELINE_FILE) and not arguments.update_baseline:
+        with open(BASELINE_FILE) as f:
+            try:
+                regressions = compare_with_baseline(results, json.load(f))
+            except (ValueError) as e:
+                print(str(e))
+                sys.exit(1)
+
+    if arguments.update_baseline:
+        # The note on how to read the stored numbers is kept across updates
+        note = None
+        if os.path.exists(BASELINE_FILE):
+            with open(BASELINE_FILE) as f:
+                note = json.load(f).get('note')
+        with open(BASELINE_FILE, 'w') as f:
+            json.dump({**({'note': note} if note else {}), 'rows': results['read_csv']['rows'], 'stages': results}, f, indent=4)
+            f.write('\n')
+    elif regressions:
+        print("Throughput regressions: " + ", ".join(regressions))
+        sys.exit(1)
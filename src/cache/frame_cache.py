@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+
+""" This class stores the raw and the cleaned dataframes as Arrow IPC files, so that an unchanged input file
+does not have to be parsed and cleaned again """
+
+import glob
+import hashlib
+import os
+
+# Import user-defined libraries
+from etl.hashing import hash_file
+
+# Files whose content changes the cleaned dataframe. The cache is invalidated when any of them changes.
+ETL_SOURCE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'etl')
+
+
+def get_schema_fingerprint():
+    """ Returns a fingerprint of the SQLMetadata model. The validation rules and the compaction of the cleaned dataframe are
+    derived from its columns (e.g. a not_null rule per column that is not nullable), so the cache is invalidated when it changes.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    fingerprint (Type: str): Hex digest of the name, type, nullability and primary key flag of every column of the model
+    """
+    from db.sql_metadata_service import SQLMetadata
+
+    schema_hash = hashlib.sha256()
+    for column in SQLMetadata.__table__.columns:
+        schema_hash.update(repr((column.name, str(column.type), column.nullable, column.primary_key)).encode())
+
+    return schema_hash.hexdigest()
+
+
+class FrameCache:
+
+    def __init__(self, cache_dir, logger, max_mb=None):
+        self.cache_dir = os.path.expanduser(cache_dir)
+        self.logger = logger
+
+        # The least recently used cache files are deleted once the cache takes more than max_mb MB
+        self.max_mb = max_mb
+
+
+    def get_key(self, csv_filename):
+        """ Returns the cache key of the given input file, the combination of its content hash, the ETL code version
+        and the fingerprint of the database model
+
+        Parameters
+        ----------
+        csv_filename (Type: str): Input csv file
+
+        Returns
+        -------
+        key (Type: str): Cache key
+        """
+        etl_hash = hashlib.sha256()
+        for source_file in sorted(glob.glob(os.path.join(ETL_SOURCE_DIR, '*.py'))):
+            with open(source_file, 'rb') as f:
+                etl_hash.update(f.read())
+        etl_hash.update(get_schema_fingerprint().encode())
+
+        return hash_file(csv_filename)[:16] + '-' + etl_hash.hexdigest()[:16]
+
+
+    def get_path(self, kind, key):
+        """ Returns the path of a cache file
+
+        Parameters
+        ----------
+        kind (Type: str): 'raw', 'clean' or 'rejected'
+        key (Type: str): Cache key returned by get_key
+
+        Returns
+        -------
+        path (Type: str): Path of the Arrow IPC file
+        """
+        return os.path.join(self.cache_dir, kind + '-' + key + '.arrow')
+
+
+    def load(self, kind, key):
+        """ Memory-maps a cached dataframe
+
+        Parameters
+        ----------
+        kind (Type: str): 'raw', 'clean' or 'rejected'
+        key (Type: str): Cache key returned by get_key
+
+        Returns
+        -------
+        df (Type: pandas.DataFrame): Cached dataframe, None if it is not cached
+        """
+        path = self.get_path(kind, key)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            import pyarrow as pa
+
+            with pa.memory_map(path) as source:
+                df = pa.ipc.open_file(source).read_all().to_pandas()
+            # The modification time of cache files is the time they were last used, see evict
+            os.utime(path)
+            self.logger.info("Dataframe has been loaded from cache " + path)
+            return df
+        except (Exception) as e:
+            self.logger.warning("Cache file could not be loaded: " + str(e))
+            return None
+
+
+    def save(self, kind, key, df):
+        """ Stores a dataframe in the cache. Dataframes that can not be represented in Arrow are not cached.
+
+        Parameters
+        ----------
+        kind (Type: str): 'raw', 'clean' or 'rejected'
+        key (Type: str): Cache key returned by get_key
+        df (Type: pandas.DataFrame): Dataframe to be cached
+
+        Returns
+        -------
+        None
+        """
+        path = self.get_path(kind, key)
+        try:
+            import pyarrow as pa
+
+            if not os.path.exists(self.cache_dir):
+                os.makedirs(self.cache_dir)
+
+            table = pa.Table.from_pandas(df, preserve_index=False)
+
+            # Write to a temporary file first so that an interrupted run never leaves a partial cache file behind
+            with pa.OSFile(path + '.tmp', 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(path + '.tmp', path)
+            self.logger.info("Dataframe has been stored in cache " + path)
+            self.evict()
+        except (Exception) as e:
+            self.logger.warning("Dataframe could not be cached: " + str(e))
+
+
+    def evict(self):
+        """ Deletes the least recently used cache files, e.g. the ones of older input files or ETL code versions,
+        until the cache takes at most max_mb MB. The most recently used file is always kept.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        if self.max_mb is None:
+            return
+
+        cache_files = sorted(glob.glob(os.path.join(self.cache_dir, '*.arrow')), key=os.path.getmtime, reverse=True)
+        total_bytes = 0
+        for position, cache_file in enumerate(cache_files):
+            total_bytes += os.path.getsize(cache_file)
+            if position > 0 and total_bytes > self.max_mb * 1024 ** 2:
+                os.remove(cache_file)
+                self.logger.info("Cache file " + cache_file + " has been evicted")
+
+
+def load_cached_frame(csv_filename, kind='raw', cache_dir=None):
+    """ Loads a dataframe cached by the ETL application, e.g. from the analysis notebook
+
+    Parameters
+    ----------
+    csv_filename (Type: str): Input csv file the dataframe was created from
+    kind (Type: str): 'raw', 'clean' or 'rejected'
+    cache_dir (Type: str): Cache folder, the configured one if not given
+
+    Returns
+    -------
+    df (Type: pandas.DataFrame): Cached dataframe, None if it is not cached or no cache folder is configured
+    """
+    import logging
+    from configuration import Configuration
+
+    cache_dir = cache_dir or Configuration().get_cache_dir()
+    if cache_dir is None:
+        return None
+
+    frame_cache = FrameCache(cache_dir, logging.getLogger(__name__))
+    return frame_cache.load(kind, frame_cache.get_key(csv_filename))
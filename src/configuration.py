@@ -9,13 +9,37 @@ DEFAULT_LOGGING_DIR =  str(os.path.expanduser("~/LendingClub")) + "/logs/"
 DEFAULT_LOGGING_FILE_NAME = "lc.log"
 DEFAULT_LOGS_ROTATE_WHEN = "midnight"
 DEFAULT_LOGS_ROTATE_BACKUP_COUNT = 7 #
+DEFAULT_LOGS_FORMAT = 'text' # 'text': One formatted line per message, 'json': One JSON object per message in the log file
+DEFAULT_LOGS_RATE_LIMIT = (100, 60) # (messages, seconds): Warnings and errors logged from the same line of code beyond this many per period are counted instead of written. None disables the rate limit.
+DEFAULT_PROFILING_ENABLED = True # Log the wall time, CPU time, peak memory and rows/sec of every ETL stage as JSON lines
+DEFAULT_CACHE_DIR = None # Folder of the Arrow cache of raw and cleaned dataframes, e.g. str(os.path.expanduser("~/LendingClub")) + "/cache/". None disables the cache.
+DEFAULT_CACHE_MAX_MB = 2048 # The least recently used cache files are deleted once the cache takes more than this many MB. None keeps all cache files.
 DB_USER = '' # Database username
 DB_PASS = '' # Database password
 DB_HOSTNAME = '' # Database hostname
 DB_PORT = '' # Database port number
 DB_TABLE_NAME = 'loan' # Table name in the database
 INSERTION_CHUNKSIZE = 1000 # Number of rows will be written in batches of this size at a time.
-INSERTION_METHOD = 'multi' # Controls the SQL insertion clause used: ‘multi’: Pass multiple values in a single INSERT clause.
+STREAMING_CHUNKSIZE = None # Number of csv rows read, cleaned and inserted at a time. None loads the whole file at once.
+OUT_OF_CORE_MEMORY_MB = None # Memory budget in MB of the out-of-core ETL, which cleans the csv file in partitions spilled to SPILL_DIR by ETL_WORKERS processes and inserts them one at a time, for files larger than the memory. None disables it.
+SPILL_DIR = str(os.path.expanduser("~/LendingClub")) + "/spill/" # Folder the partitions of the out-of-core ETL are spilled to
+ETL_WORKERS = 1 # Number of processes used to clean row partitions in parallel. 1 disables the parallel ETL.
+LOAD_MODE = 'replace' # 'replace': Drop and rewrite the whole table, 'incremental': Upsert only new or changed rows keyed on the primary key.
+DEDUP_INDEX_FILE = None # SQLite file keeping the fingerprints of the loaded rows to drop duplicates across chunks, loads and input files, e.g. "~/LendingClub/dedup.sqlite". None only drops duplicates within a load. Replace loads clear it.
+DEDUP_KEY_COLUMNS = None # Columns whose values identify a duplicate row, e.g. ['id'], in which case the first version of a row is kept. None compares whole rows, as incremental loads always do.
+PARTITION_YEARS = None # (first year, last year) of the yearly issue_d range partitions of tables replaced by a load, e.g. (2007, 2020). PostgreSQL only, None disables partitioning.
+BUILD_ROLLUPS = True # Maintain aggregates of the loan table by issue year, grade and state in the loan_rollup_* tables at load time
+BUILD_FEATURES = False # Maintain the features used to train models (e.g. grade ordinals, credit history length, default label) in the loan_features table at load time
+FEATURES_PARQUET_FILE = None # Parquet file the loan_features table is exported to after every load, e.g. "~/LendingClub/features/loan_features.parquet". None disables the export.
+READ_CACHE_SIZE = 32 # Number of query results of SQLMetadataService.read_from_db kept in memory. 0 disables the result cache.
+READ_CACHE_MAX_ROWS = 1000000 # Query results with more rows are not cached
+WATCH_POLL_INTERVAL = 5 # Seconds between two scans of the input folder watched by the ingestion service (--watch)
+PIPELINE_QUEUE_SIZE = 1 # Number of chunks that can wait between the read, clean and insert stages of the ingestion service
+LOAD_WORKERS = 1 # Number of threads writing shards of the dataframe to their own staging tables concurrently. 1 disables the sharded load.
+DB_POOL_SIZE = 5 # Number of connections kept open in the connection pool of the engine, at least LOAD_WORKERS
+DB_MAX_OVERFLOW = 10 # Number of connections that can be opened beyond DB_POOL_SIZE
+DB_POOL_PRE_PING = True # Test pooled connections for liveness before using them
+INSERTION_METHOD = 'multi' # Controls the SQL insertion clause used: ‘multi’: Pass multiple values in a single INSERT clause, 'copy': Stream rows through PostgreSQL's COPY command, 'binary': Stream rows through PostgreSQL's COPY command in its binary format, encoded from the column arrays.
 
 
 class Configuration:
@@ -100,6 +124,76 @@ class Configuration:
         """
         return DEFAULT_LOGS_ROTATE_BACKUP_COUNT
 
+    def get_logs_format(self):
+        """ Returns the format of the messages in the log file
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        DEFAULT_LOGS_FORMAT (str): 'text' or 'json'
+
+        """
+        return DEFAULT_LOGS_FORMAT
+
+    def get_logs_rate_limit(self):
+        """ Returns the number of warnings and errors logged from the same line of code per period
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        DEFAULT_LOGS_RATE_LIMIT (tuple): (messages, seconds), None if the rate limit is disabled
+
+        """
+        return DEFAULT_LOGS_RATE_LIMIT
+
+    def get_profiling_enabled(self):
+        """ Returns whether the duration and memory usage of every ETL stage is logged
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        DEFAULT_PROFILING_ENABLED (bool): Whether stage profiling is enabled
+
+        """
+        return DEFAULT_PROFILING_ENABLED
+
+    def get_cache_dir(self):
+        """ Returns the folder where raw and cleaned dataframes are cached
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        DEFAULT_CACHE_DIR (str): Cache folder, None if caching is disabled
+
+        """
+        return DEFAULT_CACHE_DIR
+
+    def get_cache_max_mb(self):
+        """ Returns the size of the dataframe cache beyond which the least recently used cache files are deleted
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        DEFAULT_CACHE_MAX_MB (int): Maximum cache size in MB, None if cache files are never deleted
+
+        """
+        return DEFAULT_CACHE_MAX_MB
+
     def get_db_table_name(self):
         """ Returns table name to insert in the database
 
@@ -126,6 +220,217 @@ class Configuration:
         """
         return INSERTION_CHUNKSIZE
 
+    def get_streaming_chunksize(self):
+        """ Returns the number of csv rows that will be read, cleaned and inserted at a time in streaming mode.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        STREAMING_CHUNKSIZE (int): Number of rows per streamed chunk, None if the whole file is loaded at once
+        """
+        return STREAMING_CHUNKSIZE
+
+    def get_out_of_core_memory_mb(self):
+        """ Returns the memory budget of the out-of-core ETL
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        OUT_OF_CORE_MEMORY_MB (int): Memory budget in MB, None if the out-of-core ETL is disabled
+
+        """
+        return OUT_OF_CORE_MEMORY_MB
+
+    def get_spill_dir(self):
+        """ Returns the folder the partitions of the out-of-core ETL are spilled to
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        SPILL_DIR (str): Spill folder
+
+        """
+        return SPILL_DIR
+
+    def get_etl_workers(self):
+        """ Returns the number of processes used to clean and validate the data in parallel.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        ETL_WORKERS (int): Number of ETL worker processes
+        """
+        return ETL_WORKERS
+
+    def get_load_mode(self):
+        """ Returns whether the table is replaced or incrementally updated.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        LOAD_MODE (str): 'replace' or 'incremental'
+        """
+        return LOAD_MODE
+
+    def get_dedup_index_file(self):
+        """ Returns the SQLite file of the persistent fingerprint index used to drop duplicate rows.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        DEDUP_INDEX_FILE (str): Path of the index file, None if duplicates are only dropped within a load
+        """
+        return os.path.expanduser(DEDUP_INDEX_FILE) if DEDUP_INDEX_FILE else None
+
+    def get_dedup_key_columns(self):
+        """ Returns the columns whose values identify a duplicate row. Whole rows are compared in incremental mode,
+        so that the changed versions of loaded rows are upserted instead of being dropped as their duplicates.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        DEDUP_KEY_COLUMNS (list): Key column names, None if whole rows are compared
+        """
+        return DEDUP_KEY_COLUMNS if self.get_load_mode() != 'incremental' else None
+
+    def get_partition_years(self):
+        """ Returns the range of issue years the loan table is partitioned by.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        PARTITION_YEARS (tuple): First and last year with a partition, None if the table is not partitioned
+        """
+        return PARTITION_YEARS
+
+    def get_build_rollups(self):
+        """ Returns whether the rollup tables are maintained at load time.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        BUILD_ROLLUPS (bool): Whether rollups are built
+        """
+        return BUILD_ROLLUPS
+
+    def get_build_features(self):
+        """ Returns whether the feature table is maintained at load time.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        BUILD_FEATURES (bool): Whether features are built
+        """
+        return BUILD_FEATURES
+
+    def get_features_parquet_file(self):
+        """ Returns the Parquet file the feature table is exported to after every load.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        FEATURES_PARQUET_FILE (str): Parquet file with the user folder expanded, None if the features are not exported
+        """
+        return os.path.expanduser(FEATURES_PARQUET_FILE) if FEATURES_PARQUET_FILE else None
+
+    def get_read_cache_args(self):
+        """ Returns the size limits of the query result cache of the metadata service.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        read_cache_args (dict): max_entries and max_rows arguments of ResultCache
+        """
+        return {'max_entries': READ_CACHE_SIZE, 'max_rows': READ_CACHE_MAX_ROWS}
+
+    def get_watch_poll_interval(self):
+        """ Returns the number of seconds between two scans of the input folder watched by the ingestion service.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        WATCH_POLL_INTERVAL (float): Poll interval in seconds
+        """
+        return WATCH_POLL_INTERVAL
+
+    def get_pipeline_queue_size(self):
+        """ Returns the number of chunks that can wait between two stages of the ingestion service.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        PIPELINE_QUEUE_SIZE (int): Size of the queues between the read, clean and insert stages
+        """
+        return PIPELINE_QUEUE_SIZE
+
+    def get_load_workers(self):
+        """ Returns the number of threads that write shards of the dataframe to the database concurrently.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        LOAD_WORKERS (int): Number of DB load threads
+        """
+        return LOAD_WORKERS
+
+    def get_db_pool_args(self):
+        """ Returns the connection pool arguments of the SQLAlchemy engine.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        pool_args (dict): pool_size, max_overflow and pool_pre_ping arguments of create_engine
+        """
+        return {'pool_size': DB_POOL_SIZE, 'max_overflow': DB_MAX_OVERFLOW, 'pool_pre_ping': DB_POOL_PRE_PING}
+
     def get_insertion_method(self):
         """ Returns the insertion method to db.
 
@@ -9,5 +9,27 @@ class BaseMetadataService:
     def get_engine(self):
         raise NotImplementedError
 
-    def insert_into_db(self, df_to_insert, chunksize, table_name, method):
+    def insert_into_db(self, df_to_insert, chunksize, table_name, method, if_exists='replace', workers=1):
+        raise NotImplementedError
+
+    def upsert_into_db(self, df_to_insert, chunksize, table_name, method):
+        raise NotImplementedError
+
+    def quarantine_into_db(self, df_rejected, chunksize, table_name, method, if_exists='append'):
+        raise NotImplementedError
+
+    def load_chunk(self, df_to_insert, df_rejected, chunksize, table_name, method, load_mode, if_exists='append', workers=1,
+                   checkpoint=None):
+        raise NotImplementedError
+
+    def get_checkpoints(self, table_name, file_hash):
+        raise NotImplementedError
+
+    def clear_checkpoints(self, table_name, file_hash):
+        raise NotImplementedError
+
+    def export_features(self, table_name, chunksize=100000):
+        raise NotImplementedError
+
+    def read_from_db(self, table_name, columns=None, filters=None, chunksize=None, output='pandas'):
         raise NotImplementedError
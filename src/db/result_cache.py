@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+""" This class is a least-recently-used cache of query results """
+
+import collections
+import threading
+
+
+class ResultCache:
+
+    def __init__(self, max_entries, max_rows):
+        """ Initializes the cache
+
+        Parameters
+        ----------
+        max_entries (Type: int): Number of results kept, the least recently used one is evicted beyond it. 0 disables the cache.
+        max_rows (Type: int): Results with more rows are not cached
+
+        Returns
+        -------
+        None
+        """
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.results = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+
+    def get(self, key):
+        """ Returns the cached result of the given key and marks it as the most recently used one
+
+        Parameters
+        ----------
+        key (Type: tuple): Hashable key of the query, including the version of the table it reads
+
+        Returns
+        -------
+        Cached result, None if the key is not cached
+        """
+        with self.lock:
+            if key not in self.results:
+                self.misses += 1
+                return None
+            self.results.move_to_end(key)
+            self.hits += 1
+            return self.results[key]
+
+
+    def put(self, key, result):
+        """ Caches a result unless it has too many rows
+
+        Parameters
+        ----------
+        key (Type: tuple): Hashable key of the query, including the version of the table it reads
+        result: pandas.DataFrame or pyarrow.Table
+
+        Returns
+        -------
+        None
+        """
+        if self.max_entries <= 0 or len(result) > self.max_rows:
+            return
+
+        with self.lock:
+            self.results[key] = result
+            self.results.move_to_end(key)
+            while len(self.results) > self.max_entries:
+                self.results.popitem(last=False)
+
+
+    def invalidate(self, table_name):
+        """ Drops the cached results of a table, which can not be read again once the table version has changed
+
+        Parameters
+        ----------
+        table_name (Type: str): Name of the table that has been written
+
+        Returns
+        -------
+        None
+        """
+        with self.lock:
+            for key in [key for key in self.results if key[0] == table_name]:
+                del self.results[key]
@@ -1,17 +1,37 @@
+import csv
+import io
+import operator
+import os
+from concurrent.futures import ThreadPoolExecutor
 import sqlalchemy
 from sqlalchemy import create_engine, Column
 from sqlalchemy.ext.declarative import declarative_base
+import numpy as np
 import pandas as pd
 import subprocess
 
 from db.base_metadata_service import BaseMetadataService
+from db.binary_copy import encode_binary_copy
+from db.result_cache import ResultCache
 from configuration import Configuration
+from etl.features import FEATURE_DTYPES, compute_features
+from etl.hashing import hash_rows
+from etl.rollups import ROLLUP_DIMENSIONS, ROLLUP_MEASURES, compute_rollups, subtract_rollups
 
 
 Base = sqlalchemy.ext.declarative.declarative_base()
 
 class SQLMetadata(Base):
     __tablename__ = 'loan'
+
+    # Secondary indexes of the columns analyst queries filter on. They are dropped before bulk loads and rebuilt after them.
+    __table_args__ = (
+        sqlalchemy.Index('ix_loan_issue_d', 'issue_d'),
+        sqlalchemy.Index('ix_loan_grade', 'grade'),
+        sqlalchemy.Index('ix_loan_addr_state', 'addr_state'),
+        sqlalchemy.Index('ix_loan_loan_status', 'loan_status'),
+    )
+
     id = Column(sqlalchemy.types.INT, primary_key=True, nullable=False)
     member_id = Column(sqlalchemy.types.INT, nullable=False)
     loan_amnt = Column(sqlalchemy.types.FLOAT, nullable=False)
@@ -69,8 +89,8 @@ class SQLMetadata(Base):
     dti_joint = Column(sqlalchemy.types.FLOAT, nullable=True)
     verification_status_joint = Column(sqlalchemy.types.VARCHAR(20), nullable=True)
     acc_now_delinq = Column(sqlalchemy.types.INT, nullable=False)
-    tot_coll_amt = Column(sqlalchemy.types.FLOAT, nullable=False)
-    tot_cur_bal = Column(sqlalchemy.types.FLOAT, nullable=False)
+    tot_coll_amt = Column(sqlalchemy.types.FLOAT, nullable=True)
+    tot_cur_bal = Column(sqlalchemy.types.FLOAT, nullable=True)
     open_acc_6m = Column(sqlalchemy.types.INT, nullable=True)
     open_il_6m = Column(sqlalchemy.types.INT, nullable=True)
     open_il_12m = Column(sqlalchemy.types.INT, nullable=True)
@@ -96,12 +116,31 @@ class SQLMetadataService(BaseMetadataService):
         self.sql_alchemy_conn = sql_alchemy_conn
         self.logger = logger
         engine_args = {}
+
+        configuration = Configuration()
+        self.build_rollups = configuration.get_build_rollups()
+        self.build_features = configuration.get_build_features()
+        self.features_parquet_file = configuration.get_features_parquet_file()
+        self.result_cache = ResultCache(**configuration.get_read_cache_args())
+
+        # Range partitioning by issue year is only supported by PostgreSQL
+        self.partition_years = configuration.get_partition_years()
+        if self.partition_years is not None and not sql_alchemy_conn.startswith('postgresql'):
+            logger.warning("Partitioning by issue year is only supported by PostgreSQL, tables are not partitioned")
+            self.partition_years = None
+
+        # SQLite engines use a pool without a fixed size, only the pre-ping setting applies to them
+        pool_args = configuration.get_db_pool_args()
+        if sql_alchemy_conn.startswith('sqlite'):
+            engine_args['pool_pre_ping'] = pool_args['pool_pre_ping']
+        else:
+            engine_args.update(pool_args)
         self.engine = create_engine(sql_alchemy_conn, **engine_args)
 
     def initialize_metadata_source(self):
 
         # Creating metadata table... Check if already exists.
-        if not self.engine.dialect.has_table(self.engine, 'loan'):
+        if not sqlalchemy.inspect(self.engine).has_table('loan'):
             try:
                 self.logger.info("Creating Metadata Table")
                 Base.metadata.create_all(self.engine)
@@ -113,11 +152,1128 @@ class SQLMetadataService(BaseMetadataService):
         return self.engine
 
 
-    def insert_into_db(self, df_to_insert, chunksize, table_name, method):
-        try:
-            self.logger.info("Loan DF is being inserted to DB...Chunksize = " + str(chunksize))
+    def get_sql_dtypes(self, df):
+        """ Returns the SQL types of the datetime columns of the dataframe, which are stored as dates if they are columns of the SQLMetadata
+        model (e.g. issue_d) and as timestamps otherwise (e.g. quarantined_at), and of its integer columns, which are stored as BIGINT whatever the width they have been
+        downcast to in memory
+
+        Parameters
+        ----------
+        df (Type: pandas.DataFrame): Dataframe to be inserted
+
+        Returns
+        -------
+        dtypes (Type: dict): Mapping of column names to sqlalchemy.types.DATE, sqlalchemy.types.DATETIME or sqlalchemy.types.BIGINT
+        """
+        model_columns = SQLMetadata.__table__.columns
+        dtypes = {}
+        for col in df.columns:
+            if pd.api.types.is_datetime64_any_dtype(df[col]):
+                dtypes[col] = sqlalchemy.types.DATE if col in model_columns else sqlalchemy.types.DATETIME
+            elif pd.api.types.is_integer_dtype(df[col]):
+                dtypes[col] = sqlalchemy.types.BIGINT
 
-            df_to_insert.to_sql(name=table_name, con=self.engine, if_exists='replace', chunksize=chunksize, index=False, method='multi')
+        return dtypes
+
+    def insert_into_db(self, df_to_insert, chunksize, table_name, method, if_exists='replace', workers=1):
+        try:
+            self.logger.info("Loan DF is being inserted to DB...Chunksize = " + str(chunksize) + ", Method = " + str(method) +
+                             ", Workers = " + str(workers))
+            self.write_frame(df_to_insert, chunksize, table_name, method, if_exists, workers)
+            if self.build_rollups:
+                self.update_rollups(table_name, compute_rollups(df_to_insert), replace=(if_exists == 'replace'))
+            if self.build_features:
+                self.write_features(df_to_insert, chunksize, table_name, method, if_exists)
+            self.bump_table_versions([table_name])
             self.logger.info("Loan DF has been successfully inserted to DB")
         except (Exception) as e:
             self.logger.error("Error during DB insertion from DF " + str(e))
+
+
+    def get_quarantine_table_name(self, table_name):
+        """ Returns the name of the table the rows rejected while loading the given table are written to """
+        return table_name + '_quarantine'
+
+
+    def quarantine_into_db(self, df_rejected, chunksize, table_name, method, if_exists='append'):
+        """ Writes the rows rejected by the validation rules, with their reason codes and the time they were rejected,
+        to the quarantine table of the given table. Errors are logged.
+
+        Parameters
+        ----------
+        df_rejected (Type: pandas.DataFrame): Rejected rows, an empty dataframe only (re)creates the table
+        chunksize (Type: int): Number of rows written in a single batch
+        table_name (Type: str): Name of the table the rows were rejected from
+        method (Type: str): Insertion method, 'copy' or a pandas to_sql method
+        if_exists (Type: str): 'replace' to recreate the quarantine table, 'append' to add rows to it
+
+        Returns
+        -------
+        None
+        """
+        quarantine_table_name = self.get_quarantine_table_name(table_name)
+        try:
+            with self.engine.begin() as connection:
+                df_rejected = self.write_quarantine(df_rejected, chunksize, table_name, method, if_exists, connection)
+                self.bump_table_versions([quarantine_table_name], connection)
+            if len(df_rejected) > 0:
+                self.logger.info(str(len(df_rejected)) + " rejected rows have been written to " + quarantine_table_name)
+        except (Exception) as e:
+            self.logger.error("Error during the insertion of rejected rows to " + quarantine_table_name + ": " + str(e))
+
+
+    def write_quarantine(self, df_rejected, chunksize, table_name, method, if_exists, connection):
+        """ Writes rejected rows to the quarantine table of the given table with the time they were rejected and their content hash.
+        Rows appended to an existing quarantine table are skipped if the same rows have already been quarantined, e.g. by an earlier
+        incremental load of the same file.
+
+        Parameters
+        ----------
+        df_rejected (Type: pandas.DataFrame): Rejected rows with their reason codes, an empty dataframe only (re)creates the table
+        chunksize (Type: int): Number of rows written in a single batch
+        table_name (Type: str): Name of the table the rows were rejected from
+        method (Type: str): Insertion method, 'copy' or a pandas to_sql method
+        if_exists (Type: str): 'replace' to recreate the quarantine table, 'append' to add rows to it
+        connection (Type: sqlalchemy.engine.Connection): Connection of the transaction the rows are written in
+
+        Returns
+        -------
+        df_rejected (Type: pandas.DataFrame): Rows that have been written
+        """
+        quarantine_table_name = self.get_quarantine_table_name(table_name)
+        row_hashes = hash_rows(df_rejected).view(np.int64)
+
+        if if_exists == 'append' and len(row_hashes) > 0 and sqlalchemy.inspect(connection).has_table(quarantine_table_name):
+            quarantine_table = sqlalchemy.table(quarantine_table_name, sqlalchemy.column('row_hash'))
+            quarantined_hashes = []
+            for start in range(0, len(row_hashes), 1000):
+                hashes = [int(row_hash) for row_hash in np.unique(row_hashes[start:start + 1000])]
+                quarantined_hashes += [row[0] for row in connection.execute(sqlalchemy.select([quarantine_table.c.row_hash]).where(
+                    quarantine_table.c.row_hash.in_(hashes)))]
+            is_new = ~np.isin(row_hashes, np.array(quarantined_hashes, dtype=np.int64))
+            df_rejected, row_hashes = df_rejected[is_new], row_hashes[is_new]
+
+        df_rejected = df_rejected.assign(quarantined_at=pd.Timestamp.now(), row_hash=row_hashes)
+        self.write_frame(df_rejected, chunksize, quarantine_table_name, method, if_exists, connection=connection)
+
+        quarantine_table = sqlalchemy.Table(quarantine_table_name, sqlalchemy.MetaData(), Column('row_hash', sqlalchemy.types.BIGINT))
+        sqlalchemy.Index('ix_' + quarantine_table_name + '_row_hash', quarantine_table.c.row_hash).create(connection, checkfirst=True)
+
+        return df_rejected
+
+
+    def load_chunk(self, df_to_insert, df_rejected, chunksize, table_name, method, load_mode, if_exists='append', workers=1,
+                   checkpoint=None):
+        """ Writes a chunk of a load, the rows rejected from it, its rollups and its checkpoint in a single transaction,
+        so that a chunk is either loaded entirely or not at all. Errors are raised to the caller.
+
+        Parameters
+        ----------
+        df_to_insert (Type: pandas.DataFrame): Cleaned and validated rows of the chunk
+        df_rejected (Type: pandas.DataFrame): Rows of the chunk rejected by the validation rules
+        chunksize (Type: int): Number of rows written in a single batch
+        table_name (Type: str): Name of the table
+        method (Type: str): Insertion method, 'copy' or a pandas to_sql method
+        load_mode (Type: str): 'replace' or 'incremental'
+        if_exists (Type: str): 'replace' to recreate the table and its quarantine table, 'append' to add rows to them
+        workers (Type: int): Number of shards written concurrently, see write_sharded
+        checkpoint (Type: dict): file_hash, chunk_start, chunk_stop and fingerprints of the chunk, see save_checkpoint. None if the
+                                 load is not checkpointed.
+
+        Returns
+        -------
+        None
+        """
+        quarantine_table_name = self.get_quarantine_table_name(table_name)
+        with self.engine.begin() as connection:
+            if load_mode == 'incremental':
+                self.upsert_frame(df_to_insert, chunksize, table_name, method, connection)
+            else:
+                self.write_frame(df_to_insert, chunksize, table_name, method, if_exists, workers, connection)
+                if self.build_rollups:
+                    self.update_rollups(table_name, compute_rollups(df_to_insert), replace=(if_exists == 'replace'), connection=connection)
+                if self.build_features:
+                    self.write_features(df_to_insert, chunksize, table_name, method, if_exists, connection)
+                self.bump_table_versions([table_name], connection)
+
+            self.write_quarantine(df_rejected, chunksize, table_name, method, if_exists, connection)
+            self.bump_table_versions([quarantine_table_name], connection)
+
+            if checkpoint is not None:
+                self.save_checkpoint(table_name, connection=connection, replace=(if_exists == 'replace'), **checkpoint)
+
+        self.logger.info(str(len(df_to_insert)) + " rows and " + str(len(df_rejected)) + " rejected rows have been loaded to " + table_name)
+
+
+    def get_checkpoint_table(self):
+        """ Returns the table storing the chunks of the input files that have been loaded to a table
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        sqlalchemy.Table with table_name, file_hash, chunk_start, chunk_stop, fingerprints and committed_at columns
+        """
+        return sqlalchemy.Table('load_checkpoint', sqlalchemy.MetaData(),
+                                Column('table_name', sqlalchemy.types.VARCHAR(100), primary_key=True),
+                                Column('file_hash', sqlalchemy.types.VARCHAR(64), primary_key=True),
+                                Column('chunk_start', sqlalchemy.types.BIGINT, primary_key=True),
+                                Column('chunk_stop', sqlalchemy.types.BIGINT, nullable=False),
+                                Column('fingerprints', sqlalchemy.types.LargeBinary, nullable=True),
+                                Column('committed_at', sqlalchemy.types.DATETIME, nullable=False))
+
+
+    def save_checkpoint(self, table_name, file_hash, chunk_start, chunk_stop, fingerprints, connection, replace=False):
+        """ Records that a chunk of an input file has been loaded, in the transaction that loaded it
+
+        Parameters
+        ----------
+        table_name (Type: str): Name of the table the chunk has been loaded to
+        file_hash (Type: str): Content hash of the input file
+        chunk_start (Type: int): Position of the first csv row of the chunk
+        chunk_stop (Type: int): Position after the last csv row of the chunk
+        fingerprints (Type: numpy.ndarray): uint64 fingerprints of the loaded rows of the chunk, None if they are not kept
+        connection (Type: sqlalchemy.engine.Connection): Connection of the transaction that loaded the chunk
+        replace (Type: bool): Whether the table has been replaced by the chunk, in which case the checkpoints of earlier loads are removed
+
+        Returns
+        -------
+        None
+        """
+        checkpoint_table = self.get_checkpoint_table()
+        checkpoint_table.create(connection, checkfirst=True)
+        if replace:
+            connection.execute(checkpoint_table.delete().where(checkpoint_table.c.table_name == table_name))
+        connection.execute(checkpoint_table.insert().values(
+            table_name=table_name, file_hash=file_hash, chunk_start=int(chunk_start), chunk_stop=int(chunk_stop),
+            fingerprints=fingerprints.tobytes() if fingerprints is not None else None, committed_at=pd.Timestamp.now().to_pydatetime()))
+
+
+    def get_checkpoints(self, table_name, file_hash):
+        """ Returns the chunks of an input file that have been loaded to a table
+
+        Parameters
+        ----------
+        table_name (Type: str): Name of the table
+        file_hash (Type: str): Content hash of the input file
+
+        Returns
+        -------
+        checkpoints (Type: list): (chunk_start, chunk_stop, fingerprints) tuples ordered by chunk_start, fingerprints as uint64 arrays or None
+        """
+        if not sqlalchemy.inspect(self.engine).has_table('load_checkpoint'):
+            return []
+
+        checkpoint_table = self.get_checkpoint_table()
+        with self.engine.connect() as connection:
+            rows = connection.execute(sqlalchemy.select([checkpoint_table.c.chunk_start, checkpoint_table.c.chunk_stop,
+                                                         checkpoint_table.c.fingerprints]).where(sqlalchemy.and_(
+                checkpoint_table.c.table_name == table_name, checkpoint_table.c.file_hash == file_hash)).order_by(
+                checkpoint_table.c.chunk_start)).fetchall()
+
+        return [(start, stop, np.frombuffer(fingerprints, dtype=np.uint64) if fingerprints is not None else None)
+                for start, stop, fingerprints in rows]
+
+
+    def clear_checkpoints(self, table_name, file_hash):
+        """ Removes the checkpoints of an input file once it has been loaded to a table entirely
+
+        Parameters
+        ----------
+        table_name (Type: str): Name of the table
+        file_hash (Type: str): Content hash of the input file
+
+        Returns
+        -------
+        None
+        """
+        if not sqlalchemy.inspect(self.engine).has_table('load_checkpoint'):
+            return
+
+        checkpoint_table = self.get_checkpoint_table()
+        with self.engine.begin() as connection:
+            connection.execute(checkpoint_table.delete().where(sqlalchemy.and_(
+                checkpoint_table.c.table_name == table_name, checkpoint_table.c.file_hash == file_hash)))
+
+
+    def write_frame(self, df_to_insert, chunksize, table_name, method, if_exists='replace', workers=1, connection=None):
+        """ Writes the dataframe to the given table with the given insertion method, errors are raised to the caller
+
+        Parameters
+        ----------
+        df_to_insert (Type: pandas.DataFrame): Dataframe to be inserted
+        chunksize (Type: int): Number of rows written in a single batch
+        table_name (Type: str): Name of the table
+        method (Type: str): Insertion method, 'binary', 'copy' or a pandas to_sql method
+        if_exists (Type: str): 'replace' to recreate the table, 'append' to add rows to an existing table
+        workers (Type: int): Number of shards written concurrently, see write_sharded
+        connection (Type: sqlalchemy.engine.Connection): Connection of the transaction the rows are written in,
+                                                         the rows are committed by the insertion method if not given
+
+        Returns
+        -------
+        None
+        """
+        # Integer columns of loan tables, which are created from the SQLMetadata model, are not written as "1.0"
+        if self.is_model_frame(df_to_insert):
+            df_to_insert = self.conform_to_table(df_to_insert, SQLMetadata.__table__)
+
+        if workers is not None and workers > 1 and len(df_to_insert) >= workers:
+            self.write_sharded(df_to_insert, chunksize, table_name, method, if_exists, workers, connection)
+        elif method == 'binary':
+            self.binary_copy_into_db(df_to_insert, chunksize, table_name, if_exists, connection)
+        elif method == 'copy':
+            self.copy_into_db(df_to_insert, chunksize, table_name, if_exists, connection)
+        else:
+            self.create_table(df_to_insert, table_name, if_exists, connection)
+            df_to_insert.to_sql(name=table_name, con=connection or self.engine, if_exists='append', chunksize=chunksize, index=False,
+                                method=method, dtype=self.get_sql_dtypes(df_to_insert))
+
+
+    def create_table(self, df, table_name, if_exists='replace', connection=None):
+        """ Creates an empty table matching the dataframe. Loan dataframes get the columns and the primary key of the SQLMetadata model,
+        see create_model_table, so that tables created by replace loads can be loaded incrementally afterwards.
+        If partitioning is configured, tables that are replaced are created as PostgreSQL tables partitioned by the year of issue_d,
+        with a partition per configured year and a default partition. Partitioned tables have no primary key.
+        The content hashes of the rows of a replaced table are dropped with it, see drop_row_hashes.
+
+        Parameters
+        ----------
+        df (Type: pandas.DataFrame): Dataframe to be inserted
+        table_name (Type: str): Name of the table
+        if_exists (Type: str): 'replace' to recreate the table, 'append' to create it only if it does not exist
+        connection (Type: sqlalchemy.engine.Connection): Connection of the transaction the table is created in,
+                                                         a new transaction is started if not given
+
+        Returns
+        -------
+        None
+        """
+        if connection is None:
+            with self.engine.begin() as connection:
+                self.create_table(df, table_name, if_exists, connection)
+            return
+
+        # The content hashes stored for incremental loads are those of the rows of the replaced table
+        if if_exists == 'replace':
+            self.drop_row_hashes(table_name, connection)
+
+        if (self.partition_years is None or if_exists != 'replace' or 'issue_d' not in df.columns) and self.is_model_frame(df):
+            self.create_model_table(df, table_name, if_exists, connection)
+            return
+
+        if self.partition_years is None or if_exists != 'replace' or 'issue_d' not in df.columns:
+            df.head(0).to_sql(name=table_name, con=connection, if_exists=if_exists, index=False, dtype=self.get_sql_dtypes(df))
+            return
+
+        preparer = self.engine.dialect.identifier_preparer
+        first_year, last_year = self.partition_years
+        sqlalchemy.Table(table_name, sqlalchemy.MetaData()).drop(connection, checkfirst=True)
+        connection.execute(sqlalchemy.text(pd.io.sql.get_schema(df.head(0), table_name, con=connection, dtype=self.get_sql_dtypes(df)) +
+                                           " PARTITION BY RANGE (issue_d)"))
+        for year, partition_name in zip(range(first_year, last_year + 1), self.get_partition_names(table_name)):
+            connection.execute(sqlalchemy.text("CREATE TABLE {} PARTITION OF {} FOR VALUES FROM ('{}-01-01') TO ('{}-01-01')".format(
+                preparer.quote(partition_name), preparer.quote(table_name), year, year + 1)))
+        connection.execute(sqlalchemy.text("CREATE TABLE {} PARTITION OF {} DEFAULT".format(
+            preparer.quote(self.get_partition_names(table_name)[-1]), preparer.quote(table_name))))
+
+
+    def is_model_frame(self, df):
+        """ Returns whether the dataframe holds loans, i.e. its columns are columns of the SQLMetadata model including its primary key
+
+        Parameters
+        ----------
+        df (Type: pandas.DataFrame): Dataframe to be inserted
+
+        Returns
+        -------
+        is_model_frame (Type: bool): True for cleaned loan dataframes, False for e.g. quarantined or staged rows
+        """
+        model_columns = SQLMetadata.__table__.columns
+        return (all(col in model_columns for col in df.columns) and
+                all(col.name in df.columns for col in SQLMetadata.__table__.primary_key.columns))
+
+
+    def create_model_table(self, df, table_name, if_exists='replace', connection=None):
+        """ Creates an empty table with the columns of the dataframe as they are defined in the SQLMetadata model,
+        with the primary key, types and constraints of the model
+
+        Parameters
+        ----------
+        df (Type: pandas.DataFrame): Loan dataframe to be inserted, see is_model_frame
+        table_name (Type: str): Name of the table
+        if_exists (Type: str): 'replace' to recreate the table, 'append' to create it only if it does not exist
+        connection (Type: sqlalchemy.engine.Connection): Connection of the transaction the table is created in,
+                                                         a new transaction is started if not given
+
+        Returns
+        -------
+        None
+        """
+        if connection is None:
+            with self.engine.begin() as connection:
+                self.create_model_table(df, table_name, if_exists, connection)
+            return
+
+        table = sqlalchemy.Table(table_name, sqlalchemy.MetaData(),
+                                 *[Column(col.name, col.type, primary_key=col.primary_key, nullable=col.nullable)
+                                   for col in SQLMetadata.__table__.columns if col.name in df.columns])
+        if if_exists == 'replace':
+            table.drop(connection, checkfirst=True)
+        table.create(connection, checkfirst=True)
+
+
+    def get_partition_names(self, table_name):
+        """ Returns the names of the partitions of a table partitioned by issue year, the default partition being the last one
+
+        Parameters
+        ----------
+        table_name (Type: str): Name of the partitioned table
+
+        Returns
+        -------
+        partition_names (Type: str list): Partition names
+        """
+        first_year, last_year = self.partition_years
+        return [table_name + '_' + str(year) for year in range(first_year, last_year + 1)] + [table_name + '_default']
+
+
+    def get_indexes(self, table_name):
+        """ Returns the secondary indexes of the SQLMetadata model for the given table. Tables created from dataframes
+        have no primary key, so their primary key columns are indexed as well.
+
+        Parameters
+        ----------
+        table_name (Type: str): Name of the table
+
+        Returns
+        -------
+        indexes (Type: sqlalchemy.Index list): Indexes of the columns the table has
+        """
+        inspector = sqlalchemy.inspect(self.engine)
+        table_columns = [col['name'] for col in inspector.get_columns(table_name)]
+
+        index_columns = [list(index.columns.keys()) for index in sorted(SQLMetadata.__table__.indexes, key=lambda index: index.name)]
+        if not inspector.get_pk_constraint(table_name)['constrained_columns']:
+            index_columns.insert(0, [col.name for col in SQLMetadata.__table__.primary_key.columns])
+        index_columns = [cols for cols in index_columns if all(col in table_columns for col in cols)]
+
+        table = sqlalchemy.Table(table_name, sqlalchemy.MetaData(), *[Column(col) for col in table_columns])
+        return [sqlalchemy.Index('ix_' + table_name + '_' + '_'.join(cols), *[table.c[col] for col in cols]) for cols in index_columns]
+
+
+    def drop_indexes(self, table_name):
+        """ Drops the secondary indexes of the given table before a bulk load, so that rows are not indexed one by one
+
+        Parameters
+        ----------
+        table_name (Type: str): Name of the table
+
+        Returns
+        -------
+        None
+        """
+        if not sqlalchemy.inspect(self.engine).has_table(table_name):
+            return
+
+        for index in self.get_indexes(table_name):
+            index.drop(self.engine, checkfirst=True)
+        self.logger.info("Indexes of " + table_name + " have been dropped")
+
+
+    def create_indexes(self, table_name):
+        """ Builds the missing secondary indexes of the given table after a bulk load
+
+        Parameters
+        ----------
+        table_name (Type: str): Name of the table
+
+        Returns
+        -------
+        None
+        """
+        if not sqlalchemy.inspect(self.engine).has_table(table_name):
+            return
+
+        for index in self.get_indexes(table_name):
+            index.create(self.engine, checkfirst=True)
+        self.logger.info("Indexes of " + table_name + " have been built")
+
+
+    def write_sharded(self, df_to_insert, chunksize, table_name, method, if_exists, workers, connection=None):
+        """ Splits the dataframe into shards that are written concurrently by a pool of threads, each to its own staging table.
+        The staging tables are then merged in a single transaction, either into a new table that replaces the given table
+        or into the given table itself, so readers never see a partially loaded table.
+
+        Parameters
+        ----------
+        df_to_insert (Type: pandas.DataFrame): Dataframe to be inserted
+        chunksize (Type: int): Number of rows written in a single batch
+        table_name (Type: str): Name of the table
+        method (Type: str): Insertion method, 'copy' or a pandas to_sql method
+        if_exists (Type: str): 'replace' to recreate the table, 'append' to add rows to an existing table
+        workers (Type: int): Number of shards
+        connection (Type: sqlalchemy.engine.Connection): Connection of the transaction the staging tables are merged in,
+                                                         a new transaction is started if not given
+
+        Returns
+        -------
+        None
+        """
+        replace = if_exists == 'replace'
+        target_name = table_name + '_new' if replace else table_name
+
+        # Create the target table from the whole dataframe (or the model), so that every shard gets the same column types
+        self.create_table(df_to_insert, target_name, if_exists, connection)
+        target_table = sqlalchemy.Table(target_name, sqlalchemy.MetaData(), autoload=True, autoload_with=connection or self.engine)
+        shard_tables = [sqlalchemy.Table(table_name + '_shard_' + str(shard), sqlalchemy.MetaData(),
+                                         *[Column(col.name, col.type) for col in target_table.columns])
+                        for shard in range(workers)]
+        bounds = np.linspace(0, len(df_to_insert), workers + 1).astype(int)
+
+        def write_shard(shard):
+            shard_tables[shard].drop(self.engine, checkfirst=True)
+            shard_tables[shard].create(self.engine)
+            self.write_frame(df_to_insert.iloc[bounds[shard]:bounds[shard + 1]], chunksize, shard_tables[shard].name, method, 'append')
+
+        def merge_shards(connection):
+            for shard_table in shard_tables:
+                columns = [col.name for col in shard_table.columns]
+                connection.execute(target_table.insert().from_select(columns, shard_table.select()))
+            if replace:
+                sqlalchemy.Table(table_name, sqlalchemy.MetaData()).drop(connection, checkfirst=True)
+                self.drop_row_hashes(table_name, connection)
+                preparer = self.engine.dialect.identifier_preparer
+                connection.execute(sqlalchemy.text("ALTER TABLE {} RENAME TO {}".format(
+                    preparer.quote(target_name), preparer.quote(table_name))))
+                # PostgreSQL names primary keys after their table, the next replace load creates the target table again
+                if self.engine.dialect.name == 'postgresql' and target_table.primary_key.name:
+                    connection.execute(sqlalchemy.text("ALTER TABLE {} RENAME CONSTRAINT {} TO {}".format(
+                        preparer.quote(table_name), preparer.quote(target_table.primary_key.name), preparer.quote(table_name + '_pkey'))))
+                if self.partition_years is not None:
+                    for partition_name, new_name in zip(self.get_partition_names(target_name), self.get_partition_names(table_name)):
+                        connection.execute(sqlalchemy.text("ALTER TABLE {} RENAME TO {}".format(
+                            preparer.quote(partition_name), preparer.quote(new_name))))
+
+        # SQLite locks the whole database file for every writer, so its shards are written one at a time
+        threads = 1 if self.engine.dialect.name == 'sqlite' else workers
+        if connection is not None:
+            # The shards are merged and their staging tables dropped in the transaction of the caller. Staging tables
+            # left behind by a failed transaction are dropped before they are written again.
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                list(executor.map(write_shard, range(workers)))
+            merge_shards(connection)
+            for shard_table in shard_tables:
+                shard_table.drop(connection)
+            return
+
+        try:
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                list(executor.map(write_shard, range(workers)))
+
+            with self.engine.begin() as connection:
+                merge_shards(connection)
+        finally:
+            for shard_table in shard_tables:
+                shard_table.drop(self.engine, checkfirst=True)
+            if replace:
+                target_table.drop(self.engine, checkfirst=True)
+
+
+    def upsert_into_db(self, df_to_insert, chunksize, table_name, method):
+        """ Incrementally loads the dataframe into an existing table keyed on its primary key, see upsert_frame. Errors are logged.
+
+        Parameters
+        ----------
+        df_to_insert (Type: pandas.DataFrame): Dataframe to be inserted
+        chunksize (Type: int): Number of rows written to the staging table in a single batch
+        table_name (Type: str): Name of the table, which must have been created by initialize_metadata_source
+        method (Type: str): Insertion method used to fill the staging table
+
+        Returns
+        -------
+        None
+        """
+        try:
+            self.logger.info("Loan DF is being upserted to DB...Chunksize = " + str(chunksize) + ", Method = " + str(method))
+            with self.engine.begin() as connection:
+                self.upsert_frame(df_to_insert, chunksize, table_name, method, connection)
+            self.logger.info("Loan DF has been successfully upserted to DB")
+        except (Exception) as e:
+            self.logger.error("Error during DB upsert from DF " + str(e))
+
+
+    def upsert_frame(self, df_to_insert, chunksize, table_name, method, connection):
+        """ Incrementally loads the dataframe into an existing table keyed on its primary key, in the transaction of the given connection.
+        Only rows that are new or whose content hash differs from the previous load are staged,
+        then merged into the table with a single INSERT ... ON CONFLICT DO UPDATE. Errors are raised to the caller.
+
+        Parameters
+        ----------
+        df_to_insert (Type: pandas.DataFrame): Dataframe to be inserted
+        chunksize (Type: int): Number of rows written to the staging table in a single batch
+        table_name (Type: str): Name of the table, which must have been created by initialize_metadata_source
+        method (Type: str): Insertion method used to fill the staging table
+        connection (Type: sqlalchemy.engine.Connection): Connection of the transaction the rows are upserted in
+
+        Returns
+        -------
+        None
+        """
+        primary_key = sqlalchemy.inspect(connection).get_pk_constraint(table_name)['constrained_columns']
+        if not primary_key:
+            raise ValueError("Incremental load requires a primary key on table " + table_name +
+                             ". Recreate the table with initialize_metadata_source.")
+
+        # Compare the content hash of every row with the hash stored by the previous load. The hashes of the rows are staged
+        # and joined with the stored hashes in the database, so that only the keys of new or changed rows are read back.
+        row_hash_table = self.get_row_hash_table(table_name, primary_key)
+        row_hash_table.create(connection, checkfirst=True)
+        hash_staging_table = sqlalchemy.Table(table_name + '_hash_staging', sqlalchemy.MetaData(),
+                                              *[Column(col.name, col.type) for col in row_hash_table.columns])
+        hash_staging_table.drop(connection, checkfirst=True)
+        hash_staging_table.create(connection)
+
+        row_hashes = df_to_insert[primary_key].apply(pd.to_numeric).assign(row_hash=hash_rows(df_to_insert).view(np.int64))
+        self.write_frame(row_hashes, chunksize, hash_staging_table.name, method, 'append', connection=connection)
+        changed_hashes = pd.read_sql(sqlalchemy.select([hash_staging_table]).select_from(hash_staging_table.outerjoin(
+            row_hash_table, sqlalchemy.and_(*[hash_staging_table.c[key] == row_hash_table.c[key] for key in primary_key]))).where(
+            sqlalchemy.or_(row_hash_table.c.row_hash.is_(None), row_hash_table.c.row_hash != hash_staging_table.c.row_hash)),
+            connection)
+        hash_staging_table.drop(connection)
+        is_changed = (row_hashes.merge(changed_hashes.drop_duplicates().astype(row_hashes.dtypes.to_dict()), how='left', indicator=True)
+                      ['_merge'] == 'both').values
+
+        df_changed = df_to_insert[is_changed].assign(row_hash=row_hashes['row_hash'].values[is_changed])
+        df_changed = df_changed.drop_duplicates(subset=primary_key, keep='last')
+        self.logger.info(str(len(df_changed)) + " of " + str(len(df_to_insert)) + " rows are new or changed")
+        if df_changed.empty:
+            return
+
+        # Stage the changed rows in a table with the same column types as the target table.
+        # A staging table left behind by a failed transaction is dropped first.
+        target_table = sqlalchemy.Table(table_name, sqlalchemy.MetaData(), autoload=True, autoload_with=connection)
+        staging_table = sqlalchemy.Table(table_name + '_staging', sqlalchemy.MetaData(),
+                                         *[Column(col.name, col.type) for col in target_table.columns],
+                                         Column('row_hash', sqlalchemy.types.BIGINT))
+        staging_table.drop(connection, checkfirst=True)
+        staging_table.create(connection)
+        self.write_frame(self.conform_to_table(df_changed, staging_table), chunksize, staging_table.name, method, 'append',
+                         connection=connection)
+
+        # The rollups change by the new versions of the staged rows minus their previous versions
+        if self.build_rollups:
+            previous_rows = pd.read_sql(sqlalchemy.select([target_table]).select_from(target_table.join(
+                staging_table, sqlalchemy.and_(*[target_table.c[key] == staging_table.c[key] for key in primary_key]))),
+                connection)
+            rollups = subtract_rollups(compute_rollups(df_changed), compute_rollups(previous_rows))
+
+        connection.execute(self.get_upsert_statement(target_table, staging_table, primary_key))
+        connection.execute(self.get_upsert_statement(row_hash_table, staging_table, primary_key))
+        if self.build_rollups:
+            self.update_rollups(table_name, rollups, connection=connection)
+
+        # The features of the staged rows replace their previous features
+        if self.build_features:
+            feature_table_name = self.get_feature_table_name(table_name)
+            if sqlalchemy.inspect(connection).has_table(feature_table_name):
+                feature_table = sqlalchemy.table(feature_table_name, sqlalchemy.column('id'))
+                connection.execute(feature_table.delete().where(feature_table.c.id.in_(sqlalchemy.select([staging_table.c.id]))))
+            self.write_features(df_changed, chunksize, table_name, method, 'append', connection)
+
+        self.bump_table_versions([table_name], connection)
+        staging_table.drop(connection)
+
+
+    def get_rollup_table(self, table_name, rollup_name):
+        """ Returns the table storing a rollup of the given table, keyed on the dimensions of the rollup
+
+        Parameters
+        ----------
+        table_name (Type: str): Name of the aggregated table
+        rollup_name (Type: str): Name of the rollup, a key of ROLLUP_DIMENSIONS
+
+        Returns
+        -------
+        sqlalchemy.Table with the dimension columns, loan_count and a sum column per measure
+        """
+        model_columns = SQLMetadata.__table__.columns
+        dimensions = [Column(col, model_columns[col].type if col in model_columns else sqlalchemy.types.INT, primary_key=True)
+                      for col in ROLLUP_DIMENSIONS[rollup_name]]
+        measures = [Column(measure + '_sum', sqlalchemy.types.FLOAT, nullable=False) for measure in ROLLUP_MEASURES]
+
+        return sqlalchemy.Table(table_name + '_rollup_' + rollup_name, sqlalchemy.MetaData(), *dimensions,
+                                Column('loan_count', sqlalchemy.types.BIGINT, nullable=False), *measures)
+
+
+    def update_rollups(self, table_name, rollups, replace=False, connection=None):
+        """ Adds partial rollups to the rollup tables of the given table, or replaces the rollup tables with them
+
+        Parameters
+        ----------
+        table_name (Type: str): Name of the aggregated table
+        rollups (Type: dict): Partial rollups returned by compute_rollups
+        replace (Type: bool): Whether the rollup tables are recreated instead of being added to
+        connection (Type: sqlalchemy.engine.Connection): Connection of the transaction the rollups are updated in,
+                                                         a new transaction is started if not given
+
+        Returns
+        -------
+        None
+        """
+        if connection is None:
+            with self.engine.begin() as connection:
+                self.update_rollups(table_name, rollups, replace, connection)
+            return
+
+        preparer = self.engine.dialect.identifier_preparer
+        for rollup_name, rollup in rollups.items():
+            rollup_table = self.get_rollup_table(table_name, rollup_name)
+            if replace:
+                rollup_table.drop(connection, checkfirst=True)
+            rollup_table.create(connection, checkfirst=True)
+            if rollup.empty:
+                continue
+
+            # Counts and sums are added to the stored ones, groups whose rows have all been removed are deleted
+            columns = [col.name for col in rollup_table.columns]
+            updates = [preparer.quote(col) + " = " + preparer.quote(rollup_table.name) + "." + preparer.quote(col) +
+                       " + excluded." + preparer.quote(col) for col in columns if not rollup_table.c[col].primary_key]
+            statement = sqlalchemy.text("INSERT INTO {table} ({columns}) VALUES ({values}) ON CONFLICT ({keys}) DO UPDATE SET {updates}".format(
+                table=preparer.quote(rollup_table.name), columns=", ".join(preparer.quote(col) for col in columns),
+                values=", ".join(":" + col for col in columns),
+                keys=", ".join(preparer.quote(col.name) for col in rollup_table.primary_key.columns), updates=", ".join(updates)))
+            connection.execute(statement, rollup[columns].astype(object).to_dict('records'))
+            connection.execute(rollup_table.delete().where(rollup_table.c.loan_count <= 0))
+
+        self.bump_table_versions([self.get_rollup_table(table_name, rollup_name).name for rollup_name in rollups], connection)
+
+
+    def get_feature_table_name(self, table_name):
+        """ Returns the name of the table the features of the rows of the given table are written to """
+        return table_name + '_features'
+
+
+    def write_features(self, df, chunksize, table_name, method, if_exists='append', connection=None):
+        """ Computes the features of loaded rows and writes them to the feature table of the given table
+
+        Parameters
+        ----------
+        df (Type: pandas.DataFrame): Loaded rows
+        chunksize (Type: int): Number of rows written in a single batch
+        table_name (Type: str): Name of the table the rows have been loaded to
+        method (Type: str): Insertion method, 'copy' or a pandas to_sql method
+        if_exists (Type: str): 'replace' to recreate the feature table, 'append' to add rows to it
+        connection (Type: sqlalchemy.engine.Connection): Connection of the transaction the features are written in,
+                                                         the features are committed by the insertion method if not given
+
+        Returns
+        -------
+        None
+        """
+        feature_table_name = self.get_feature_table_name(table_name)
+        self.write_frame(compute_features(df), chunksize, feature_table_name, method, if_exists, connection=connection)
+        self.bump_table_versions([feature_table_name], connection)
+
+
+    def export_features(self, table_name, chunksize=100000):
+        """ Exports the feature table of the given table to the configured Parquet file, with the dtypes the features are computed with.
+        The file is replaced at once, so that training jobs never read a partially written file. Errors are logged.
+
+        Parameters
+        ----------
+        table_name (Type: str): Name of the table whose features are exported
+        chunksize (Type: int): Number of rows read from the database and written to the file at a time
+
+        Returns
+        -------
+        None
+        """
+        feature_table_name = self.get_feature_table_name(table_name)
+        if not self.build_features or self.features_parquet_file is None or not sqlalchemy.inspect(self.engine).has_table(feature_table_name):
+            return
+
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        parquet_dir = os.path.dirname(self.features_parquet_file)
+        if parquet_dir and not os.path.exists(parquet_dir):
+            os.makedirs(parquet_dir)
+
+        temporary_file = self.features_parquet_file + '.tmp'
+        rows = 0
+        writer = None
+        try:
+            for chunk in self.read_from_db(feature_table_name, chunksize=chunksize):
+                table = pa.Table.from_pandas(chunk.astype(FEATURE_DTYPES), preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(temporary_file, table.schema)
+                writer.write_table(table)
+                rows += len(chunk)
+            if writer is not None:
+                writer.close()
+                writer = None
+                os.replace(temporary_file, self.features_parquet_file)
+            self.logger.info("Features of " + str(rows) + " rows have been exported to " + self.features_parquet_file)
+        except (Exception) as e:
+            self.logger.error("Error during the export of " + feature_table_name + " to " + self.features_parquet_file + ": " + str(e))
+        finally:
+            if writer is not None:
+                writer.close()
+            if os.path.exists(temporary_file):
+                os.remove(temporary_file)
+
+
+    def get_rollup(self, table_name, rollup_name):
+        """ Reads a rollup of the given table and derives the mean of every measure
+
+        Parameters
+        ----------
+        table_name (Type: str): Name of the aggregated table
+        rollup_name (Type: str): Name of the rollup, a key of ROLLUP_DIMENSIONS
+
+        Returns
+        -------
+        rollup (Type: pandas.DataFrame): Dimension columns, loan_count, and a sum and a mean column per measure
+        """
+        rollup = pd.read_sql(sqlalchemy.select([self.get_rollup_table(table_name, rollup_name)]), self.engine)
+        for measure in ROLLUP_MEASURES:
+            rollup[measure + '_mean'] = rollup[measure + '_sum'] / rollup['loan_count']
+
+        return rollup
+
+
+    def get_table_version_table(self):
+        """ Returns the table storing the version of every table written by the metadata service
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        sqlalchemy.Table with table_name and version columns
+        """
+        return sqlalchemy.Table('table_version', sqlalchemy.MetaData(),
+                                Column('table_name', sqlalchemy.types.VARCHAR(100), primary_key=True),
+                                Column('version', sqlalchemy.types.BIGINT, nullable=False))
+
+
+    def bump_table_versions(self, table_names, connection=None):
+        """ Increments the versions of tables that have been written, so that cached query results of them are no longer used,
+        also by other processes reading the same database
+
+        Parameters
+        ----------
+        table_names (Type: str list): Names of the written tables
+        connection (Type: sqlalchemy.engine.Connection): Connection of the transaction that wrote the tables,
+                                                         a new transaction is started if not given
+
+        Returns
+        -------
+        None
+        """
+        if connection is None:
+            with self.engine.begin() as connection:
+                self.bump_table_versions(table_names, connection)
+            return
+
+        version_table = self.get_table_version_table()
+        version_table.create(connection, checkfirst=True)
+        connection.execute(sqlalchemy.text("INSERT INTO table_version (table_name, version) VALUES (:table_name, 1) "
+                                           "ON CONFLICT (table_name) DO UPDATE SET version = table_version.version + 1"),
+                           [{'table_name': table_name} for table_name in table_names])
+        for table_name in table_names:
+            self.result_cache.invalidate(table_name)
+
+
+    def get_table_version(self, table_name):
+        """ Returns the version of a table, which is incremented every time the metadata service writes it
+
+        Parameters
+        ----------
+        table_name (Type: str): Name of the table
+
+        Returns
+        -------
+        version (Type: int): Version of the table, 0 if it has never been written by the metadata service
+        """
+        if not sqlalchemy.inspect(self.engine).has_table('table_version'):
+            return 0
+
+        version_table = self.get_table_version_table()
+        with self.engine.connect() as connection:
+            version = connection.execute(sqlalchemy.select([version_table.c.version]).where(
+                version_table.c.table_name == table_name)).scalar()
+
+        return version or 0
+
+
+    def read_from_db(self, table_name, columns=None, filters=None, chunksize=None, output='pandas'):
+        """ Reads the given columns of the rows of a table that match all filters. Results of whole reads are cached
+        until the table is written again, chunked reads are streamed from a server-side cursor and are not cached.
+
+        Parameters
+        ----------
+        table_name (Type: str): Name of the table
+        columns (Type: str list): Columns to be read, all columns if None
+        filters (Type: list): (column, operator, value) tuples combined with AND, e.g. [('grade', 'in', ['A', 'B']), ('int_rate', '>', 10)].
+                              The operators are ==, !=, <, <=, >, >=, in and not in.
+        chunksize (Type: int): Number of rows per chunk, None to read all rows at once
+        output (Type: str): 'pandas' for pandas.DataFrame results or 'arrow' for pyarrow.Table results
+
+        Returns
+        -------
+        Result of the query, or an iterator of results of chunksize rows if chunksize is given.
+        Cached DataFrames are copied so that callers can modify them, Arrow tables are immutable and shared.
+        """
+        if output not in ('pandas', 'arrow'):
+            raise ValueError("Unknown output " + str(output) + ", expected 'pandas' or 'arrow'")
+
+        if chunksize:
+            return self.stream_from_db(table_name, columns, filters, chunksize, output)
+
+        key = (table_name, tuple(columns) if columns else None, repr(filters), output, self.get_table_version(table_name))
+        result = self.result_cache.get(key)
+        if result is None:
+            query, date_columns = self.get_read_query(table_name, columns, filters)
+            result = self.convert_result(pd.read_sql(query, self.engine, parse_dates=date_columns), output)
+            self.result_cache.put(key, result)
+
+        return result.copy() if output == 'pandas' else result
+
+
+    def stream_from_db(self, table_name, columns, filters, chunksize, output):
+        """ Generator behind read_from_db for chunked reads, which fetches the rows through a server-side cursor """
+        query, date_columns = self.get_read_query(table_name, columns, filters)
+        with self.engine.connect() as connection:
+            connection = connection.execution_options(stream_results=True)
+            for chunk in pd.read_sql(query, connection, chunksize=chunksize, parse_dates=date_columns):
+                yield self.convert_result(chunk, output)
+
+
+    def get_read_query(self, table_name, columns, filters):
+        """ Builds the query of read_from_db
+
+        Parameters
+        ----------
+        table_name (Type: str): Name of the table
+        columns (Type: str list): Columns to be read, all columns if None
+        filters (Type: list): (column, operator, value) tuples combined with AND
+
+        Returns
+        -------
+        query (Type: sqlalchemy.sql.Select): Query
+        date_columns (Type: str list): Selected date columns, which are parsed to datetime64
+        """
+        comparisons = {'==': operator.eq, '!=': operator.ne, '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+                       'in': lambda column, value: column.in_(value), 'not in': lambda column, value: column.notin_(value)}
+
+        table = sqlalchemy.Table(table_name, sqlalchemy.MetaData(), autoload=True, autoload_with=self.engine)
+        for col in (columns or []) + [col for col, _, _ in (filters or [])]:
+            if col not in table.c:
+                raise ValueError("Table " + table_name + " has no column " + str(col))
+
+        selected = [table.c[col] for col in columns] if columns else list(table.columns)
+        query = sqlalchemy.select(selected)
+        for col, comparison, value in filters or []:
+            if comparison not in comparisons:
+                raise ValueError("Unknown filter operator " + str(comparison) + ", expected one of " + ", ".join(comparisons))
+            query = query.where(comparisons[comparison](table.c[col], value))
+
+        date_columns = [col.name for col in selected if isinstance(col.type, sqlalchemy.types.Date)]
+        return query, date_columns
+
+
+    def convert_result(self, df, output):
+        """ Converts a query result to the requested output
+
+        Parameters
+        ----------
+        df (Type: pandas.DataFrame): Query result
+        output (Type: str): 'pandas' or 'arrow'
+
+        Returns
+        -------
+        pandas.DataFrame or pyarrow.Table
+        """
+        if output == 'pandas':
+            return df
+
+        import pyarrow as pa
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+
+    def get_row_hash_table(self, table_name, primary_key):
+        """ Returns the table storing the content hash of every row of the given table
+
+        Parameters
+        ----------
+        table_name (Type: str): Name of the table whose rows are hashed
+        primary_key (Type: str list): Primary key columns of that table
+
+        Returns
+        -------
+        sqlalchemy.Table with the primary key columns and a row_hash column
+        """
+        return sqlalchemy.Table(table_name + '_row_hash', sqlalchemy.MetaData(),
+                                *[Column(col, sqlalchemy.types.BIGINT, primary_key=True) for col in primary_key],
+                                Column('row_hash', sqlalchemy.types.BIGINT, nullable=False))
+
+
+    def drop_row_hashes(self, table_name, connection):
+        """ Drops the content hashes stored for the rows of a table that is replaced. Hashes of rows that are no longer in the table,
+        or whose content changed, would otherwise make upsert_frame skip rows of later incremental loads as unchanged.
+        The next incremental load stages all its rows and stores their hashes again.
+
+        Parameters
+        ----------
+        table_name (Type: str): Name of the replaced table
+        connection (Type: sqlalchemy.engine.Connection): Connection of the transaction the table is replaced in
+
+        Returns
+        -------
+        None
+        """
+        sqlalchemy.Table(table_name + '_row_hash', sqlalchemy.MetaData()).drop(connection, checkfirst=True)
+
+
+    def get_upsert_statement(self, target_table, staging_table, primary_key):
+        """ Builds an INSERT ... SELECT ... ON CONFLICT DO UPDATE statement, supported by both PostgreSQL and SQLite
+
+        Parameters
+        ----------
+        target_table (Type: sqlalchemy.Table): Table to be inserted into
+        staging_table (Type: sqlalchemy.Table): Table holding the staged rows
+        primary_key (Type: str list): Conflict target columns
+
+        Returns
+        -------
+        statement (Type: str): SQL statement
+        """
+        preparer = self.engine.dialect.identifier_preparer
+        columns = [preparer.quote(col.name) for col in target_table.columns]
+        updates = [col + " = excluded." + col for col in columns if col not in [preparer.quote(key) for key in primary_key]]
+
+        # "WHERE true" resolves the parsing ambiguity of INSERT ... SELECT ... ON CONFLICT in SQLite
+        return sqlalchemy.text("INSERT INTO {target} ({columns}) SELECT {columns} FROM {staging} WHERE true "
+                               "ON CONFLICT ({keys}) DO UPDATE SET {updates}".format(
+                                   target=preparer.quote(target_table.name), staging=preparer.quote(staging_table.name),
+                                   columns=", ".join(columns), keys=", ".join(preparer.quote(key) for key in primary_key),
+                                   updates=", ".join(updates)))
+
+
+    def conform_to_table(self, df, table):
+        """ Converts float columns of the dataframe that are stored in integer columns of the table to nullable integers,
+        so that bulk loaders do not write them as "1.0"
+
+        Parameters
+        ----------
+        df (Type: pandas.DataFrame): Dataframe to be inserted
+        table (Type: sqlalchemy.Table): Table the dataframe is inserted into
+
+        Returns
+        -------
+        df (Type: pandas.DataFrame): Dataframe with integer columns
+        """
+        integer_columns = [col.name for col in table.columns
+                           if isinstance(col.type, sqlalchemy.types.Integer) and col.name in df.columns
+                           and not pd.api.types.is_integer_dtype(df[col.name])]
+
+        return df.assign(**{col: pd.to_numeric(df[col]).round().astype('Int64') for col in integer_columns})
+
+
+    def copy_into_db(self, df_to_insert, chunksize, table_name, if_exists='replace', connection=None):
+        """ Bulk loads the dataframe by streaming it through an in-memory csv buffer into PostgreSQL's COPY ... FROM STDIN
+
+        Parameters
+        ----------
+        df_to_insert (Type: pandas.DataFrame): Dataframe to be inserted
+        chunksize (Type: int): Number of rows serialized into the buffer per COPY statement
+        table_name (Type: str): Name of the table to be (re)created and loaded
+        if_exists (Type: str): 'replace' to recreate the table, 'append' to add rows to an existing table
+        connection (Type: sqlalchemy.engine.Connection): Connection of the transaction the rows are copied in,
+                                                         a new connection is used and committed if not given
+
+        Returns
+        -------
+        None
+        """
+
+        # Let pandas (re)create an empty table matching the dataframe, the rows are loaded by COPY below
+        self.create_table(df_to_insert, table_name, if_exists, connection)
+
+        preparer = self.engine.dialect.identifier_preparer
+        columns = ", ".join(preparer.quote(str(col)) for col in df_to_insert.columns)
+        table = preparer.quote(table_name)
+
+        # The rows are copied through the DBAPI connection of the given transaction, which is committed by its owner
+        dbapi_connection = connection.connection if connection is not None else self.engine.raw_connection()
+        try:
+            cursor = dbapi_connection.cursor()
+            step = chunksize or max(len(df_to_insert), 1)
+            for start in range(0, len(df_to_insert), step):
+                # Datetime columns holding dates only are written as "YYYY-MM-DD", the others with their time
+                buffer = io.StringIO()
+                df_to_insert.iloc[start:start + step].to_csv(buffer, index=False, header=False)
+                buffer.seek(0)
+
+                if self.engine.dialect.name == 'postgresql':
+                    cursor.copy_expert("COPY {} ({}) FROM STDIN WITH (FORMAT csv)".format(table, columns), buffer)
+                else:
+                    # Local stand-in (e.g. SQLite) for databases without COPY: replay the same buffer with executemany
+                    placeholders = ", ".join(["?" if self.engine.dialect.paramstyle == 'qmark' else "%s"] * len(df_to_insert.columns))
+                    rows = ([value if value != '' else None for value in row] for row in csv.reader(buffer))
+                    cursor.executemany("INSERT INTO {} ({}) VALUES ({})".format(table, columns, placeholders), rows)
+            if connection is None:
+                dbapi_connection.commit()
+        finally:
+            if connection is None:
+                dbapi_connection.close()
+
+
+    def binary_copy_into_db(self, df_to_insert, chunksize, table_name, if_exists='replace', connection=None):
+        """ Bulk loads the dataframe with PostgreSQL's COPY ... FROM STDIN WITH (FORMAT binary). The columns are encoded
+        with the types of the columns of the table straight from their arrays, see binary_copy.py. Other databases
+        are loaded by copy_into_db.
+
+        Parameters
+        ----------
+        df_to_insert (Type: pandas.DataFrame): Dataframe to be inserted
+        chunksize (Type: int): Number of rows encoded into the buffer per COPY statement
+        table_name (Type: str): Name of the table to be (re)created and loaded
+        if_exists (Type: str): 'replace' to recreate the table, 'append' to add rows to an existing table
+        connection (Type: sqlalchemy.engine.Connection): Connection of the transaction the rows are copied in,
+                                                         a new connection is used and committed if not given
+
+        Returns
+        -------
+        None
+        """
+        if self.engine.dialect.name != 'postgresql':
+            self.copy_into_db(df_to_insert, chunksize, table_name, if_exists, connection)
+            return
+
+        self.create_table(df_to_insert, table_name, if_exists, connection)
+
+        # Every column is encoded with the type of its column in the table, e.g. int4 for the INT columns of the model
+        table_types = {col['name']: col['type'] for col in sqlalchemy.inspect(connection or self.engine).get_columns(table_name)}
+        sql_types = [table_types[col] for col in df_to_insert.columns]
+
+        preparer = self.engine.dialect.identifier_preparer
+        statement = "COPY {} ({}) FROM STDIN WITH (FORMAT binary)".format(
+            preparer.quote(table_name), ", ".join(preparer.quote(str(col)) for col in df_to_insert.columns))
+
+        dbapi_connection = connection.connection if connection is not None else self.engine.raw_connection()
+        try:
+            cursor = dbapi_connection.cursor()
+            step = chunksize or max(len(df_to_insert), 1)
+            for start in range(0, len(df_to_insert), step):
+                cursor.copy_expert(statement, io.BytesIO(encode_binary_copy(df_to_insert.iloc[start:start + step], sql_types)))
+            if connection is None:
+                dbapi_connection.commit()
+        finally:
+            if connection is None:
+                dbapi_connection.close()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+""" This module reports the row counts and versions of the loan table and of the tables maintained next to it
+
+It only depends on SQLAlchemy, so that the stats command of app.py does not have to import pandas or the ETL.
+"""
+
+import sqlalchemy
+
+# Table holding the version of every table written by SQLMetadataService, see bump_table_versions
+TABLE_VERSION_TABLE_NAME = 'table_version'
+
+
+def get_table_stats(engine, table_name):
+    """ Returns the number of rows and the version of the given table, its quarantine table and its rollup tables
+
+    Parameters
+    ----------
+    engine (Type: sqlalchemy.engine.Engine): Engine of the database
+    table_name (Type: str): Name of the loan table
+
+    Returns
+    -------
+    stats (Type: list): (table name, number of rows, version) tuples of the existing tables, version None if unknown
+    """
+    existing_tables = sqlalchemy.inspect(engine).get_table_names()
+    table_names = [name for name in [table_name, table_name + '_quarantine'] if name in existing_tables]
+    table_names += sorted(name for name in existing_tables if name.startswith(table_name + '_rollup_'))
+
+    metadata = sqlalchemy.MetaData()
+    stats = []
+    with engine.connect() as connection:
+        versions = {}
+        if TABLE_VERSION_TABLE_NAME in existing_tables:
+            version_table = sqlalchemy.Table(TABLE_VERSION_TABLE_NAME, metadata, autoload=True, autoload_with=connection)
+            versions = dict(connection.execute(sqlalchemy.select([version_table.c.table_name, version_table.c.version])).fetchall())
+
+        for name in table_names:
+            table = sqlalchemy.table(name)
+            rows = connection.execute(sqlalchemy.select([sqlalchemy.func.count()]).select_from(table)).scalar()
+            stats.append((name, rows, versions.get(name)))
+
+    return stats
+
+
+def get_quarantine_reasons(engine, table_name):
+    """ Returns the number of quarantined rows of the given table by reason codes
+
+    Parameters
+    ----------
+    engine (Type: sqlalchemy.engine.Engine): Engine of the database
+    table_name (Type: str): Name of the loan table
+
+    Returns
+    -------
+    reasons (Type: list): (reason codes, number of rows) tuples from the most to the least frequent, empty if there is no quarantine table
+    """
+    quarantine_table_name = table_name + '_quarantine'
+    if quarantine_table_name not in sqlalchemy.inspect(engine).get_table_names():
+        return []
+
+    reason_codes = sqlalchemy.column('reason_codes')
+    rows = sqlalchemy.func.count().label('rows')
+    query = (sqlalchemy.select([reason_codes, rows]).select_from(sqlalchemy.table(quarantine_table_name))
+             .group_by(reason_codes).order_by(rows.desc()))
+    with engine.connect() as connection:
+        return [tuple(row) for row in connection.execute(query).fetchall()]
@@ -2,6 +2,7 @@
 
 """ This class performs data cleaning and validation """
 
+import collections
 import numpy as np
 import pandas as pd
 import os
@@ -9,12 +10,35 @@ import re
 
 # Import user-defined libraries
 from logger.logger import get_logger
+from logger.profiler import StageProfiler
+from etl.cleaning_plan import apply_cleaning_plan, compile_cleaning_plan
+from etl.fingerprint_index import FingerprintIndex
+from etl.hashing import hash_rows
+from etl.validation import REASON_CODES_COLUMN, compile_validation_rules, validate_frame
 
 class ETL:
 
-    def __init__(self, logger):
+    def __init__(self, logger, streaming=False, profiler=None, key_columns=None, fingerprint_index=None):
         self.logger = logger
 
+        # Every cleaning stage is timed by the profiler, a disabled one is used if none is given
+        self.profiler = profiler or StageProfiler(logger, enabled=False)
+
+        # Duplicate rows are identified by the fingerprints of whole rows, or of their key columns (e.g. ['id']) if given
+        self.key_columns = key_columns
+
+        # In streaming mode the dataframes passed to clean_and_validate are chunks of the same file,
+        # so the fingerprints of the rows that have been kept so far are remembered to drop duplicates across chunks.
+        # A persistent fingerprint index given by the caller also remembers them across loads.
+        self.streaming = streaming
+        self.fingerprint_index = fingerprint_index if fingerprint_index is not None or not streaming else FingerprintIndex()
+
+        # Rows rejected by the validation rules are kept until they are written to the quarantine table.
+        # The values repaired by the cleaning rules and the violations of the validation rules are counted across calls.
+        self.rejected_frames = []
+        self.repair_counts = collections.Counter()
+        self.violation_counts = collections.Counter()
+
 
     def loan_condition(self, emp_length):
         """ Helper method for data cleaning, which replaces employement length with integers
@@ -33,137 +57,126 @@ class ETL:
         if emp_length.strip() == '< 1 year':
             return 0
 
-    def check_if_numeric(self, df):
-        """ Method that replaces all non-numeric rows that are not nullable with zeros
+    def get_fingerprints(self, df):
+        """ Method that returns the 64-bit fingerprints of the rows of the dataframe, or of their key columns if given
 
         Parameters
         ----------
-        df (pandas dataframe): Input dataframe to be checked
+        df (pandas dataframe): Input dataframe (or chunk)
 
         Returns
         -------
-        df (pandas dataframe): Dataframe having zeros for not nullable columns
+        fingerprints (Type: numpy.ndarray): uint64 fingerprint of every row
         """
-        # Replace all non-numeric rows that are not nullable with zeros
-        numeric_cols = ['loan_amnt', 'funded_amnt', 'funded_amnt_inv', 'int_rate', 'installment',
-                        'emp_length', 'annual_inc', 'dti', 'delinq_2yrs', 'inq_last_6mths', 'mths_since_last_delinq',
-                        'mths_since_last_record', 'open_acc', 'pub_rec', 'revol_bal', 'revol_util', 'total_acc',
-                        'out_prncp', 'out_prncp_inv', 'total_pymnt', 'total_pymnt_inv', 'total_rec_prncp',
-                        'total_rec_int', 'total_rec_late_fee', 'recoveries', 'collection_recovery_fee',
-                        'last_pymnt_amnt', 'policy_code'
-                        ]
-
-        for col in numeric_cols:
-            try:
-                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-            except (Exception) as e:
-                self.logger.error("Numeric conversion failed! " + str(e))
-
-        return df
+        return hash_rows(df[self.key_columns] if self.key_columns else df)
 
 
-    def convert_to_date(self, df):
-        """ Method that converts all text-based data points to datetime objects
+    def remove_duplicates(self, df):
+        """ Method that removes duplicate rows by their 64-bit fingerprints, also across previously cleaned chunks (and loads)
+        if a fingerprint index is kept. The fingerprints of the kept rows are not added to the index, see deduplicate_and_validate.
 
         Parameters
         ----------
-        df (pandas dataframe): Input dataframe to be converted
+        df (pandas dataframe): Input dataframe (or chunk) to be deduplicated
 
         Returns
         -------
-        df (pandas dataframe): Dataframe with converted datetime values
+        df (pandas dataframe): Dataframe without duplicate rows
+        fingerprints (Type: numpy.ndarray): uint64 fingerprints of the kept rows
         """
+        # Hash every row (or its key columns) once instead of comparing the full rows
+        fingerprints = self.get_fingerprints(df)
+        if self.fingerprint_index is None:
+            is_new = ~pd.Series(fingerprints).duplicated().values
+        else:
+            is_new = self.fingerprint_index.find_new(fingerprints)
 
-        # Convert date columns to dates
-        date_cols = ['issue_d', 'earliest_cr_line', 'last_credit_pull_d', 'last_pymnt_d', 'next_pymnt_d']
+        # A dataframe without duplicates is passed on as it is instead of being copied
+        if is_new.all():
+            return df, fingerprints
 
-        for col in date_cols:
-            try:
-                df[col] = pd.to_datetime(df[col], format='%b-%Y').dt.date
-            except (Exception) as e:
-                self.logger.error("Date conversion failed! " + str(e))
+        return df[is_new], fingerprints[is_new]
 
-        return df
 
-    def convert_to_positive(self, df):
-        """ Method that converts all negative numeric data points to positive if there is any
+    def commit_fingerprints(self):
+        """ Commits the fingerprints of the oldest cleaned chunk to the fingerprint index once the chunk has been inserted
 
         Parameters
         ----------
-        df (pandas dataframe): Input dataframe to be converted
+        None
 
         Returns
         -------
-        df (pandas dataframe): Dataframe with numeric values converted to positive
+        None
         """
+        if self.fingerprint_index is not None:
+            self.fingerprint_index.commit()
 
-        # Get only the numeric variables and make sure they are all positive
-        numeric_columns = df.select_dtypes(exclude=["object"])
-        for col in numeric_columns:
-            df[col] = df[col].apply(lambda x: abs(x))
 
-        return df
-
-
-    def miscellaneous(self, df):
-        """ Method that performs miscellaneous data cleaning and validation for some columns of the given dataframe
+    def get_pending_fingerprints(self):
+        """ Returns the fingerprints of the oldest cleaned chunk that have not been committed yet, e.g. to be stored in its checkpoint
 
         Parameters
         ----------
-        df (pandas dataframe): Input dataframe to be cleaned and validated
+        None
 
         Returns
         -------
-        df (pandas dataframe): Dataframe with cleaned and validated values
+        fingerprints (Type: numpy.ndarray): uint64 fingerprints of the kept rows, None if no fingerprint index is kept
         """
+        if self.fingerprint_index is None:
+            return None
 
-        # Replace if there is any n/a field in the dataframe
-        df.replace('n/a', np.nan, inplace=True)
+        return self.fingerprint_index.peek()
 
-        # Remove all duplicate rows from the given dataframe
-        df = df.drop_duplicates()
 
-        # Replacing "employment length" column with integer number as follows:
-        # Replace by zero if it is NULL
-        # Replace "10+" with "10" and
-        # Replace "< 1" with "0" as described in the loan stats dictionary
-        # Remove all non-numeric chars
-        df['emp_length'].fillna(value=0, inplace=True)
-        df['emp_length'].replace(to_replace='10+ years', value='10', inplace=True)
-        df['emp_length'].replace(to_replace='< 1 year', value='0', inplace=True)
-        df['emp_length'].replace(to_replace='[^0-9]+', value='', inplace=True, regex=True)
+    def restore_fingerprints(self, fingerprints):
+        """ Adds the fingerprints of rows loaded by an earlier run to the fingerprint index, so that their duplicates are removed
+        when the load is resumed
 
-        # Remove leading whitespaces and get the integer part of the "term" column
-        df['term'] = df['term'].apply(lambda x: x.strip())
-        df['term'] = df['term'].apply(lambda x: int(x.split()[0]))
+        Parameters
+        ----------
+        fingerprints (Type: numpy.ndarray): uint64 fingerprints
 
-        # Annual income can not be NULL. Replace those rows with zeros.
-        df['annual_inc'].fillna(value=0, inplace=True)
+        Returns
+        -------
+        None
+        """
+        if self.fingerprint_index is not None:
+            self.fingerprint_index.restore(fingerprints)
 
-        # Replace NULL values in "verification_status" with 'Not Verified'
-        df['verification_status'].fillna(value='Not Verified', inplace=True)
 
-        # FUTURE WORK: There are some rows with debt-to-income (dti) ratio equal to zero
-        # In order to give a better estimation about dti
-        # an estimate dti can be calculated by calculating
-        # installment/(annual_inc/12)*100
+    def discard_fingerprints(self):
+        """ Forgets the fingerprints of the oldest cleaned chunk, which could not be inserted
 
+        Parameters
+        ----------
+        None
 
-        # There is an ID as "Loans that do not meet the credit policy".
-        # There could me more. Remove them by dropping rows with no
-        # member id.
-        indexNames = df[pd.isna(df['member_id'])].index
+        Returns
+        -------
+        None
+        """
+        if self.fingerprint_index is not None:
+            self.fingerprint_index.discard()
 
-        # Delete these row indexes from dataFrame
-        df.drop(indexNames , inplace=True)
 
-        # delinq_2yrs can not be NULL. Replace NULL values with zeros.
-        df['delinq_2yrs'].fillna(value=0, inplace=True)
+    def pop_rejected_rows(self):
+        """ Returns the rows rejected by the validation rules since the last call and forgets them
 
-        # inq_last_6mths can not be NULL. Replace NULL values with zeros.
-        df['inq_last_6mths'].fillna(value=0, inplace=True)
+        Parameters
+        ----------
+        None
 
-        return df
+        Returns
+        -------
+        rejected_df (Type: pandas.DataFrame): Rejected rows with their reason codes, None if no dataframe has been validated
+        """
+        rejected_frames, self.rejected_frames = self.rejected_frames, []
+        if not rejected_frames:
+            return None
+
+        return pd.concat(rejected_frames)
 
 
     def clean_and_validate(self, df):
@@ -178,17 +191,66 @@ class ETL:
         -------
         df (Type: pandas.DataFrame): Dataframe with cleaned and validated values
         """
+        return self.deduplicate_and_validate(self.clean(df))
 
-        # Do numeric control on the dataset
-        df = self.check_if_numeric(df)
 
-        # Perform a conversion to make sure that there is no negative numeric values
-        df = self.convert_to_positive(df)
+    def clean(self, df):
+        """
+        Method that applies the cleaning rules to the contents of the dataframe provided as the input
+
+        Parameters
+        ----------
+        df (Type: pandas.DataFrame): Dataframe with values to be cleaned
 
-        # Perform date conversion for text-based dates
-        df = self.convert_to_date(df)
+        Returns
+        -------
+        df (Type: pandas.DataFrame): Dataframe with cleaned values
+        """
+
+        # Apply the rule chain of every column in a single pass
+        with self.profiler.stage('apply_cleaning_plan', rows=len(df)) as record:
+            repair_counts = collections.Counter()
+            df = apply_cleaning_plan(df, compile_cleaning_plan(df.dtypes), self.logger, repair_counts)
+            record['repairs'] = dict(repair_counts)
+            self.repair_counts.update(repair_counts)
+
+        return df
 
-        # Perform extra data cleaning and validation
-        df = self.miscellaneous(df)
+
+    def deduplicate_and_validate(self, df):
+        """
+        Method that removes the duplicate rows of the cleaned dataframe provided as the input and validates the others
+
+        Parameters
+        ----------
+        df (Type: pandas.DataFrame): Dataframe with cleaned values
+
+        Returns
+        -------
+        df (Type: pandas.DataFrame): Dataframe with cleaned and validated values
+        """
+
+        # Remove all duplicate rows from the given dataframe
+        with self.profiler.stage('remove_duplicates', rows=len(df)):
+            df, fingerprints = self.remove_duplicates(df)
+
+        # Reject the rows failing a validation rule, e.g. the ones with no member id such as
+        # "Loans that do not meet the credit policy". They are kept to be written to the quarantine table.
+        with self.profiler.stage('validate', rows=len(df)) as record:
+            df, rejected_df, violation_counts = validate_frame(df, compile_validation_rules(df.columns))
+            record['violations'] = violation_counts
+            record['rejected_rows'] = len(rejected_df)
+            self.violation_counts.update(violation_counts)
+            self.rejected_frames.append(rejected_df)
+
+        # Only the fingerprints of the valid rows are pending until commit_fingerprints is called, so that a corrected version
+        # of a rejected row is not dropped as its duplicate. Rejected rows are few, their fingerprints are removed from the batch.
+        if self.fingerprint_index is not None:
+            if len(rejected_df):
+                fingerprints = fingerprints[~np.isin(fingerprints, self.get_fingerprints(rejected_df.drop(columns=REASON_CODES_COLUMN)))]
+            self.fingerprint_index.add_pending(fingerprints)
+
+        # There are some rows with debt-to-income (dti) ratio equal to zero. They are kept as they are in the loan table,
+        # their dti is estimated as installment/(annual_inc/12)*100 in the feature table (see features.py)
 
         return df
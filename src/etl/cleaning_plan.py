@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+
+""" This module declares the cleaning rules of every column once, as a table, and applies them in a single pass
+
+Each column is taken out of the dataframe once, its whole rule chain is applied to its values and the result is
+put back once. A rule works in place on an array the chain already owns, so a column is copied at most once however
+many rules it has, and adding a rule to a column does not add another pass over the whole dataframe.
+
+Every rule also counts the values it had to repair (e.g. text coerced to NaN or negative numbers made positive),
+so that lossy conversions are reported instead of being applied silently.
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+# Columns whose non-numeric values are replaced with numbers and whose missing values are replaced with zeros
+NUMERIC_COLUMNS = ['loan_amnt', 'funded_amnt', 'funded_amnt_inv', 'int_rate', 'installment',
+                   'annual_inc', 'dti', 'delinq_2yrs', 'inq_last_6mths', 'mths_since_last_delinq',
+                   'mths_since_last_record', 'open_acc', 'pub_rec', 'revol_bal', 'revol_util', 'total_acc',
+                   'out_prncp', 'out_prncp_inv', 'total_pymnt', 'total_pymnt_inv', 'total_rec_prncp',
+                   'total_rec_int', 'total_rec_late_fee', 'recoveries', 'collection_recovery_fee',
+                   'last_pymnt_amnt', 'policy_code'
+                   ]
+
+# Text-based "Mon-YYYY" dates converted to datetime64 values (at day resolution)
+DATE_COLUMNS = ['issue_d', 'earliest_cr_line', 'last_credit_pull_d', 'last_pymnt_d', 'next_pymnt_d']
+DATE_FORMAT = '%b-%Y'
+
+# Text values that mean a missing value
+NA_STRINGS = ['n/a']
+
+# Employment lengths whose number is not the number of years
+EMP_LENGTH_VALUES = {'< 1 year': '0'}
+
+# Rule chain of every column as (rule name, argument) pairs, applied from left to right.
+# The rules are defined in RULE_FUNCTIONS below.
+CLEANING_RULES = {
+    **{col: [('to_numeric', None), ('fillna', 0), ('abs', None)] for col in NUMERIC_COLUMNS},
+    **{col: [('parse_dates', DATE_FORMAT)] for col in DATE_COLUMNS},
+
+    # Remove leading whitespaces and get the integer part of the "term" column, e.g. " 36 months"
+    'term': [('na_strings', NA_STRINGS), ('extract_int', r'(\d+)')],
+
+    # Replace NULL values in "verification_status" with 'Not Verified'
+    'verification_status': [('na_strings', NA_STRINGS), ('fillna', 'Not Verified')],
+
+    # Replace "employment length" with an integer number as described in the loan stats dictionary, e.g. "10+ years" with 10,
+    # "< 1 year" with 0 and NULL values with 0
+    'emp_length': [('na_strings', NA_STRINGS), ('replace', EMP_LENGTH_VALUES), ('extract_int', r'(\d+)'), ('fillna', 0)],
+}
+
+# Rules of the columns that are not in CLEANING_RULES: every numeric value is made positive
+# and the missing values of text columns are marked as such
+DEFAULT_RULES = [('na_strings', NA_STRINGS), ('abs', None)]
+
+
+def is_numeric(values):
+    """ Returns whether an array holds numbers, booleans excluded """
+    return isinstance(values, np.ndarray) and values.dtype.kind in 'iuf'
+
+
+def is_text(values):
+    """ Returns whether an array holds text """
+    return isinstance(values, pd.Categorical) or pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values)
+
+
+def to_numeric(values, argument, owned):
+    """ Converts text values to numbers, values that are not numbers become NaN and are counted as repaired """
+    if is_numeric(values):
+        return values, 0
+    converted = pd.to_numeric(np.asarray(values, dtype=object), errors='coerce')
+    return converted, int(np.count_nonzero(pd.isna(converted) & ~pd.isna(values)))
+
+
+def fillna(values, value, owned):
+    """ Replaces the missing values with the given value, which are counted as repaired """
+    if isinstance(values, np.ndarray) and values.dtype.kind in 'iub':
+        return values, 0
+    is_missing = np.isnan(values) if values.dtype.kind == 'f' else pd.isna(values)
+    repaired = int(np.count_nonzero(is_missing))
+    if not isinstance(values, np.ndarray):
+        if isinstance(values, pd.Categorical) and repaired and value not in values.categories:
+            values = values.add_categories([value])
+        return values.fillna(value), repaired
+    if repaired:
+        values = values if owned else values.copy()
+        values[is_missing] = value
+    return values, repaired
+
+
+def make_positive(values, argument, owned):
+    """ Replaces negative numbers with their absolute values, which are counted as repaired """
+    if not is_numeric(values) or values.dtype.kind == 'u':
+        return values, 0
+    repaired = int(np.count_nonzero(values < 0))
+    if not repaired:
+        return values, 0
+    return np.abs(values, out=values if owned else None), repaired
+
+
+def replace_na_strings(values, na_strings, owned):
+    """ Replaces the text values that mean a missing value with NaN """
+    if isinstance(values, pd.Categorical):
+        # Only the categories have to be checked, not every row
+        present = [na_string for na_string in na_strings if na_string in values.categories]
+        return (values.remove_categories(present) if present else values), 0
+    if not is_text(values):
+        return values, 0
+
+    is_missing = np.zeros(len(values), dtype=bool)
+    for na_string in na_strings:
+        is_equal = values == na_string
+        is_missing |= is_equal if isinstance(is_equal, np.ndarray) else is_equal.to_numpy(dtype=bool, na_value=False)
+    if is_missing.any():
+        values = values if owned else values.copy()
+        values[is_missing] = np.nan
+    return values, 0
+
+
+def map_unique_values(values, func):
+    """ Applies a function converting a single value once per distinct value of a low-cardinality column
+    and maps the results back to all rows. Missing values stay missing.
+
+    Parameters
+    ----------
+    values (Type: numpy.ndarray or pandas.Categorical): Column to be converted
+    func (Type: function): Function converting a single value
+
+    Returns
+    -------
+    numpy.ndarray of converted values
+    """
+    codes, unique_values = pd.factorize(values)
+    converted = [func(value) for value in unique_values]
+    if (codes < 0).any():
+        # Missing values have the code -1, which takes the trailing NaN
+        converted.append(np.nan)
+
+    return pd.Series(converted, dtype=None if converted else 'float64').values.take(codes)
+
+
+def parse_dates(values, date_format, owned):
+    """ Parses text-based dates. The column only holds a few hundred distinct values,
+    so every distinct value is parsed once and the results are mapped back to the rows.
+    Values that are not dates become NaT and are counted as repaired. """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values, 0
+
+    codes, unique_values = pd.factorize(values)
+    parsed = pd.to_datetime(unique_values, format=date_format, errors='coerce').values
+    dates = np.append(parsed, np.datetime64('NaT'))
+
+    # Missing values have the code -1, which takes the trailing NaT
+    is_invalid = np.isnat(parsed)
+    repaired = int(np.count_nonzero(is_invalid[codes[codes >= 0]])) if is_invalid.any() else 0
+    return dates.take(codes), repaired
+
+
+def replace_values(values, mapping, owned):
+    """ Replaces the text values that are keys of the mapping with their values. Every distinct value is looked up once. """
+    if not is_text(values):
+        return values, 0
+    if isinstance(values, pd.Categorical) and not any(key in values.categories for key in mapping):
+        return values, 0
+
+    return map_unique_values(values, lambda value: mapping.get(value, value)), 0
+
+
+def extract_int(values, pattern, owned):
+    """ Replaces text values with the integer captured by the first group of the regular expression.
+    Values that do not match become NaN and are counted as repaired. """
+    if is_numeric(values):
+        return values, 0
+
+    regex = re.compile(pattern)
+
+    def convert(value):
+        match = regex.search(value)
+        return int(match.group(1)) if match else np.nan
+
+    converted = map_unique_values(values, convert)
+    return converted, int(np.count_nonzero(pd.isna(converted) & ~pd.isna(values)))
+
+
+# Rule name, as used in CLEANING_RULES, to the function applying it. Every function takes the values of a column,
+# the argument of the rule and whether the values are owned by the rule chain (and can be modified in place),
+# and returns the converted values and the number of values it repaired.
+# A rule returns its input unchanged if it does not apply to its dtype.
+RULE_FUNCTIONS = {
+    'to_numeric': to_numeric,
+    'fillna': fillna,
+    'abs': make_positive,
+    'na_strings': replace_na_strings,
+    'parse_dates': parse_dates,
+    'extract_int': extract_int,
+    'replace': replace_values,
+}
+
+
+def compile_cleaning_plan(dtypes):
+    """ Resolves the rule chains of the columns of a dataframe. The default rules that do not apply to the dtype of
+    a column are dropped, and columns without any rule left are not part of the plan.
+
+    Parameters
+    ----------
+    dtypes (Type: pandas.Series): Dtypes of the dataframe to be cleaned, indexed by column name
+
+    Returns
+    -------
+    plan (Type: list): (column name, list of (rule name, rule function, argument)) pairs
+    """
+    plan = []
+    for col, dtype in dtypes.items():
+        if col in CLEANING_RULES:
+            rules = CLEANING_RULES[col]
+        elif pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype):
+            rules = [rule for rule in DEFAULT_RULES if rule[0] == 'abs']
+        elif pd.api.types.is_categorical_dtype(dtype) or pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype):
+            rules = [rule for rule in DEFAULT_RULES if rule[0] == 'na_strings']
+        else:
+            rules = []
+
+        if rules:
+            plan.append((col, [(name, RULE_FUNCTIONS[name], argument) for name, argument in rules]))
+
+    return plan
+
+
+def apply_cleaning_plan(df, plan, logger, repair_counts=None):
+    """ Applies the rule chain of every column of the plan to the dataframe, column by column.
+    A column whose chain fails is logged and left unchanged.
+
+    Parameters
+    ----------
+    df (Type: pandas.DataFrame): Dataframe to be cleaned, its columns are replaced in place
+    plan (Type: list): Plan returned by compile_cleaning_plan
+    logger (Type: logging.Logger): Logger object
+    repair_counts (Type: collections.Counter): Counter the number of repaired values is added to, as "<rule name>:<column>"
+
+    Returns
+    -------
+    df (Type: pandas.DataFrame): Dataframe with cleaned values
+    """
+    for col, rules in plan:
+        # Numpy columns are converted as arrays and extension columns (e.g. categoricals) as extension arrays
+        original = df[col].to_numpy() if isinstance(df[col].dtype, np.dtype) else df[col].array
+        values = original
+        owned = False
+        repairs = {}
+        try:
+            for name, func, argument in rules:
+                converted, repairs[name + ':' + col] = func(values, argument, owned)
+                owned = owned or converted is not values
+                values = converted
+        except (Exception) as e:
+            logger.error("Cleaning rule " + name + " failed for column " + col + "! " + str(e))
+            continue
+
+        if values is not original:
+            df[col] = values
+        if repair_counts is not None:
+            repair_counts.update({key: count for key, count in repairs.items() if count})
+
+    return df
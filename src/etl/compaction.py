@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+""" This module converts a cleaned dataframe to a compact in-memory representation before it is loaded """
+
+import numpy as np
+import pandas as pd
+import sqlalchemy
+
+# Import user-defined libraries
+from db.sql_metadata_service import SQLMetadata
+
+# Text columns with at most this ratio of distinct values to rows are stored as categoricals
+CATEGORY_MAX_RATIO = 0.5
+
+# Integer dtypes from the smallest to the largest, and their nullable counterparts used for columns with missing values
+INTEGER_DTYPES = ['int8', 'int16', 'int32', 'int64']
+NULLABLE_INTEGER_DTYPES = ['Int8', 'Int16', 'Int32', 'Int64']
+
+
+def get_memory_usage_mb(df):
+    """ Returns the memory used by a dataframe including the contents of its object columns
+
+    Parameters
+    ----------
+    df (Type: pandas.DataFrame): Dataframe
+
+    Returns
+    -------
+    memory_usage_mb (Type: float): Memory usage in megabytes
+    """
+    return round(df.memory_usage(deep=True).sum() / 1024 / 1024, 1)
+
+
+def downcast_integers(values):
+    """ Converts a numeric column whose values are all integers to the smallest integer dtype that holds them.
+    Columns with missing values are converted to nullable integers.
+
+    Parameters
+    ----------
+    values (Type: pandas.Series): Numeric column
+
+    Returns
+    -------
+    values (Type: pandas.Series): Integer column, None if the values are not all integers or already use the smallest dtype
+    """
+    is_null = values.isna().values
+    floats = values.to_numpy(dtype=np.float64, na_value=np.nan)
+    non_null = floats[~is_null]
+    if len(non_null) == 0 or not np.array_equal(np.floor(non_null), non_null):
+        return None
+
+    minimum, maximum = non_null.min(), non_null.max()
+    for dtype, nullable_dtype in zip(INTEGER_DTYPES, NULLABLE_INTEGER_DTYPES):
+        if np.iinfo(dtype).min <= minimum and maximum <= np.iinfo(dtype).max:
+            if values.dtype in (dtype, nullable_dtype):
+                return None
+            if not is_null.any():
+                return pd.Series(floats.astype(dtype), index=values.index)
+            return pd.Series(pd.arrays.IntegerArray(np.where(is_null, 0, floats).astype(dtype), is_null), index=values.index)
+
+    return None
+
+
+def get_string_dtype():
+    """ Returns the Arrow-backed string dtype, or None if pyarrow is not installed
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    dtype (Type: pandas.StringDtype): Arrow-backed string dtype
+    """
+    try:
+        import pyarrow
+        return pd.StringDtype('pyarrow')
+    except ImportError:
+        return None
+
+
+def compact_frame(df):
+    """ Converts the columns of a dataframe to their most compact lossless representation.
+    Integer columns, and float columns stored as integers in the SQLMetadata model, are downcast to the smallest integer dtype
+    that holds them. Other floats are kept even if their values happen to be integers, so that the column types of the
+    table created from the dataframe do not depend on the data. Low-cardinality text columns become categoricals
+    and the remaining text columns Arrow-backed strings.
+
+    Parameters
+    ----------
+    df (Type: pandas.DataFrame): Cleaned and validated dataframe
+
+    Returns
+    -------
+    df (Type: pandas.DataFrame): Compact dataframe with the same values
+    """
+    string_dtype = get_string_dtype()
+    model_integer_columns = [column.name for column in SQLMetadata.__table__.columns
+                             if isinstance(column.type, sqlalchemy.types.Integer)]
+    converted = {}
+    dtypes = {}
+    for col in df.columns:
+        values = df[col]
+        if pd.api.types.is_categorical_dtype(values):
+            # Categories of rows dropped during cleaning are no longer needed
+            converted[col] = values.cat.remove_unused_categories()
+        elif pd.api.types.is_integer_dtype(values) or (pd.api.types.is_float_dtype(values) and col in model_integer_columns):
+            integers = downcast_integers(values)
+            if integers is not None:
+                converted[col] = integers
+        elif pd.api.types.is_object_dtype(values) and pd.api.types.infer_dtype(values, skipna=True) in ('string', 'empty'):
+            if values.nunique() <= CATEGORY_MAX_RATIO * len(values):
+                dtypes[col] = 'category'
+            elif string_dtype is not None:
+                dtypes[col] = string_dtype
+
+    return df.assign(**converted).astype(dtypes)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+""" This module derives the features of the loans used to train models from the cleaned and validated rows
+
+The features are computed with vectorized operations on whole columns and stored with compact dtypes in the
+"<table name>_features" table, keyed on the id of the loan, so that training jobs read a ready-made feature matrix
+instead of deriving the features row by row.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Grades from the best to the worst, and the five sub-grades of every grade (A1 to G5)
+GRADES = ['A', 'B', 'C', 'D', 'E', 'F', 'G']
+SUB_GRADES = [grade + str(level) for grade in GRADES for level in range(1, 6)]
+
+# Final statuses of the loans. Loans with any other status (e.g. 'Current' or 'Late (31-120 days)') have no default label yet.
+DEFAULT_STATUSES = ['Charged Off', 'Default', 'Does not meet the credit policy. Status:Charged Off']
+PAID_STATUSES = ['Fully Paid', 'Does not meet the credit policy. Status:Fully Paid']
+
+# Columns of the loan table copied to the feature table as 32-bit floats
+NUMERIC_FEATURES = ['loan_amnt', 'int_rate', 'installment', 'annual_inc', 'revol_bal', 'revol_util', 'delinq_2yrs',
+                    'inq_last_6mths', 'open_acc', 'pub_rec', 'total_acc']
+
+# Dtypes of the features, also used to restore them when the feature table is read back from the database
+FEATURE_DTYPES = {
+    'id': 'int64',
+    'issue_d': 'datetime64[ns]',
+    'term': 'Int16',
+    'grade': 'int8',
+    'sub_grade': 'int8',
+    **{col: 'float32' for col in NUMERIC_FEATURES},
+    'dti': 'float32',
+    'dti_estimated': 'int8',
+    'credit_history_months': 'Int16',
+    'default_label': 'Int8',
+}
+
+
+def estimate_dti(installment, annual_inc):
+    """ Estimates the debt-to-income ratio of loans as their monthly installment over the monthly income, in percent
+
+    Parameters
+    ----------
+    installment (Type: numpy.ndarray): Monthly installments
+    annual_inc (Type: numpy.ndarray): Annual incomes
+
+    Returns
+    -------
+    dti (Type: numpy.ndarray): Estimated ratios, NaN where the income is not positive
+    """
+    monthly_inc = np.where(annual_inc > 0, annual_inc / 12, np.nan)
+    return installment / monthly_inc * 100
+
+
+def get_ordinals(values, categories):
+    """ Returns the position of every value in the ordered categories, starting from 1, and 0 for unknown or missing values
+
+    Parameters
+    ----------
+    values (Type: pandas.Series): Text or categorical values
+    categories (Type: list): Ordered categories
+
+    Returns
+    -------
+    ordinals (Type: numpy.ndarray): Ordinals
+    """
+    return pd.Categorical(values.astype(object), categories=categories).codes + 1
+
+
+def get_month_count(start, end):
+    """ Returns the number of months between two datetime columns, which hold the first day of a month
+
+    Parameters
+    ----------
+    start (Type: pandas.Series): Start dates
+    end (Type: pandas.Series): End dates
+
+    Returns
+    -------
+    months (Type: pandas.Series): Month counts, NaN if either date is missing
+    """
+    start = pd.to_datetime(start)
+    end = pd.to_datetime(end)
+    return (end.dt.year - start.dt.year) * 12 + end.dt.month - start.dt.month
+
+
+def compute_features(df):
+    """ Computes the features of a dataframe (or chunk) of loans
+
+    Parameters
+    ----------
+    df (Type: pandas.DataFrame): Cleaned and validated dataframe
+
+    Returns
+    -------
+    features (Type: pandas.DataFrame): id, issue_d, term, grade and sub-grade ordinals, the NUMERIC_FEATURES, dti with the ones
+                                       equal to zero estimated and flagged in dti_estimated, credit_history_months and
+                                       the default label (1 charged off or defaulted, 0 fully paid, missing otherwise),
+                                       with the FEATURE_DTYPES
+    """
+    features = pd.DataFrame({
+        'id': pd.to_numeric(df['id']).values,
+        'issue_d': pd.to_datetime(df['issue_d']).values,
+        'term': pd.to_numeric(df['term']).values,
+        'grade': get_ordinals(df['grade'], GRADES),
+        'sub_grade': get_ordinals(df['sub_grade'], SUB_GRADES),
+    })
+    for col in NUMERIC_FEATURES:
+        features[col] = pd.to_numeric(df[col]).values
+
+    # Some loans have a debt-to-income ratio of zero, which is estimated from their installment and income instead
+    dti = pd.to_numeric(df['dti']).values.astype(np.float64)
+    is_estimated = (dti == 0) & (features['annual_inc'].values > 0)
+    dti[is_estimated] = estimate_dti(features['installment'].values[is_estimated], features['annual_inc'].values[is_estimated])
+    features['dti'] = dti
+    features['dti_estimated'] = is_estimated
+
+    features['credit_history_months'] = get_month_count(df['earliest_cr_line'], df['issue_d']).values
+
+    loan_status = df['loan_status'].astype(object)
+    features['default_label'] = np.select([loan_status.isin(DEFAULT_STATUSES), loan_status.isin(PAID_STATUSES)], [1, 0], np.nan)
+
+    return features.astype(FEATURE_DTYPES)
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+
+""" This class keeps the 64-bit fingerprints of the rows that have been loaded, so that duplicate rows are dropped
+across chunks, and with a persistent index also across loads and input files (e.g. monthly files)
+
+The fingerprints are kept in a sorted array in memory, or in an SQLite file whose primary key index is searched
+instead, so that the index does not have to fit in memory and outlives the process. The fingerprints of a cleaned
+chunk are pending until the chunk has been inserted and commit() is called, and are forgotten by discard() if it
+could not be inserted. Pending fingerprints already count as seen.
+"""
+
+import collections
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+class FingerprintIndex:
+
+    def __init__(self, index_file=None):
+        """ Initializes the index
+
+        Parameters
+        ----------
+        index_file (Type: str): SQLite file the fingerprints are kept in, None to keep them in memory
+
+        Returns
+        -------
+        None
+        """
+        self.index_file = index_file
+        self.fingerprints = np.array([], dtype=np.uint64)
+        self.pending = collections.deque()
+
+        # The chunks are cleaned and inserted by different threads of the ingestion service
+        self.lock = threading.Lock()
+        self.connection = None
+        if index_file is not None:
+            self.connect(index_file)
+
+
+    def connect(self, index_file):
+        """ Opens the SQLite file the fingerprints are kept in and creates its table if it does not exist
+
+        Parameters
+        ----------
+        index_file (Type: str): SQLite file the fingerprints are kept in
+
+        Returns
+        -------
+        None
+        """
+        index_dir = os.path.dirname(index_file)
+        if index_dir and not os.path.exists(index_dir):
+            os.makedirs(index_dir)
+        self.index_file = index_file
+        self.connection = sqlite3.connect(index_file, check_same_thread=False)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS fingerprints (fingerprint INTEGER PRIMARY KEY)")
+        self.connection.execute("CREATE TEMP TABLE lookup (fingerprint INTEGER PRIMARY KEY)")
+        self.connection.commit()
+
+
+    def contains(self, fingerprints):
+        """ Returns which of the given fingerprints have been committed or are pending
+
+        Parameters
+        ----------
+        fingerprints (Type: numpy.ndarray): uint64 fingerprints
+
+        Returns
+        -------
+        is_seen (Type: numpy.ndarray): Boolean mask of the fingerprints in the index
+        """
+        if self.connection is not None:
+            # SQLite integers are signed, the fingerprints are stored with the same bits as int64.
+            # Sorted keys are appended to the primary key index instead of being inserted at random positions.
+            cursor = self.connection.cursor()
+            cursor.execute("DELETE FROM lookup")
+            cursor.executemany("INSERT INTO lookup VALUES (?)", zip(np.unique(fingerprints.view(np.int64)).tolist()))
+            seen = cursor.execute("SELECT fingerprint FROM lookup JOIN fingerprints USING (fingerprint)").fetchall()
+            self.connection.commit()
+            is_seen = np.isin(fingerprints, np.array([row[0] for row in seen], dtype=np.int64).view(np.uint64))
+        else:
+            positions = np.searchsorted(self.fingerprints, fingerprints)
+            positions[positions == len(self.fingerprints)] = 0
+            is_seen = self.fingerprints[positions] == fingerprints if len(self.fingerprints) > 0 else np.zeros(len(fingerprints), dtype=bool)
+
+        if self.pending:
+            is_seen |= np.isin(fingerprints, np.concatenate(self.pending))
+
+        return is_seen
+
+
+    def add(self, fingerprints):
+        """ Adds the fingerprints of a chunk as a pending batch and returns which of them are new,
+        i.e. neither in the index nor duplicated earlier in the chunk
+
+        Parameters
+        ----------
+        fingerprints (Type: numpy.ndarray): uint64 fingerprints of the rows of a chunk
+
+        Returns
+        -------
+        is_new (Type: numpy.ndarray): Boolean mask of the rows to be kept
+        """
+        with self.lock:
+            is_new = ~pd.Series(fingerprints).duplicated().values
+            is_new &= ~self.contains(fingerprints)
+            self.pending.append(fingerprints[is_new])
+
+        return is_new
+
+
+    def find_new(self, fingerprints):
+        """ Returns which of the fingerprints of a chunk are new, i.e. neither in the index nor duplicated earlier in the chunk,
+        without adding them. The fingerprints of the rows that are kept are added by add_pending.
+
+        Parameters
+        ----------
+        fingerprints (Type: numpy.ndarray): uint64 fingerprints of the rows of a chunk
+
+        Returns
+        -------
+        is_new (Type: numpy.ndarray): Boolean mask of the rows to be kept
+        """
+        with self.lock:
+            is_new = ~pd.Series(fingerprints).duplicated().values
+            is_new &= ~self.contains(fingerprints)
+
+        return is_new
+
+
+    def add_pending(self, fingerprints):
+        """ Adds the fingerprints of the rows kept from a chunk as a pending batch, e.g. the ones of the rows passing validation
+
+        Parameters
+        ----------
+        fingerprints (Type: numpy.ndarray): uint64 fingerprints returned as new by find_new
+
+        Returns
+        -------
+        None
+        """
+        with self.lock:
+            self.pending.append(fingerprints)
+
+
+    def peek(self):
+        """ Returns the oldest pending batch of fingerprints, e.g. to be stored with the rows it belongs to
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        fingerprints (Type: numpy.ndarray): uint64 fingerprints, empty if there is no pending batch
+        """
+        with self.lock:
+            return self.pending[0] if self.pending else np.array([], dtype=np.uint64)
+
+
+    def restore(self, fingerprints):
+        """ Commits fingerprints of rows that have been loaded by an earlier run, e.g. when a load is resumed
+
+        Parameters
+        ----------
+        fingerprints (Type: numpy.ndarray): uint64 fingerprints
+
+        Returns
+        -------
+        None
+        """
+        with self.lock:
+            if self.connection is not None:
+                self.connection.executemany("INSERT OR IGNORE INTO fingerprints VALUES (?)", zip(np.sort(fingerprints.view(np.int64)).tolist()))
+                self.connection.commit()
+            else:
+                self.fingerprints = np.union1d(self.fingerprints, fingerprints)
+
+
+    def commit(self):
+        """ Commits the oldest pending batch of fingerprints once the rows it belongs to have been inserted. Does nothing if there is none.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        with self.lock:
+            if not self.pending:
+                return
+            fingerprints = self.pending.popleft()
+            if self.connection is not None:
+                self.connection.executemany("INSERT OR IGNORE INTO fingerprints VALUES (?)", zip(np.sort(fingerprints.view(np.int64)).tolist()))
+                self.connection.commit()
+            else:
+                self.fingerprints = np.union1d(self.fingerprints, fingerprints)
+
+
+    def discard(self):
+        """ Forgets the oldest pending batch of fingerprints, whose rows could not be inserted. Does nothing if there is none.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        with self.lock:
+            if self.pending:
+                self.pending.popleft()
+
+
+    def spill(self, index_file):
+        """ Moves the committed fingerprints kept in memory to an SQLite file, e.g. once they take too much memory.
+        Does nothing if the index is already kept in a file.
+
+        Parameters
+        ----------
+        index_file (Type: str): SQLite file the fingerprints are moved to, its previous fingerprints are kept
+
+        Returns
+        -------
+        None
+        """
+        with self.lock:
+            if self.connection is not None:
+                return
+            self.connect(index_file)
+            self.connection.executemany("INSERT OR IGNORE INTO fingerprints VALUES (?)", zip(np.sort(self.fingerprints.view(np.int64)).tolist()))
+            self.connection.commit()
+            self.fingerprints = np.array([], dtype=np.uint64)
+
+
+    def close(self):
+        """ Closes the SQLite file the fingerprints are kept in, if any
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+
+    def clear(self):
+        """ Removes every fingerprint from the index, e.g. before the table is replaced
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        with self.lock:
+            self.pending.clear()
+            self.fingerprints = np.array([], dtype=np.uint64)
+            if self.connection is not None:
+                self.connection.execute("DELETE FROM fingerprints")
+                self.connection.commit()
+
+
+    def __len__(self):
+        """ Returns the number of committed fingerprints """
+        with self.lock:
+            if self.connection is not None:
+                return self.connection.execute("SELECT COUNT(*) FROM fingerprints").fetchone()[0]
+            return len(self.fingerprints)
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+""" This module computes row hashes used to detect duplicate and changed rows """
+
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+
+def hash_file(filename):
+    """ Computes the SHA-256 hash of the content of a file, e.g. to recognize an input file that has been loaded before
+
+    Parameters
+    ----------
+    filename (Type: str): File to be hashed
+
+    Returns
+    -------
+    file_hash (Type: str): Hexadecimal SHA-256 hash
+    """
+    file_hash = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            file_hash.update(block)
+
+    return file_hash.hexdigest()
+
+
+def hash_rows(df):
+    """ Computes a 64-bit hash for every row of the given dataframe.
+    The hash does not depend on the dtype pandas inferred for a column of a chunk
+    (e.g. a column with only missing values is float in one chunk and object in another)
+
+    Parameters
+    ----------
+    df (Type: pandas.DataFrame): Input dataframe to be hashed
+
+    Returns
+    -------
+    row_hashes (Type: numpy.ndarray): uint64 hash of every row
+    """
+    row_hashes = np.zeros(len(df), dtype=np.uint64)
+    for col in df.columns:
+        values = df[col]
+        is_null = values.isna().values
+        if pd.api.types.is_datetime64_any_dtype(values):
+            col_hashes = pd.util.hash_array(values.values.view(np.int64))
+        elif pd.api.types.is_categorical_dtype(values):
+            # Every category is hashed once, the same way as the values of a text column.
+            # Missing values have the code -1, which takes the trailing zero.
+            category_hashes = pd.util.hash_array(values.cat.categories.astype(str).values)
+            col_hashes = np.append(category_hashes, np.uint64(0)).take(values.cat.codes.values)
+        elif pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            col_hashes = pd.util.hash_array(np.nan_to_num(values.to_numpy(dtype=np.float64, na_value=np.nan)))
+        else:
+            col_hashes = pd.util.hash_array(values.astype(str).values)
+        col_hashes[is_null] = 0
+        row_hashes = row_hashes * np.uint64(1000003) ^ col_hashes
+
+    return row_hashes
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+
+""" This class cleans and validates csv files that are larger than the memory, in partitions spilled to disk
+
+The csv file is read in partitions whose size is derived from a memory budget, and every partition is written to
+the spill folder as an Arrow file. The cleaning rules are applied to the partitions by a pool of processes, which
+memory-map their raw partition and spill the cleaned one to disk as well. The cleaned partitions are deduplicated,
+validated and handed to the loader one at a time and in order, so the results are the same as those of the
+in-memory ETL, while only the partitions being cleaned and the one being loaded are held in memory.
+"""
+
+import collections
+import itertools
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+# Import user-defined libraries
+from etl.ETL import ETL
+from etl.compaction import compact_frame
+from etl.fingerprint_index import FingerprintIndex
+from etl.schema import read_loan_csv
+from logger.logger import init_worker_logging, start_worker_logging
+
+# Peak memory of cleaning (or loading) a partition relative to the memory of the raw partition:
+# a converted column and its original, and the cleaned partition and its serialized copy, are held at the same time
+CLEANING_MEMORY_FACTOR = 3
+
+# Number of rows read to estimate the memory of a row
+SAMPLE_ROWS = 1000
+
+# Share of the memory budget the fingerprints of the loaded rows may take in memory before they are spilled to disk
+FINGERPRINT_MEMORY_SHARE = 0.1
+
+
+def write_partition(df, path):
+    """ Writes a dataframe to an Arrow file
+
+    Parameters
+    ----------
+    df (Type: pandas.DataFrame): Partition to be written
+    path (Type: str): Arrow file
+
+    Returns
+    -------
+    None
+    """
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    with pa.OSFile(path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def read_partition(path):
+    """ Memory-maps an Arrow file written by write_partition and converts it to a dataframe
+
+    Parameters
+    ----------
+    path (Type: str): Arrow file
+
+    Returns
+    -------
+    df (Type: pandas.DataFrame): Partition
+    """
+    import pyarrow as pa
+
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).read_all().to_pandas()
+
+
+def clean_partition_file(logger_name, raw_path, clean_path):
+    """ Applies the cleaning rules to a raw partition in a worker process and spills the cleaned partition to disk
+
+    Parameters
+    ----------
+    logger_name (Type: str): Name of the logger to be used by the worker
+    raw_path (Type: str): Arrow file of the raw partition, removed once it is cleaned
+    clean_path (Type: str): Arrow file the cleaned partition is written to
+
+    Returns
+    -------
+    repair_counts (Type: collections.Counter): Number of values repaired by every cleaning rule
+    """
+    etl = ETL(logging.getLogger(logger_name))
+    df = etl.clean(read_partition(raw_path))
+    write_partition(df, clean_path)
+    os.remove(raw_path)
+
+    return etl.repair_counts
+
+
+class OutOfCoreETL(ETL):
+
+    def __init__(self, logger, memory_budget_mb, spill_dir, workers=1, profiler=None, key_columns=None, fingerprint_index=None):
+        # Partitions are chunks of the same file, so duplicates are removed across partitions as in streaming mode
+        super().__init__(logger, True, profiler, key_columns, fingerprint_index)
+        self.memory_budget_mb = memory_budget_mb
+        self.spill_dir = spill_dir
+        self.workers = max(workers or 1, 1)
+
+        # Fingerprints kept in memory by the ETL itself are spilled to the folder of the run when they take too much memory
+        self.owns_fingerprint_index = fingerprint_index is None
+
+
+    def get_partition_rows(self, csv_filename):
+        """ Returns the number of rows of a partition, so that the partitions being cleaned by the workers
+        and the one being loaded fit in the memory budget
+
+        Parameters
+        ----------
+        csv_filename (Type: str): Input csv file
+
+        Returns
+        -------
+        partition_rows (Type: int): Number of rows per partition
+        """
+        sample = next(read_loan_csv(csv_filename, self.logger, SAMPLE_ROWS), None)
+        if sample is None or len(sample) == 0:
+            return SAMPLE_ROWS
+
+        row_bytes = sample.memory_usage(deep=True).sum() / len(sample)
+        partition_bytes = self.memory_budget_mb * 2 ** 20 / (self.workers + 1) / CLEANING_MEMORY_FACTOR
+
+        return max(int(partition_bytes / row_bytes), 1)
+
+
+    def clean_csv(self, csv_filename, skip_rows=0):
+        """ Reads, cleans and validates the csv file partition by partition. The next partitions are read and cleaned
+        while the current one is loaded by the caller.
+
+        Parameters
+        ----------
+        csv_filename (Type: str): Input csv file
+        skip_rows (Type: int): Number of csv rows that are skipped, e.g. the rows committed by an interrupted load
+
+        Returns
+        -------
+        Generator of (cleaned and validated partition, rows rejected by the validation rules, position of the first csv row
+        of the partition, position after its last csv row) tuples, in the order of the file. The fingerprints of a partition are pending until commit_fingerprints is called.
+        """
+        partition_rows = self.get_partition_rows(csv_filename)
+        self.logger.info("Csv file is being cleaned out of core in partitions of " + str(partition_rows) + " rows within " +
+                         str(self.memory_budget_mb) + " MB")
+
+        if not os.path.exists(self.spill_dir):
+            os.makedirs(self.spill_dir)
+        run_dir = tempfile.mkdtemp(prefix='etl-', dir=self.spill_dir)
+
+        # The workers put their messages on a queue, which the parent hands to the handlers of its logger
+        context = multiprocessing.get_context()
+        log_queue = context.Queue()
+        log_listener = start_worker_logging(self.logger, log_queue)
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers, mp_context=context, initializer=init_worker_logging,
+                                     initargs=(self.logger.name, self.logger.level, log_queue)) as executor:
+                partitions = read_loan_csv(csv_filename, self.logger, partition_rows, skip_rows)
+                pending = collections.deque()
+                partitions_read = 0
+                rows_read = skip_rows
+                for partition_number in itertools.count():
+                    # Every worker has a partition to clean while the current partition is loaded
+                    while partitions is not None and len(pending) <= self.workers:
+                        self.profiler.chunk = partitions_read
+                        with self.profiler.stage('read_csv') as record:
+                            df = next(partitions, None)
+                            record['rows'] = len(df) if df is not None else 0
+                            if df is not None:
+                                raw_path = os.path.join(run_dir, 'raw-' + str(partitions_read) + '.arrow')
+                                clean_path = os.path.join(run_dir, 'clean-' + str(partitions_read) + '.arrow')
+                                write_partition(df, raw_path)
+                        if df is None:
+                            partitions = None
+                            break
+                        future = executor.submit(clean_partition_file, self.logger.name, raw_path, clean_path)
+                        pending.append((future, clean_path, rows_read, rows_read + len(df)))
+                        rows_read += len(df)
+                        partitions_read += 1
+                        del df
+
+                    if not pending:
+                        break
+
+                    self.profiler.chunk = partition_number
+                    future, clean_path, partition_start, partition_stop = pending.popleft()
+                    with self.profiler.stage('apply_cleaning_plan') as record:
+                        repair_counts = future.result()
+                        df = read_partition(clean_path)
+                        os.remove(clean_path)
+                        record['rows'] = len(df)
+                        record['repairs'] = dict(repair_counts)
+                        self.repair_counts.update(repair_counts)
+
+                    # Partitions are compacted as the whole dataframe is by the in-memory load
+                    df = compact_frame(self.deduplicate_and_validate(df))
+                    yield df, self.pop_rejected_rows(), partition_start, partition_stop
+                    del df
+
+                    self.spill_fingerprints(run_dir)
+        finally:
+            self.profiler.chunk = None
+            log_listener.stop()
+            if self.owns_fingerprint_index and self.fingerprint_index.connection is not None:
+                # The spilled fingerprints are removed with the folder of the run
+                self.fingerprint_index.close()
+                self.fingerprint_index = FingerprintIndex()
+            shutil.rmtree(run_dir, ignore_errors=True)
+
+
+    def spill_fingerprints(self, run_dir):
+        """ Moves the fingerprints kept in memory by the ETL to an SQLite file in the folder of the run
+        once they take more than their share of the memory budget
+
+        Parameters
+        ----------
+        run_dir (Type: str): Spill folder of the run
+
+        Returns
+        -------
+        None
+        """
+        index = self.fingerprint_index
+        if not self.owns_fingerprint_index or index.connection is not None:
+            return
+
+        if index.fingerprints.nbytes > FINGERPRINT_MEMORY_SHARE * self.memory_budget_mb * 2 ** 20:
+            self.logger.info("Fingerprints of " + str(len(index)) + " rows are being spilled to disk")
+            index.spill(os.path.join(run_dir, 'fingerprints.sqlite'))
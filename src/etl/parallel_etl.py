@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+
+""" This class performs data cleaning over row partitions in a pool of processes, then deduplicates and validates the cleaned rows """
+
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+# Import user-defined libraries
+from etl.ETL import ETL
+from logger.logger import init_worker_logging, start_worker_logging
+
+# Dataframe to be partitioned. When worker processes are forked they inherit it,
+# so only the row range of a partition has to be sent to them.
+_input_df = None
+
+
+def serialize_frame(df):
+    """ Serializes a dataframe into an Arrow IPC stream, or returns it as is to be pickled if it can not be represented in Arrow
+
+    Parameters
+    ----------
+    df (Type: pandas.DataFrame): Dataframe to be serialized
+
+    Returns
+    -------
+    Arrow buffer holding the dataframe or the dataframe itself
+    """
+    try:
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(df, preserve_index=True)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue()
+    except (ImportError, ValueError, TypeError, NotImplementedError):
+        return df
+
+
+def read_serialized_table(serialized):
+    """ Reads an Arrow buffer returned by serialize_frame as an Arrow table, without copying its buffers
+
+    Parameters
+    ----------
+    serialized (Type: pyarrow.Buffer): Arrow buffer returned by serialize_frame
+
+    Returns
+    -------
+    table (Type: pyarrow.Table): Table of the serialized dataframe
+    """
+    import pyarrow as pa
+    return pa.ipc.open_stream(serialized).read_all()
+
+
+def concat_serialized_frames(serialized_frames):
+    """ Converts the outputs of serialize_frame back to a single dataframe. Arrow partitions are concatenated
+    as Arrow tables, which does not copy their buffers, and converted to pandas once, so the rows are copied
+    once instead of once by the conversion of every partition and once more by pandas.concat.
+
+    Parameters
+    ----------
+    serialized_frames (Type: list): Arrow buffers or dataframes returned by serialize_frame
+
+    Returns
+    -------
+    df (Type: pandas.DataFrame): Concatenated dataframe
+    """
+    if any(isinstance(serialized, pd.DataFrame) for serialized in serialized_frames):
+        # A partition that Arrow can not represent has been pickled, so the partitions are concatenated by pandas
+        return pd.concat([serialized if isinstance(serialized, pd.DataFrame) else read_serialized_table(serialized).to_pandas()
+                          for serialized in serialized_frames])
+
+    import pyarrow as pa
+
+    table = pa.concat_tables([read_serialized_table(serialized) for serialized in serialized_frames])
+    # Every column is converted into a block of its own, whose Arrow buffers are released as soon as it is converted
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def clean_partition(logger_name, start, stop, partition=None):
+    """ Applies the cleaning rules to a single row partition in a worker process
+
+    Parameters
+    ----------
+    logger_name (Type: str): Name of the logger to be used by the worker
+    start (Type: int): Position of the first row of the partition
+    stop (Type: int): Position after the last row of the partition
+    partition (Type: pandas.DataFrame): The partition itself if the worker has not inherited the input dataframe
+
+    Returns
+    -------
+    Serialized cleaned partition and the repair counts of the partition
+    """
+    if partition is None:
+        partition = _input_df.iloc[start:stop]
+
+    etl = ETL(logging.getLogger(logger_name))
+    cleaned = etl.clean(partition.copy())
+
+    return serialize_frame(cleaned), etl.repair_counts
+
+
+class ParallelETL(ETL):
+
+    def __init__(self, logger, workers, streaming=False, profiler=None, key_columns=None, fingerprint_index=None):
+        super().__init__(logger, streaming, profiler, key_columns, fingerprint_index)
+        self.workers = workers
+
+
+    def clean_and_validate(self, df):
+        """
+        Method that cleans and validates the contents of the dataframe by splitting it into row partitions
+        which are cleaned in a pool of processes. The cleaned partitions are then deduplicated and validated together.
+
+        Parameters
+        ----------
+        df (Type: pandas.DataFrame): Dataframe with values to be cleaned and validated
+
+        Returns
+        -------
+        df (Type: pandas.DataFrame): Dataframe with cleaned and validated values
+        """
+        global _input_df
+
+        if self.workers is None or self.workers <= 1 or len(df) < self.workers:
+            return super().clean_and_validate(df)
+
+        bounds = np.linspace(0, len(df), self.workers + 1).astype(int)
+        inherits_input = 'fork' in multiprocessing.get_all_start_methods()
+
+        self.logger.info("Dataframe is being cleaned and validated in " + str(self.workers) + " partitions")
+        _input_df = df
+        try:
+            if inherits_input:
+                context = multiprocessing.get_context('fork')
+                partitions = [None] * self.workers
+            else:
+                context = multiprocessing.get_context()
+                partitions = [df.iloc[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+
+            # The workers put their messages on a queue, which the parent hands to the handlers of its logger
+            log_queue = context.Queue()
+            log_listener = start_worker_logging(self.logger, log_queue)
+            try:
+                with self.profiler.stage('parallel_partitions', rows=len(df)), \
+                        ProcessPoolExecutor(max_workers=self.workers, mp_context=context, initializer=init_worker_logging,
+                                            initargs=(self.logger.name, self.logger.level, log_queue)) as executor:
+                    futures = [executor.submit(clean_partition, self.logger.name, start, stop, partition)
+                               for start, stop, partition in zip(bounds[:-1], bounds[1:], partitions)]
+                    results = [future.result() for future in futures]
+            finally:
+                log_listener.stop()
+        finally:
+            _input_df = None
+
+        for _, repair_counts in results:
+            self.repair_counts.update(repair_counts)
+
+        # Duplicates are removed across partitions before the rows are validated, as they are by a single process,
+        # so that an invalid row repeated in several partitions is rejected once.
+        # The stage records the size of the Arrow partitions it received and, with --profile, the memory it allocated to convert them.
+        with self.profiler.stage('concat_partitions') as record:
+            record['serialized_mb'] = round(sum(getattr(cleaned, 'size', 0) for cleaned, _ in results) / 1024 / 1024, 1)
+            df = concat_serialized_frames([cleaned for cleaned, _ in results])
+            record['rows'] = len(df)
+
+        return self.deduplicate_and_validate(df)
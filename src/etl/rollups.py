@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+""" This module computes the rollups of the loan table, additive aggregates that are persisted next to it
+so that dashboards and the analysis notebook do not have to aggregate the whole table again """
+
+import pandas as pd
+
+# Dimensions of every rollup. Each rollup is stored in the table "<table name>_rollup_<rollup name>".
+ROLLUP_DIMENSIONS = {
+    'year': ['issue_year'],
+    'grade': ['grade'],
+    'state': ['addr_state'],
+    'year_grade': ['issue_year', 'grade'],
+}
+
+# Summed columns. Only counts and sums are stored since they can be merged across chunks and loads,
+# means are derived from them (e.g. mean int_rate = int_rate_sum / loan_count).
+ROLLUP_MEASURES = ['loan_amnt', 'funded_amnt', 'funded_amnt_inv', 'int_rate', 'annual_inc']
+
+# Values of missing dimensions, which can not be part of the primary key of a rollup table
+MISSING_YEAR = 0
+MISSING_TEXT = ''
+
+
+def compute_rollups(df):
+    """ Computes the partial rollups of a dataframe (or chunk). The rows are grouped once by all dimensions,
+    and every rollup is then aggregated from that much smaller frame.
+
+    Parameters
+    ----------
+    df (Type: pandas.DataFrame): Cleaned and validated dataframe
+
+    Returns
+    -------
+    rollups (Type: dict): Mapping of rollup name to a dataframe with the dimension columns, loan_count and a sum column per measure
+    """
+    dimensions = sorted(set(col for cols in ROLLUP_DIMENSIONS.values() for col in cols))
+
+    grouped = pd.DataFrame({
+        'issue_year': pd.to_datetime(df['issue_d']).dt.year.fillna(MISSING_YEAR).astype('int64'),
+        'grade': df['grade'].astype(object).fillna(MISSING_TEXT),
+        'addr_state': df['addr_state'].astype(object).fillna(MISSING_TEXT),
+        'loan_count': 1,
+    })
+    for measure in ROLLUP_MEASURES:
+        grouped[measure + '_sum'] = pd.to_numeric(df[measure], errors='coerce').fillna(0).values
+    grouped = grouped.groupby(dimensions, sort=False).sum()
+
+    return {name: grouped.groupby(cols).sum().reset_index() for name, cols in ROLLUP_DIMENSIONS.items()}
+
+
+def subtract_rollups(rollups, subtracted_rollups):
+    """ Returns the difference of two sets of partial rollups, e.g. the rollups of the new versions of updated rows
+    minus the rollups of their previous versions
+
+    Parameters
+    ----------
+    rollups (Type: dict): Partial rollups returned by compute_rollups
+    subtracted_rollups (Type: dict): Partial rollups to be subtracted
+
+    Returns
+    -------
+    rollups (Type: dict): Partial rollups holding the differences, with negative counts and sums where rows were removed
+    """
+    differences = {}
+    for name, cols in ROLLUP_DIMENSIONS.items():
+        differences[name] = rollups[name].set_index(cols).sub(subtracted_rollups[name].set_index(cols), fill_value=0).reset_index()
+        differences[name]['loan_count'] = differences[name]['loan_count'].astype('int64')
+
+    return differences
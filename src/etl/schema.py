@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+""" This module derives the dtypes used to read the csv file from the SQLMetadata model """
+
+import pandas as pd
+import sqlalchemy
+
+# Import user-defined libraries
+from db.sql_metadata_service import SQLMetadata
+
+# Low-cardinality text and date columns that can be read as categoricals. The cleaning rules convert the categories
+# rather than every row, including the columns whose raw csv values are text even though they are stored as numbers
+# (e.g. " 36 months", "10+ years").
+CATEGORICAL_COLUMNS = ['grade', 'sub_grade', 'home_ownership', 'addr_state', 'purpose', 'loan_status',
+                       'pymnt_plan', 'initial_list_status', 'application_type', 'zip_code', 'verification_status_joint',
+                       'issue_d', 'earliest_cr_line', 'last_pymnt_d', 'next_pymnt_d', 'last_credit_pull_d',
+                       'term', 'emp_length', 'verification_status']
+
+# Identifier columns are too large for float32. "id" is not given a dtype at all since LendingClub files
+# contain text rows such as "Loans that do not meet the credit policy" in that column.
+IDENTIFIER_DTYPES = {'id': None, 'member_id': 'float64'}
+
+
+def get_usecols():
+    """ Returns the columns of the csv file that are stored in the database, the rest are skipped while reading
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    usecols (Type: str list): Column names defined in the SQLMetadata model
+    """
+    return [column.name for column in SQLMetadata.__table__.columns]
+
+
+def get_read_dtypes(numeric_dtypes=True):
+    """ Returns the dtype of every csv column derived from the column types of the SQLMetadata model
+
+    Integer columns may have missing values and are read as float32, which holds every integer count
+    exactly, except for the identifier columns. Float columns stay float64 since their values are written back
+    to the database as is and float32 would change them. Dates and free text are read as strings.
+
+    Parameters
+    ----------
+    numeric_dtypes (Type: bool): Whether numeric columns should be given a dtype or be inferred by pandas
+
+    Returns
+    -------
+    dtypes (Type: dict): Mapping of column name to pandas dtype
+    """
+    dtypes = {}
+    for column in SQLMetadata.__table__.columns:
+        if column.name in CATEGORICAL_COLUMNS:
+            dtypes[column.name] = 'category'
+        elif not numeric_dtypes:
+            continue
+        elif column.name in IDENTIFIER_DTYPES:
+            if IDENTIFIER_DTYPES[column.name] is not None:
+                dtypes[column.name] = IDENTIFIER_DTYPES[column.name]
+        elif isinstance(column.type, sqlalchemy.types.Integer):
+            dtypes[column.name] = 'float32'
+        elif isinstance(column.type, sqlalchemy.types.Float):
+            dtypes[column.name] = 'float64'
+        else:
+            dtypes[column.name] = 'object'
+
+    return dtypes
+
+
+def read_loan_csv(csv_filename, logger, chunksize=None, skip_rows=0):
+    """ Reads the loan csv file with the dtypes and columns derived from the SQLMetadata model.
+    If a numeric column holds values that can not be parsed with its dtype (the ETL coerces them later)
+    the file is read again and the numeric dtypes are inferred by pandas.
+
+    Parameters
+    ----------
+    csv_filename (Type: str): Input csv file
+    logger (Type: logging.Logger): Logger object
+    chunksize (Type: int): Number of rows per chunk, None to read the whole file at once
+    skip_rows (Type: int): Number of rows after the header that are skipped, e.g. the rows of a resumed load that have been loaded
+
+    Returns
+    -------
+    pandas.DataFrame, or an iterator of pandas.DataFrame chunks if chunksize is given
+    """
+    if chunksize:
+        return _iterate_loan_csv(csv_filename, logger, chunksize, skip_rows)
+
+    skiprows = range(1, skip_rows + 1) if skip_rows else None
+    try:
+        return pd.read_csv(csv_filename, low_memory=False, usecols=get_usecols(), dtype=get_read_dtypes(), skiprows=skiprows)
+    except (ValueError, TypeError) as e:
+        logger.warning("Csv file can not be read with the numeric dtypes of the model, inferring them instead: " + str(e))
+        return pd.read_csv(csv_filename, low_memory=False, usecols=get_usecols(), dtype=get_read_dtypes(numeric_dtypes=False),
+                           skiprows=skiprows)
+
+
+def _iterate_loan_csv(csv_filename, logger, chunksize, skip_rows=0):
+    """ Generator behind read_loan_csv for chunked reads. A chunk that can not be parsed with the numeric dtypes
+    restarts the reader at that chunk with inferred numeric dtypes.
+    """
+    numeric_dtypes = True
+    rows_read = skip_rows
+    reader = pd.read_csv(csv_filename, chunksize=chunksize, usecols=get_usecols(), dtype=get_read_dtypes(),
+                         skiprows=range(1, skip_rows + 1) if skip_rows else None)
+
+    while True:
+        try:
+            chunk = next(reader)
+        except StopIteration:
+            return
+        except (ValueError, TypeError) as e:
+            if not numeric_dtypes:
+                raise
+            logger.warning("Csv chunk can not be read with the numeric dtypes of the model, inferring them instead: " + str(e))
+            numeric_dtypes = False
+            reader = pd.read_csv(csv_filename, chunksize=chunksize, usecols=get_usecols(),
+                                 dtype=get_read_dtypes(numeric_dtypes=False), skiprows=range(1, rows_read + 1))
+            continue
+
+        rows_read += len(chunk)
+        yield chunk
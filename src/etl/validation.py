@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+""" This module declares the validation rules of the cleaned loans and evaluates them as vectorized boolean masks
+
+Rows failing any rule are not loaded. They are returned with the reason codes of the rules they fail,
+so that they can be written to the quarantine table, and the number of violations of every rule is counted.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Import user-defined libraries
+from db.sql_metadata_service import SQLMetadata
+
+# Name of the column holding the comma separated reason codes of a rejected row
+REASON_CODES_COLUMN = 'reason_codes'
+
+# Reason code of every rule to its check, the columns it reads and the argument of the check.
+# The checks are defined in CHECK_FUNCTIONS below. Missing values pass every check but not_null,
+# and a not_null rule "missing_<column>" is added for every column that is not nullable in the SQLMetadata model.
+VALIDATION_RULES = {
+    'loan_amnt_not_positive': ('greater_than', ['loan_amnt'], 0),
+    'int_rate_out_of_range': ('between', ['int_rate'], (0, 100)),
+    'term_not_allowed': ('isin', ['term'], [36, 60]),
+    'grade_not_allowed': ('isin', ['grade'], ['A', 'B', 'C', 'D', 'E', 'F', 'G']),
+    'funded_amnt_above_loan_amnt': ('less_equal', ['funded_amnt', 'loan_amnt'], None),
+    'funded_amnt_inv_above_funded_amnt': ('less_equal', ['funded_amnt_inv', 'funded_amnt'], None),
+}
+
+
+def not_null(values, argument):
+    """ Returns the rows whose value is missing """
+    return values[0].isna().values
+
+
+def greater_than(values, minimum):
+    """ Returns the rows whose value is not greater than the minimum """
+    return (values[0] <= minimum).values
+
+
+def between(values, bounds):
+    """ Returns the rows whose value is outside of the (inclusive) bounds """
+    minimum, maximum = bounds
+    return ((values[0] < minimum) | (values[0] > maximum)).values
+
+
+def isin(values, allowed_values):
+    """ Returns the rows whose value is not one of the allowed values """
+    return (~values[0].isin(allowed_values) & values[0].notna()).values
+
+
+def less_equal(values, argument):
+    """ Returns the rows whose value of the first column is greater than the value of the second one """
+    return (values[0] > values[1]).values
+
+
+# Check name, as used in VALIDATION_RULES, to the function evaluating it. Every function takes the columns
+# the rule reads and the argument of the rule, and returns a boolean mask of the rows failing the rule.
+CHECK_FUNCTIONS = {
+    'not_null': not_null,
+    'greater_than': greater_than,
+    'between': between,
+    'isin': isin,
+    'less_equal': less_equal,
+}
+
+
+def compile_validation_rules(columns):
+    """ Returns the validation rules that apply to a dataframe with the given columns
+
+    Parameters
+    ----------
+    columns (Type: str list): Columns of the dataframe to be validated
+
+    Returns
+    -------
+    rules (Type: list): (reason code, check function, columns, argument) tuples
+    """
+    rules = {'missing_' + column.name: ('not_null', [column.name], None)
+             for column in SQLMetadata.__table__.columns if not column.nullable}
+    rules.update(VALIDATION_RULES)
+
+    return [(reason_code, CHECK_FUNCTIONS[check], rule_columns, argument)
+            for reason_code, (check, rule_columns, argument) in rules.items()
+            if all(col in columns for col in rule_columns)]
+
+
+def validate_frame(df, rules):
+    """ Evaluates the validation rules on the dataframe and splits it into valid and rejected rows
+
+    Parameters
+    ----------
+    df (Type: pandas.DataFrame): Cleaned dataframe
+    rules (Type: list): Rules returned by compile_validation_rules
+
+    Returns
+    -------
+    valid_df (Type: pandas.DataFrame): Rows passing every rule
+    rejected_df (Type: pandas.DataFrame): Rows failing at least one rule, with their reason codes in REASON_CODES_COLUMN
+    violation_counts (Type: dict): Number of rows failing every rule that has been violated
+    """
+    is_valid = np.ones(len(df), dtype=bool)
+    failures = []
+    for reason_code, func, rule_columns, argument in rules:
+        is_failing = np.asarray(func([df[col] for col in rule_columns], argument), dtype=bool)
+        if is_failing.any():
+            failures.append((reason_code, is_failing))
+            is_valid &= ~is_failing
+
+    violation_counts = {reason_code: int(np.count_nonzero(is_failing)) for reason_code, is_failing in failures}
+    if not failures:
+        return df, df.head(0).assign(**{REASON_CODES_COLUMN: pd.Series(dtype=object)}), violation_counts
+
+    # Reason codes are only built for the rejected rows
+    rejected_positions = np.flatnonzero(~is_valid)
+    reason_codes = pd.Series('', index=range(len(rejected_positions)), dtype=object)
+    for reason_code, is_failing in failures:
+        reason_codes[is_failing[rejected_positions]] += reason_code + ','
+
+    rejected_df = df.iloc[rejected_positions].assign(**{REASON_CODES_COLUMN: reason_codes.str.rstrip(',').values})
+    return df[is_valid], rejected_df, violation_counts
@@ -1,13 +1,134 @@
-""" This the logger class that creates a logger object which logs event in logs folder """
+""" This the logger class that creates a logger object which logs event in logs folder
 
+Messages are put on a queue by the thread logging them and written to the log file by a listener thread,
+so that the ETL does not wait for file I/O. Warnings and errors repeatedly logged from the same line of code
+(e.g. for every row or column of a bad file) are rate limited: beyond the limit they are only counted, and the
+number of suppressed messages is written with the next message of that line or when the application exits.
+"""
 
+
+import atexit
+import json
 import logging
 import logging.handlers
 import os
+import queue
+import sys
+import threading
+import time
+
+# Extra attributes of the messages that are also printed to the console, e.g. logger.info("...", extra=CONSOLE)
+CONSOLE = {'console': True}
+
+# Listener writing the queued messages of the logger created by get_logger, stopped when the application exits
+_listener = None
+
+
+class RateLimitFilter(logging.Filter):
+    """ Lets through at most the given number of warnings and errors per period from every line of code,
+    and counts the others. Messages below the WARNING level are never suppressed. """
+
+    def __init__(self, max_messages, period):
+        super().__init__()
+        self.max_messages = max_messages
+        self.period = period
+        self.lock = threading.Lock()
+        # (path, line number) to [start of the period, messages in the period, suppressed messages, last suppressed record]
+        self.sites = {}
+
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING or getattr(record, 'rate_limit_summary', False):
+            return True
+
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self.lock:
+            site = self.sites.get(key)
+            if site is None or now - site[0] >= self.period:
+                suppressed = site[2] if site is not None else 0
+                self.sites[key] = [now, 1, 0, None]
+            elif site[1] < self.max_messages:
+                site[1] += 1
+                return True
+            else:
+                site[2] += 1
+                site[3] = record
+                return False
+
+        if suppressed:
+            record.msg = record.getMessage() + " (" + str(suppressed) + " similar messages were suppressed)"
+            record.args = None
+        return True
+
+
+    def pop_summaries(self):
+        """ Returns a record for every line of code whose messages have been suppressed since its last message,
+        and forgets them
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        records (Type: logging.LogRecord list): Last suppressed record of every line, with the number of suppressed messages
+        """
+        records = []
+        with self.lock:
+            for site in self.sites.values():
+                if site[2]:
+                    record = site[3]
+                    record.msg = record.getMessage() + " (" + str(site[2]) + " similar messages were suppressed)"
+                    record.args = None
+                    record.rate_limit_summary = True
+                    records.append(record)
+                    site[2] = 0
+                    site[3] = None
+
+        return records
 
 
+class ConsoleFilter(logging.Filter):
+    """ Lets through the messages logged with extra=CONSOLE """
 
-def get_logger(logging_level, logs_output_file_path=None, logs_rotate_when="midnight", logs_rotate_backup_count=7):
+    def filter(self, record):
+        return getattr(record, 'console', False)
+
+
+class JsonFormatter(logging.Formatter):
+    """ Formats every message as a JSON object with its time, level, logger, location and text """
+
+    def format(self, record):
+        message = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'file': record.filename,
+            'line': record.lineno,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            message['exception'] = self.formatException(record.exc_info)
+
+        return json.dumps(message)
+
+
+class WorkerLogListener(logging.handlers.QueueListener):
+    """ Hands the messages the worker processes put on a queue to a logger of the parent process rather than to its handlers,
+    so that the filters of the logger, e.g. the rate limit, apply to them as well """
+
+    def __init__(self, log_queue, logger):
+        super().__init__(log_queue)
+        self.logger = logger
+
+
+    def handle(self, record):
+        self.logger.handle(self.prepare(record))
+
+
+def get_logger(logging_level, logs_output_file_path=None, logs_rotate_when="midnight", logs_rotate_backup_count=7,
+               logs_format='text', logs_rate_limit=None):
     """ Creates a logger object, creates a log file in logs folder if it does not exist
 
     Parameters
@@ -16,22 +137,42 @@ def get_logger(logging_level, logs_output_file_path=None, logs_rotate_when="midn
     logs_output_file_path (str): The path indicating where the log file is stored with the log file name
     logs_rotate_when (str): When to rotate/create a new log file. Default is "midnight"
     logs_rotate_backup_count(int): The number of log files before the first one is overwritten
+    logs_format (str): 'text' or 'json', format of the messages in the log file
+    logs_rate_limit (tuple): (messages, seconds), number of warnings and errors logged from the same line per period. None disables the rate limit.
 
     Returns
     -------
     logger object (instance of python's logging library)
 
     """
+    global _listener
 
-    # Create the logger
+    # Create the logger. A logger created before is reset, so that its messages are not written twice.
     logger = logging.getLogger(__name__)
+    stop_logging()
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    for log_filter in list(logger.filters):
+        logger.removeFilter(log_filter)
 
     # Set logging level
     logger.setLevel(logging_level)
 
     # Create logging format
-    formatter = logging.Formatter('[%(asctime)s] {%(filename)s:%(lineno)d} - %(levelname)s - %(message)s')
+    if logs_format == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter('[%(asctime)s] {%(filename)s:%(lineno)d} - %(levelname)s - %(message)s')
+
+    if logs_rate_limit is not None:
+        logger.addFilter(RateLimitFilter(*logs_rate_limit))
 
+    # Messages logged with extra=CONSOLE are printed as well. They are printed by the thread logging them
+    # rather than by the listener, so that they are in the same order as the output of print.
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(logging.Formatter('%(message)s'))
+    console_handler.addFilter(ConsoleFilter())
+    logger.addHandler(console_handler)
 
     # Create the file handler to log messages to a log file
     # Create log file if it does not exist
@@ -45,8 +186,84 @@ def get_logger(logging_level, logs_output_file_path=None, logs_rotate_when="midn
             backupCount=logs_rotate_backup_count
         )
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
 
-    logger.debug("Created Logger with Args - logging_level: {logging_level}, logs_output_file_path: {logs_output_file_path}, logs_rotate_when: {logs_rotate_when}, logs_rotate_backup_count: {logs_rotate_backup_count}".format(**locals()))
+        # The file is written by the listener thread
+        log_queue = queue.SimpleQueue()
+        logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        _listener = logging.handlers.QueueListener(log_queue, file_handler)
+        _listener.start()
+
+    logger.debug("Created Logger with Args - logging_level: {logging_level}, logs_output_file_path: {logs_output_file_path}, logs_rotate_when: {logs_rotate_when}, logs_rotate_backup_count: {logs_rotate_backup_count}, logs_format: {logs_format}, logs_rate_limit: {logs_rate_limit}".format(**locals()))
 
     return logger
+
+
+def stop_logging():
+    """ Logs the number of messages suppressed by the rate limit, writes the queued messages to the log file
+    and stops the listener thread. It is called when the application exits.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    None
+    """
+    global _listener
+
+    logger = logging.getLogger(__name__)
+    for log_filter in logger.filters:
+        if isinstance(log_filter, RateLimitFilter):
+            for record in log_filter.pop_summaries():
+                logger.handle(record)
+
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(stop_logging)
+
+
+def start_worker_logging(logger, log_queue):
+    """ Starts a listener thread handing the messages the worker processes put on the given queue to the logger, whose filters
+    (e.g. the rate limit) and handlers apply to them as to the messages of the parent process
+
+    Parameters
+    ----------
+    logger (Type: logging.Logger): Logger of the parent process
+    log_queue (Type: multiprocessing.Queue): Queue shared with the worker processes
+
+    Returns
+    -------
+    listener (Type: WorkerLogListener): Started listener, to be stopped once the workers are done
+    """
+    listener = WorkerLogListener(log_queue, logger)
+    listener.start()
+
+    return listener
+
+
+def init_worker_logging(logger_name, logging_level, log_queue):
+    """ Sends the messages of the given logger of a worker process to the queue of the parent process.
+    It is the initializer of the worker processes.
+
+    Parameters
+    ----------
+    logger_name (Type: str): Name of the logger used by the worker
+    logging_level (Type: int): Logging level of the logger of the parent process
+    log_queue (Type: multiprocessing.Queue): Queue shared with the parent process
+
+    Returns
+    -------
+    None
+    """
+    logger = logging.getLogger(logger_name)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.setLevel(logging_level)
+    logger.propagate = False
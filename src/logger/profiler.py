@@ -0,0 +1,222 @@
+""" This is the profiler class that records the duration and memory usage of the ETL stages and logs them as JSON lines """
+
+
+import contextlib
+import cProfile
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # The resource module is not available on Windows, peak memory is not reported there
+    resource = None
+
+
+class StageProfiler:
+
+    def __init__(self, logger, enabled=True):
+        """ Initializes the profiler
+
+        Parameters
+        ----------
+        logger (Type: logging.Logger): Logger object the stage records are written to
+        enabled (Type: bool): Whether stage records are written. A disabled profiler only runs the stages.
+
+        Returns
+        -------
+        None
+        """
+        self.logger = logger
+        self.enabled = enabled
+
+        # Number of the chunk being processed in streaming mode, None in batch mode
+        self.chunk = None
+
+        self.dump_dir = None
+        self.cprofile = None
+
+        # [traced memory at the start, peak traced memory of the finished inner stages] of every running stage,
+        # used to measure the memory allocated by the stages while tracemalloc is tracing
+        self.traced_stages = []
+
+
+    def get_peak_rss_mb(self):
+        """ Returns the peak resident set size of the process so far in megabytes, None if it can not be measured
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        peak_rss_mb (Type: float): Peak resident set size
+        """
+        if resource is None:
+            return None
+
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        if sys.platform == 'darwin':
+            return round(peak_rss / 1024 / 1024, 1)
+        return round(peak_rss / 1024, 1)
+
+
+    def get_rss_mb(self):
+        """ Returns the current resident set size of the process in megabytes, None if it can not be measured
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        rss_mb (Type: float): Current resident set size
+        """
+        try:
+            with open('/proc/self/statm') as f:
+                resident_pages = int(f.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            # /proc is only available on Linux
+            return None
+
+        return round(resident_pages * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024, 1)
+
+
+    def get_arrow_allocated_mb(self):
+        """ Returns the memory currently allocated by Arrow in megabytes, None if pyarrow has not been imported
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        arrow_allocated_mb (Type: float): Bytes allocated by the default Arrow memory pool
+        """
+        pyarrow = sys.modules.get('pyarrow')
+        if pyarrow is None:
+            return None
+
+        return round(pyarrow.total_allocated_bytes() / 1024 / 1024, 1)
+
+
+    def start_tracing_stage(self):
+        """ Starts measuring the memory allocated by a stage, if tracemalloc is tracing (see start_dumps) """
+        if not tracemalloc.is_tracing():
+            return
+
+        current, peak = tracemalloc.get_traced_memory()
+        if self.traced_stages:
+            self.traced_stages[-1][1] = max(self.traced_stages[-1][1], peak)
+        self.traced_stages.append([current, 0])
+        tracemalloc.reset_peak()
+
+
+    def stop_tracing_stage(self, record):
+        """ Adds the memory allocated by a stage to its record: allocated_mb is its peak traced memory above the traced memory
+        at its start (e.g. the size of the copies of a frame it made), retained_mb what it still holds at its end """
+        if not self.traced_stages or not tracemalloc.is_tracing():
+            self.traced_stages = []
+            return
+
+        start, inner_peak = self.traced_stages.pop()
+        current, peak = tracemalloc.get_traced_memory()
+        peak = max(peak, inner_peak)
+        if self.traced_stages:
+            self.traced_stages[-1][1] = max(self.traced_stages[-1][1], peak)
+        record['allocated_mb'] = round((peak - start) / 1024 / 1024, 1)
+        record['retained_mb'] = round((current - start) / 1024 / 1024, 1)
+
+
+    @contextlib.contextmanager
+    def stage(self, name, rows=None):
+        """ Context manager that measures a stage and logs a JSON record with wall time, CPU time, current and peak RSS and rows/sec.
+        While tracemalloc is tracing, the memory allocated by the stage and the memory allocated by Arrow are recorded as well.
+
+        Parameters
+        ----------
+        name (Type: str): Name of the stage
+        rows (Type: int): Number of rows processed by the stage. It can also be set on the yielded record.
+
+        Returns
+        -------
+        record (Type: dict): Record of the stage, yielded so that the caller can add the number of rows or other fields
+        """
+        record = {'stage': name, 'chunk': self.chunk, 'rows': rows}
+        if not self.enabled:
+            yield record
+            return
+
+        self.start_tracing_stage()
+        start_arrow_allocated_mb = self.get_arrow_allocated_mb() if tracemalloc.is_tracing() else None
+        start_wall_time = time.perf_counter()
+        start_cpu_time = time.process_time()
+        try:
+            yield record
+        finally:
+            self.stop_tracing_stage(record)
+            if start_arrow_allocated_mb is not None:
+                record['arrow_retained_mb'] = round(self.get_arrow_allocated_mb() - start_arrow_allocated_mb, 1)
+            wall_time = time.perf_counter() - start_wall_time
+            record['wall_time'] = round(wall_time, 4)
+            record['cpu_time'] = round(time.process_time() - start_cpu_time, 4)
+            record['rss_mb'] = self.get_rss_mb()
+            record['peak_rss_mb'] = self.get_peak_rss_mb()
+            if record['rows'] is not None and wall_time > 0:
+                record['rows_per_sec'] = round(record['rows'] / wall_time, 1)
+            self.logger.info(json.dumps(record))
+
+
+    def start_dumps(self, dump_dir):
+        """ Starts cProfile and tracemalloc, whose results are written to the given folder by stop_dumps
+
+        Parameters
+        ----------
+        dump_dir (Type: str): Folder the profile and the memory allocation statistics are written to
+
+        Returns
+        -------
+        None
+        """
+        self.dump_dir = os.path.expanduser(dump_dir)
+        if not os.path.exists(self.dump_dir):
+            os.makedirs(self.dump_dir)
+
+        tracemalloc.start()
+        self.cprofile = cProfile.Profile()
+        self.cprofile.enable()
+
+
+    def stop_dumps(self):
+        """ Stops cProfile and tracemalloc and writes their results
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        if self.cprofile is None:
+            return
+
+        self.cprofile.disable()
+        timestamp = time.strftime('%Y%m%d-%H%M%S')
+        profile_path = os.path.join(self.dump_dir, 'profile-' + timestamp + '.prof')
+        self.cprofile.dump_stats(profile_path)
+
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        allocations_path = os.path.join(self.dump_dir, 'allocations-' + timestamp + '.txt')
+        with open(allocations_path, 'w') as f:
+            for statistic in snapshot.statistics('lineno')[:50]:
+                f.write(str(statistic) + '\n')
+
+        self.cprofile = None
+        self.logger.info("Profile has been written to " + profile_path + " and allocations to " + allocations_path)
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+
+""" This class runs the ETL as a service that watches an input folder and ingests new csv files as they arrive
+
+Reading, cleaning and inserting run as separate asyncio tasks connected by bounded queues, so that while chunk N
+is inserted, chunk N+1 is cleaned and chunk N+2 is read. A full queue makes the previous stage wait (backpressure),
+which bounds the memory usage to a few chunks.
+"""
+
+import asyncio
+import collections
+import glob
+import itertools
+import os
+import shutil
+import signal
+from concurrent.futures import ThreadPoolExecutor
+
+# Import user-defined libraries
+from etl.compaction import compact_frame
+from etl.parallel_etl import ParallelETL
+from etl.schema import read_loan_csv
+from logger.logger import CONSOLE
+from logger.profiler import StageProfiler
+
+# Subfolders of the watched folder where ingested and failed files are moved to
+PROCESSED_DIR_NAME = 'processed'
+FAILED_DIR_NAME = 'failed'
+
+
+class IngestionService:
+
+    def __init__(self, logger, metadata_service, watch_dir, streaming_chunksize, etl_workers, chunksize, table_name, method,
+                 load_mode, load_workers, poll_interval, queue_size, profiling_enabled=True, key_columns=None, fingerprint_index=None):
+        """ Initializes the ingestion service
+
+        Parameters
+        ----------
+        logger (Type: logging.Logger): Logger object
+        metadata_service (Type: SQLMetadataService): Metadata service used to insert the chunks
+        watch_dir (Type: str): Folder watched for new csv files
+        streaming_chunksize (Type: int): Number of csv rows read, cleaned and inserted at a time, None for whole files
+        etl_workers (Type: int): Number of processes used to clean and validate a chunk
+        chunksize (Type: int): Number of rows written to DB in a single batch
+        table_name (Type: str): Table name in the database
+        method (Type: str): Insertion method to database
+        load_mode (Type: str): 'replace' or 'incremental'
+        load_workers (Type: int): Number of threads writing shards of a chunk to DB concurrently
+        poll_interval (Type: float): Seconds between two scans of the watched folder
+        queue_size (Type: int): Number of chunks that can wait between two stages
+        profiling_enabled (Type: bool): Whether every stage of every chunk is logged as a JSON line
+        key_columns (Type: str list): Columns identifying duplicate rows, None to compare whole rows
+        fingerprint_index (Type: FingerprintIndex): Persistent index of the fingerprints of the loaded rows, None to keep them in memory
+
+        Returns
+        -------
+        None
+        """
+        self.logger = logger
+        self.metadata_service = metadata_service
+        self.watch_dir = os.path.expanduser(watch_dir)
+        self.streaming_chunksize = streaming_chunksize
+        self.chunksize = chunksize
+        self.table_name = table_name
+        self.method = method
+        self.load_mode = load_mode
+        self.load_workers = load_workers
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+
+        # Stages run concurrently, so each of them has its own profiler to record its own chunk number
+        self.read_profiler = StageProfiler(logger, profiling_enabled)
+        self.clean_profiler = StageProfiler(logger, profiling_enabled)
+        self.insert_profiler = StageProfiler(logger, profiling_enabled)
+
+        # The files are ingested as one continuous stream, so duplicates are removed across files
+        # and in replace mode only the first chunk of the service replaces the table (and clears the persistent index)
+        if fingerprint_index is not None and load_mode != 'incremental':
+            fingerprint_index.clear()
+        self.etl = ParallelETL(logger, etl_workers, streaming=True, profiler=self.clean_profiler,
+                               key_columns=key_columns, fingerprint_index=fingerprint_index)
+        self.table_replaced = False
+
+        # Files that have been queued, and the size and modification time of the files seen in the last scan
+        self.queued_files = set()
+        self.file_stats = {}
+        self.failed_files = set()
+        self.stopping = None
+
+        # Number of chunks of every file being ingested that have been inserted. They are committed one at a time,
+        # so the chunks of a file inserted before one of its chunks failed stay in the table.
+        self.inserted_chunks = collections.Counter()
+
+
+    def stop(self):
+        """ Stops watching the folder. Files that have already been queued are ingested before the service exits.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        self.logger.info("Ingestion service is stopping")
+        self.stopping.set()
+
+
+    async def run(self):
+        """ Runs the service until it is stopped by stop(), SIGINT or SIGTERM
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        self.stopping = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signal_number, self.stop)
+            except (NotImplementedError, RuntimeError, ValueError):
+                # Signal handlers can only be installed in the main thread and not on Windows
+                pass
+
+        file_queue = asyncio.Queue()
+        read_queue = asyncio.Queue(maxsize=self.queue_size)
+        clean_queue = asyncio.Queue(maxsize=self.queue_size)
+
+        self.logger.info("Ingestion service is watching " + self.watch_dir, extra=CONSOLE)
+
+        # One thread per stage, so that the stages overlap while each of them processes its chunks in order
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            await asyncio.gather(self.watch(file_queue),
+                                 self.read(executor, file_queue, read_queue),
+                                 self.clean(executor, read_queue, clean_queue),
+                                 self.insert(executor, clean_queue))
+
+        self.logger.info("Ingestion service has stopped")
+
+
+    def scan(self):
+        """ Returns the new csv files of the watched folder whose size and modification time have not changed since
+        the previous scan, i.e. files that are no longer being written
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        csv_filenames (Type: str list): Files that are ready to be ingested
+        """
+        ready_files = []
+        file_stats = {}
+        for csv_filename in sorted(glob.glob(os.path.join(self.watch_dir, '*.csv'))):
+            if csv_filename in self.queued_files:
+                continue
+            try:
+                stat = os.stat(csv_filename)
+            except OSError:
+                continue
+            file_stats[csv_filename] = (stat.st_size, stat.st_mtime)
+            if self.file_stats.get(csv_filename) == file_stats[csv_filename]:
+                ready_files.append(csv_filename)
+
+        self.file_stats = file_stats
+        return ready_files
+
+
+    async def watch(self, file_queue):
+        """ Polls the watched folder and queues the csv files that are ready to be ingested """
+        while not self.stopping.is_set():
+            for csv_filename in self.scan():
+                self.logger.info(csv_filename + " has been queued for ingestion")
+                self.queued_files.add(csv_filename)
+                await file_queue.put(csv_filename)
+            try:
+                await asyncio.wait_for(self.stopping.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+        await file_queue.put(None)
+
+
+    async def read(self, executor, file_queue, read_queue):
+        """ Reads the queued files chunk by chunk. A chunk of None marks the end of a file and a file of None the end of the service. """
+        loop = asyncio.get_running_loop()
+        while True:
+            csv_filename = await file_queue.get()
+            if csv_filename is None:
+                await read_queue.put(None)
+                return
+
+            try:
+                if self.streaming_chunksize:
+                    chunks = read_loan_csv(csv_filename, self.logger, self.streaming_chunksize)
+                else:
+                    chunks = iter([await loop.run_in_executor(executor, read_loan_csv, csv_filename, self.logger)])
+
+                for chunk_number in itertools.count():
+                    self.read_profiler.chunk = chunk_number
+                    with self.read_profiler.stage('read_csv') as record:
+                        loan_df = await loop.run_in_executor(executor, next, chunks, None)
+                        record['rows'] = len(loan_df) if loan_df is not None else 0
+                    if loan_df is None:
+                        break
+                    await read_queue.put((csv_filename, chunk_number, loan_df))
+            except (Exception) as e:
+                self.logger.error("Error while reading " + csv_filename + ": " + str(e))
+                self.failed_files.add(csv_filename)
+
+            await read_queue.put((csv_filename, None, None))
+
+
+    async def clean(self, executor, read_queue, clean_queue):
+        """ Cleans and validates the chunks that have been read """
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await read_queue.get()
+            if item is None:
+                await clean_queue.put(None)
+                return
+
+            # Chunks of files that have already failed are passed on without being cleaned. Only cleaned chunks have
+            # a pending batch of fingerprints, which the insert stage commits or discards.
+            csv_filename, chunk_number, loan_df = item
+            rejected_df = None
+            cleaned = False
+            if loan_df is not None and csv_filename not in self.failed_files:
+                try:
+                    self.clean_profiler.chunk = chunk_number
+                    loan_df = await loop.run_in_executor(executor, self.etl.clean_and_validate, loan_df)
+                    cleaned = True
+                    # Chunks are compacted as in the in-memory load of app.py, so that the table gets the same column types
+                    loan_df = await loop.run_in_executor(executor, compact_frame, loan_df)
+                    rejected_df = self.etl.pop_rejected_rows()
+                except (Exception) as e:
+                    self.logger.error("Error while cleaning chunk " + str(chunk_number) + " of " + csv_filename + ": " + str(e))
+                    self.failed_files.add(csv_filename)
+                    self.etl.pop_rejected_rows()
+                    # clean_and_validate queues the pending batch of a chunk last, so only a chunk that failed after it has one.
+                    # The batches are discarded in the order they were queued, so the chunk is passed on for the insert stage to
+                    # discard its batch after the ones of the chunks before it.
+                    if not cleaned:
+                        continue
+
+            await clean_queue.put((csv_filename, chunk_number, loan_df, rejected_df, cleaned))
+
+
+    async def insert(self, executor, clean_queue):
+        """ Inserts the cleaned chunks to DB and moves every ingested file to the processed or failed subfolder """
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await clean_queue.get()
+            if item is None:
+                return
+
+            csv_filename, chunk_number, loan_df, rejected_df, cleaned = item
+            if loan_df is None:
+                await loop.run_in_executor(executor, self.finish_file, csv_filename)
+                continue
+            # The fingerprints of the rows of a chunk are only kept if the chunk has been inserted
+            if csv_filename in self.failed_files:
+                if cleaned:
+                    self.etl.discard_fingerprints()
+                continue
+
+            self.insert_profiler.chunk = chunk_number
+            try:
+                with self.insert_profiler.stage('insert_into_db', rows=len(loan_df)) as record:
+                    record['rejected_rows'] = len(rejected_df)
+                    await loop.run_in_executor(executor, self.insert_chunk, loan_df, rejected_df)
+            except (Exception) as e:
+                self.logger.error("Error while inserting chunk " + str(chunk_number) + " of " + csv_filename + ": " + str(e))
+                self.failed_files.add(csv_filename)
+                self.etl.discard_fingerprints()
+                continue
+            self.etl.commit_fingerprints()
+            self.inserted_chunks[csv_filename] += 1
+            self.logger.info("Chunk " + str(chunk_number) + " of " + csv_filename + " has been cleaned, validated and inserted to DB")
+
+
+    def insert_chunk(self, loan_df, rejected_df):
+        """ Inserts a cleaned chunk to DB and its rejected rows to the quarantine table in a single transaction, see
+        SQLMetadataService.load_chunk. In replace mode the first chunk of the service replaces both tables, the rest are appended to them.
+        Errors are raised to the caller.
+
+        Parameters
+        ----------
+        loan_df (Type: pandas.DataFrame): Cleaned and validated chunk
+        rejected_df (Type: pandas.DataFrame): Rows of the chunk rejected by the validation rules
+
+        Returns
+        -------
+        None
+        """
+        if_exists = 'append' if self.load_mode == 'incremental' or self.table_replaced else 'replace'
+        self.metadata_service.load_chunk(loan_df, rejected_df, self.chunksize, self.table_name, self.method, self.load_mode, if_exists,
+                                         self.load_workers)
+        self.table_replaced = True
+
+
+    def finish_file(self, csv_filename):
+        """ Builds the missing indexes of the table and moves an ingested file out of the watched folder so that it is not ingested again.
+        A failed file can be partially loaded: the chunks inserted before the failure are not rolled back.
+
+        Parameters
+        ----------
+        csv_filename (Type: str): Ingested csv file
+
+        Returns
+        -------
+        None
+        """
+        failed = csv_filename in self.failed_files
+
+        # Tables replaced by the first chunk of the service have no indexes yet
+        try:
+            self.metadata_service.create_indexes(self.table_name)
+        except (Exception) as e:
+            self.logger.error("Error while building the indexes of " + self.table_name + ": " + str(e))
+        self.metadata_service.export_features(self.table_name)
+
+        target_dir = os.path.join(self.watch_dir, FAILED_DIR_NAME if failed else PROCESSED_DIR_NAME)
+        if not os.path.exists(target_dir):
+            os.makedirs(target_dir)
+        shutil.move(csv_filename, os.path.join(target_dir, os.path.basename(csv_filename)))
+
+        self.queued_files.discard(csv_filename)
+        self.failed_files.discard(csv_filename)
+        inserted_chunks = self.inserted_chunks.pop(csv_filename, 0)
+        if failed:
+            self.logger.error(csv_filename + " could not be ingested and has been moved to " + target_dir + ". Its first " +
+                              str(inserted_chunks) + " chunks had been inserted and stay in " + self.table_name)
+        else:
+            self.logger.info(csv_filename + " has been ingested and moved to " + target_dir, extra=CONSOLE)
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+""" Shared fixtures of the test suite. The modules of the application are imported relative to the src folder. """
+
+import logging
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+# Import user-defined libraries
+import app
+from benchmark.generate_data import write_loans_csv
+from configuration import Configuration
+from db.sql_metadata_service import SQLMetadataService
+from etl.ETL import ETL
+from etl.compaction import compact_frame
+from etl.schema import read_loan_csv
+
+# Number of synthetic rows, which include invalid and duplicate rows
+LOAN_ROWS = 2000
+
+# Number of csv rows of every chunk of the streaming loads
+STREAMING_CHUNKSIZE = 300
+
+# Insertion methods the loads are tested with. On SQLite, 'binary' falls back to 'copy', which loads its csv buffer with executemany.
+INSERTION_METHODS = ['copy', 'binary', 'multi']
+
+
+def patch_getters(monkeypatch, configuration, settings):
+    """ Makes every getter of the configuration named in settings return its value """
+    for getter, value in settings.items():
+        monkeypatch.setattr(configuration, getter, lambda value=value: value)
+
+
+@pytest.fixture
+def logger():
+    return logging.getLogger('tests')
+
+
+@pytest.fixture(scope='session')
+def loan_csv(tmp_path_factory):
+    """ Synthetic loan csv file shared by the tests """
+    csv_filename = str(tmp_path_factory.mktemp('data') / 'loan.csv')
+    write_loans_csv(csv_filename, LOAN_ROWS)
+    return csv_filename
+
+
+@pytest.fixture
+def cleaned_frames(loan_csv, logger):
+    """ Cleaned, validated and compacted rows of the synthetic file, and the rows rejected by the validation rules """
+    etl = ETL(logger)
+    loan_df = compact_frame(etl.clean_and_validate(read_loan_csv(loan_csv, logger)))
+    return loan_df, etl.pop_rejected_rows()
+
+
+@pytest.fixture
+def metadata_service(tmp_path, logger):
+    """ Metadata service writing to an SQLite file of the test """
+    return SQLMetadataService('sqlite:///' + str(tmp_path / 'loan.db'), logger)
+
+
+@pytest.fixture(params=INSERTION_METHODS)
+def insertion_method(request):
+    """ Insertion method of the test, which is run once with every method of INSERTION_METHODS """
+    return request.param
+
+
+@pytest.fixture
+def load_configuration(request, monkeypatch, tmp_path, logger):
+    """ Configuration of app.py loading into an SQLite file of the test, without cache, profiling or log file.
+    A test changes the settings it loads with by parametrizing the fixture indirectly with the values of their getters, e.g.
+    @pytest.mark.parametrize('load_configuration', [{'get_load_mode': 'incremental'}], indirect=True)
+    """
+    configuration = Configuration()
+    settings = {
+        'get_db_uri': 'sqlite:///' + str(tmp_path / 'loan.db'),
+        'get_db_table_name': 'loan',
+        'get_insertion_method': 'copy',
+        'get_insertion_chunksize': 1000,
+        'get_load_mode': 'replace',
+        'get_streaming_chunksize': None,
+        'get_out_of_core_memory_mb': None,
+        'get_etl_workers': 1,
+        'get_load_workers': 1,
+        'get_cache_dir': None,
+        'get_dedup_index_file': None,
+        'get_dedup_key_columns': None,
+    }
+    patch_getters(monkeypatch, configuration, {**settings, **getattr(request, 'param', {})})
+
+    monkeypatch.setattr(app, 'configuration', configuration)
+    monkeypatch.setattr(app, 'logger', logger)
+    return configuration
+
+
+@pytest.fixture
+def configure(load_configuration, monkeypatch):
+    """ Returns a function changing the settings of load_configuration between the loads of a test,
+    e.g. configure(get_load_mode='incremental')
+    """
+    return lambda **settings: patch_getters(monkeypatch, load_configuration, settings)
+
+
+@pytest.fixture
+def streaming_configuration(load_configuration, configure):
+    """ Configuration of app.py streaming the files in chunks of STREAMING_CHUNKSIZE rows """
+    configure(get_streaming_chunksize=STREAMING_CHUNKSIZE)
+    return load_configuration
+
+
+@pytest.fixture
+def dedup_index_file(configure, tmp_path):
+    """ File of the persistent fingerprint index of the loads of app.py, to be opened by the test """
+    index_file = str(tmp_path / 'fingerprints.sqlite')
+    configure(get_dedup_index_file=index_file)
+    return index_file
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+""" Batch loads of app.py commit the fingerprints of the loaded rows only once the rows have been inserted,
+replaced tables can be loaded incrementally afterwards, and reloads do not quarantine the same rows twice """
+
+import pandas as pd
+import pytest
+import sqlalchemy
+
+# Import user-defined libraries
+import app
+from db.sql_metadata_service import SQLMetadataService
+from etl.fingerprint_index import FingerprintIndex
+from logger.profiler import StageProfiler
+
+
+def load(csv_filename, logger):
+    app.load(csv_filename, rebuild_cache=False, restart=False, profiler=StageProfiler(logger, enabled=False))
+
+
+def count_rows(configuration, table_name):
+    engine = sqlalchemy.create_engine(configuration.get_db_uri())
+    return pd.read_sql('SELECT COUNT(*) AS n FROM ' + table_name, engine)['n'][0]
+
+
+def test_failed_batch_load_discards_fingerprints(load_configuration, dedup_index_file, loan_csv, logger, monkeypatch, caplog):
+    def fail(*args, **kwargs):
+        raise RuntimeError("injected failure")
+    monkeypatch.setattr(SQLMetadataService, 'load_chunk', fail)
+
+    with caplog.at_level('INFO', logger=logger.name):
+        load(loan_csv, logger)
+
+    assert "DB insertion failed! injected failure" in caplog.text
+    assert "Insertion to DB is completed" not in caplog.text
+    index = FingerprintIndex(dedup_index_file)
+    assert len(index) == 0
+    index.close()
+
+
+def test_successful_batch_load_commits_fingerprints(load_configuration, dedup_index_file, loan_csv, logger):
+    load(loan_csv, logger)
+
+    index = FingerprintIndex(dedup_index_file)
+    assert count_rows(load_configuration, 'loan_quarantine') > 0
+    assert len(index) == count_rows(load_configuration, 'loan')
+    index.close()
+
+
+def test_replaced_table_can_be_loaded_incrementally(load_configuration, configure, loan_csv, logger, insertion_method):
+    configure(get_insertion_method=insertion_method)
+    load(loan_csv, logger)
+    loaded_rows = count_rows(load_configuration, 'loan')
+
+    configure(get_load_mode='incremental')
+    load(loan_csv, logger)
+
+    assert count_rows(load_configuration, 'loan') == loaded_rows
+    assert count_rows(load_configuration, 'loan_row_hash') == loaded_rows
+
+
+def test_reloaded_file_does_not_duplicate_quarantined_rows(load_configuration, configure, loan_csv, logger):
+    load(loan_csv, logger)
+    quarantined_rows = count_rows(load_configuration, 'loan_quarantine')
+    assert quarantined_rows > 0
+
+    configure(get_load_mode='incremental')
+    load(loan_csv, logger)
+    load(loan_csv, logger)
+
+    assert count_rows(load_configuration, 'loan_quarantine') == quarantined_rows
+
+
+@pytest.mark.parametrize('load_configuration', [{'get_load_mode': 'incremental'}], indirect=True)
+def test_incremental_load_with_key_columns_upserts_changed_rows(load_configuration, dedup_index_file, loan_csv, logger, tmp_path, monkeypatch):
+    # The key columns are read by the getter itself, which ignores them in incremental mode
+    monkeypatch.setattr('configuration.DEDUP_KEY_COLUMNS', ['id'])
+    monkeypatch.delattr(load_configuration, 'get_dedup_key_columns')
+    load(loan_csv, logger)
+
+    # The next file holds a changed version of a loaded row, which has the same id
+    engine = sqlalchemy.create_engine(load_configuration.get_db_uri())
+    loan = pd.read_sql('SELECT id, loan_amnt FROM loan ORDER BY id LIMIT 1', engine)
+    loan_id, loan_amnt = int(loan['id'][0]), loan['loan_amnt'][0]
+    raw_df = pd.read_csv(loan_csv, dtype=str, keep_default_na=False)
+    assert (raw_df['id'] == str(loan_id)).any()
+    raw_df.loc[raw_df['id'] == str(loan_id), 'loan_amnt'] = str(loan_amnt + 1)
+    changed_csv = str(tmp_path / 'changed.csv')
+    raw_df.to_csv(changed_csv, index=False)
+    load(changed_csv, logger)
+
+    assert pd.read_sql('SELECT loan_amnt FROM loan WHERE id = ' + str(loan_id), engine)['loan_amnt'][0] == loan_amnt + 1
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+""" The vectorized binary COPY encoder produces the same bytes as a reference encoder writing one field at a time """
+
+import datetime
+import struct
+
+import numpy as np
+import pandas as pd
+import pytest
+import sqlalchemy
+
+# Import user-defined libraries
+from db.binary_copy import HEADER, TRAILER, encode_binary_copy
+from db.sql_metadata_service import SQLMetadata
+
+EPOCH = datetime.datetime(2000, 1, 1)
+
+SQL_TYPES = {
+    'int4': sqlalchemy.types.INT(),
+    'int8': sqlalchemy.types.BIGINT(),
+    'float8': sqlalchemy.types.Float(precision=53),
+    'date': sqlalchemy.types.DATE(),
+    'timestamp': sqlalchemy.types.DATETIME(),
+    'text': sqlalchemy.types.VARCHAR(100),
+    'category': sqlalchemy.types.VARCHAR(100),
+}
+
+
+def encode_field(value, sql_type):
+    """ Encodes a single field with struct, following the description of the binary COPY format """
+    if value is None or pd.isna(value):
+        return struct.pack('>i', -1)
+    if isinstance(sql_type, sqlalchemy.types.BigInteger):
+        data = struct.pack('>q', int(value))
+    elif isinstance(sql_type, sqlalchemy.types.Integer):
+        data = struct.pack('>i', int(value))
+    elif isinstance(sql_type, sqlalchemy.types.Float):
+        data = struct.pack('>d', float(value))
+    elif isinstance(sql_type, sqlalchemy.types.DateTime):
+        delta = pd.Timestamp(value).to_pydatetime() - EPOCH
+        data = struct.pack('>q', (delta.days * 86400 + delta.seconds) * 10 ** 6 + delta.microseconds)
+    elif isinstance(sql_type, sqlalchemy.types.Date):
+        data = struct.pack('>i', (pd.Timestamp(value).to_pydatetime() - EPOCH).days)
+    else:
+        data = str(value).encode('utf-8')
+    return struct.pack('>i', len(data)) + data
+
+
+def encode_reference(df, sql_types):
+    rows = [struct.pack('>h', len(df.columns)) + b''.join(encode_field(value, sql_type) for value, sql_type in zip(row, sql_types))
+            for row in df.astype(object).itertuples(index=False)]
+    return HEADER + b''.join(rows) + TRAILER
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({
+        'int4': pd.array([1, None, -2147483648, 2147483647, 0], dtype='Int32'),
+        'int8': [2 ** 40, -1, 0, 7, 2 ** 62],
+        'float8': [1.5, np.nan, -0.0, 1e300, 0.1],
+        'date': pd.to_datetime(['2015-12-01', None, '1999-12-31', '2000-01-01', '1970-01-01']),
+        'timestamp': pd.to_datetime(['2015-12-01 12:30:00.000001', '1999-12-31 23:59:59', None, '2000-01-01', '2038-01-19 03:14:08']),
+        'text': ['Fully Paid', None, '', 'Crédit à la consommation', 'x' * 300],
+        'category': pd.Categorical(['A', 'B', None, 'A', 'G']),
+    })
+
+
+def test_frame_is_encoded_like_the_reference(frame):
+    sql_types = [SQL_TYPES[col] for col in frame.columns]
+
+    assert encode_binary_copy(frame, sql_types).tobytes() == encode_reference(frame, sql_types)
+
+
+def test_rows_spanning_several_blocks_are_encoded_like_the_reference(frame, monkeypatch):
+    monkeypatch.setattr('db.binary_copy.BLOCK_ROWS', 2)
+    sql_types = [SQL_TYPES[col] for col in frame.columns]
+
+    assert encode_binary_copy(frame, sql_types).tobytes() == encode_reference(frame, sql_types)
+
+
+def test_empty_frame_is_a_header_and_a_trailer(frame):
+    sql_types = [SQL_TYPES[col] for col in frame.columns]
+
+    assert encode_binary_copy(frame.iloc[:0], sql_types).tobytes() == HEADER + TRAILER
+
+
+def test_cleaned_rows_are_encoded_like_the_reference(cleaned_frames):
+    loan_df, _ = cleaned_frames
+    loan_df = loan_df.iloc[:200]
+    sql_types = [SQLMetadata.__table__.c[col].type for col in loan_df.columns]
+
+    assert encode_binary_copy(loan_df, sql_types).tobytes() == encode_reference(loan_df, sql_types)
+
+
+@pytest.mark.parametrize('values, message', [([1.5], 'fractions'), ([2.0 ** 40], 'out of the range')])
+def test_values_not_fitting_an_integer_column_are_rejected(values, message):
+    with pytest.raises(ValueError, match=message):
+        encode_binary_copy(pd.DataFrame({'int4': values}), [SQL_TYPES['int4']])
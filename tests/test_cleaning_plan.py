@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+""" The cleaning rules give the same values as the cleaning methods of ETL they replaced, frozen below as they were,
+except for emp_length, which the previous methods set to 0 for every text value """
+
+import numpy as np
+import pandas as pd
+
+# Import user-defined libraries
+from etl.ETL import ETL
+from etl.cleaning_plan import apply_cleaning_plan, compile_cleaning_plan
+from etl.schema import read_loan_csv
+
+
+def clean_as_before(df):
+    """ Frozen copy of ETL.clean_and_validate as it was before the cleaning rules: check_if_numeric, convert_to_positive,
+    convert_to_date and miscellaneous, applied to the csv file read with pandas' inferred dtypes """
+    numeric_cols = ['loan_amnt', 'funded_amnt', 'funded_amnt_inv', 'int_rate', 'installment',
+                    'emp_length', 'annual_inc', 'dti', 'delinq_2yrs', 'inq_last_6mths', 'mths_since_last_delinq',
+                    'mths_since_last_record', 'open_acc', 'pub_rec', 'revol_bal', 'revol_util', 'total_acc',
+                    'out_prncp', 'out_prncp_inv', 'total_pymnt', 'total_pymnt_inv', 'total_rec_prncp',
+                    'total_rec_int', 'total_rec_late_fee', 'recoveries', 'collection_recovery_fee',
+                    'last_pymnt_amnt', 'policy_code'
+                    ]
+    for col in numeric_cols:
+        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+
+    numeric_columns = df.select_dtypes(exclude=["object"])
+    for col in numeric_columns:
+        df[col] = df[col].apply(lambda x: abs(x))
+
+    date_cols = ['issue_d', 'earliest_cr_line', 'last_credit_pull_d', 'last_pymnt_d', 'next_pymnt_d']
+    for col in date_cols:
+        df[col] = pd.to_datetime(df[col], format='%b-%Y').dt.date
+
+    df = df.replace('n/a', np.nan)
+    df = df.drop_duplicates()
+    df = df.assign(emp_length=df['emp_length'].fillna(value=0).replace(to_replace='10+ years', value='10')
+                   .replace(to_replace='< 1 year', value='0').replace(to_replace='[^0-9]+', value='', regex=True))
+    df = df.assign(term=df['term'].apply(lambda x: x.strip()).apply(lambda x: int(x.split()[0])))
+    df = df.assign(annual_inc=df['annual_inc'].fillna(value=0), verification_status=df['verification_status'].fillna(value='Not Verified'),
+                   delinq_2yrs=df['delinq_2yrs'].fillna(value=0), inq_last_6mths=df['inq_last_6mths'].fillna(value=0))
+    return df[pd.notna(df['member_id'])]
+
+
+def as_comparable(values):
+    """ Converts a column to float64 if it holds numbers or to objects with None for missing values otherwise,
+    dates being datetime64 values """
+    if pd.api.types.is_categorical_dtype(values):
+        values = values.astype(object)
+    if pd.api.types.is_datetime64_any_dtype(values) or values.map(lambda value: hasattr(value, 'isoformat')).any():
+        return pd.to_datetime(values).astype(object).where(pd.notna(values), None)
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        return values.astype(np.float64)
+    return values.astype(object).where(pd.notna(values), None)
+
+
+def test_cleaning_rules_match_previous_cleaning_methods(loan_csv, logger):
+    expected_df = clean_as_before(pd.read_csv(loan_csv, low_memory=False))
+    cleaned_df = ETL(logger).clean(read_loan_csv(loan_csv, logger)).loc[expected_df.index]
+
+    assert list(cleaned_df.columns) == list(expected_df.columns)
+    for col in expected_df.columns:
+        if col == 'emp_length':
+            continue
+        pd.testing.assert_series_equal(as_comparable(cleaned_df[col]), as_comparable(expected_df[col]), check_names=False, obj=col)
+
+    # Every employment length was coerced to 0 before the text was parsed, it is now the number of years
+    raw_emp_length = pd.read_csv(loan_csv, low_memory=False)['emp_length'].loc[expected_df.index]
+    assert (expected_df['emp_length'] == 0).all()
+    expected_emp_length = raw_emp_length.map({'10+ years': 10, '< 1 year': 0, '1 year': 1, **{str(n) + ' years': n for n in range(2, 10)}})
+    np.testing.assert_array_equal(cleaned_df['emp_length'].to_numpy(dtype=np.float64), expected_emp_length.fillna(0).to_numpy(dtype=np.float64))
+
+
+def test_categorical_and_text_columns_are_cleaned_alike(logger):
+    raw_df = pd.DataFrame({
+        'term': [' 36 months', ' 60 months', np.nan, 'n/a'],
+        'emp_length': ['3 years', '10+ years', np.nan, '< 1 year'],
+        'verification_status': ['Verified', np.nan, 'n/a', 'Source Verified'],
+        'grade': ['A', 'n/a', 'B', np.nan],
+    })
+
+    text_df = apply_cleaning_plan(raw_df.copy(), compile_cleaning_plan(raw_df.dtypes), logger)
+    categorical_df = raw_df.astype('category')
+    categorical_df = apply_cleaning_plan(categorical_df, compile_cleaning_plan(categorical_df.dtypes), logger)
+
+    pd.testing.assert_frame_equal(categorical_df.astype(object), text_df.astype(object))
+    assert list(text_df['emp_length']) == [3, 10, 0, 0]
+    assert list(text_df['verification_status']) == ['Verified', 'Not Verified', 'Not Verified', 'Source Verified']
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+
+""" The rows loaded by every insertion method, e.g. COPY (replayed with executemany on SQLite), are the same as the ones loaded by to_sql """
+
+import pandas as pd
+import sqlalchemy
+
+
+def read_table(metadata_service, table_name):
+    """ Returns the rows of a table sorted by all columns, and the declared type of every column. SQLite stores dates and
+    timestamps as text, which is parsed so that "12:30:00" and "12:30:00.000000" are the same value, as on PostgreSQL.
+    """
+    engine = metadata_service.get_engine()
+    types = {col['name']: str(col['type']) for col in sqlalchemy.inspect(engine).get_columns(table_name)}
+    df = pd.read_sql('SELECT * FROM ' + table_name, engine,
+                     parse_dates=[col for col, sql_type in types.items() if sql_type in ('DATE', 'DATETIME')])
+    return df.sort_values(list(df.columns)).reset_index(drop=True), types
+
+
+def test_loan_rows_match_to_sql(metadata_service, cleaned_frames, insertion_method):
+    loan_df, _ = cleaned_frames
+    metadata_service.write_frame(loan_df, 100, 'loan_copy', insertion_method, 'replace')
+    metadata_service.write_frame(loan_df, 100, 'loan_to_sql', None, 'replace')
+
+    copied, copied_types = read_table(metadata_service, 'loan_copy')
+    inserted, inserted_types = read_table(metadata_service, 'loan_to_sql')
+
+    assert len(copied) == len(loan_df)
+    assert copied_types == inserted_types
+    pd.testing.assert_frame_equal(copied, inserted)
+
+
+def test_quarantined_rows_match_to_sql(metadata_service, cleaned_frames, insertion_method):
+    _, rejected_df = cleaned_frames
+    rejected_df = rejected_df.assign(quarantined_at=pd.Timestamp('2020-01-01 12:30:00'))
+    assert len(rejected_df) > 0
+
+    metadata_service.write_frame(rejected_df, 100, 'quarantine_copy', insertion_method, 'replace')
+    metadata_service.write_frame(rejected_df, 100, 'quarantine_to_sql', None, 'replace')
+
+    copied, copied_types = read_table(metadata_service, 'quarantine_copy')
+    inserted, inserted_types = read_table(metadata_service, 'quarantine_to_sql')
+
+    assert copied_types == inserted_types
+    pd.testing.assert_frame_equal(copied, inserted)
+
+
+def test_replaced_loan_table_keeps_model_primary_key(metadata_service, cleaned_frames):
+    loan_df, _ = cleaned_frames
+    metadata_service.write_frame(loan_df, 100, 'loan', 'copy', 'replace')
+
+    inspector = sqlalchemy.inspect(metadata_service.get_engine())
+    assert inspector.get_pk_constraint('loan')['constrained_columns'] == ['id']
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+""" Duplicate rows are dropped by their fingerprints within a chunk, across chunks and, with a persistent index, across loads """
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Import user-defined libraries
+from etl.ETL import ETL
+from etl.fingerprint_index import FingerprintIndex
+from etl.hashing import hash_rows
+from etl.schema import read_loan_csv
+
+
+@pytest.fixture(params=['memory', 'file'])
+def fingerprint_index(request, tmp_path):
+    index = FingerprintIndex(str(tmp_path / 'fingerprints.sqlite') if request.param == 'file' else None)
+    yield index
+    index.close()
+
+
+def test_index_drops_seen_and_repeated_fingerprints(fingerprint_index):
+    fingerprints = np.array([1, 2, 2, 3], dtype=np.uint64)
+    assert list(fingerprint_index.add(fingerprints)) == [True, True, False, True]
+
+    # Pending fingerprints already count as seen
+    assert list(fingerprint_index.add(np.array([3, 4], dtype=np.uint64))) == [False, True]
+
+    fingerprint_index.commit()
+    fingerprint_index.commit()
+    assert len(fingerprint_index) == 4
+    assert list(fingerprint_index.add(np.array([1, 5], dtype=np.uint64))) == [False, True]
+
+
+def test_discarded_fingerprints_are_forgotten(fingerprint_index):
+    fingerprint_index.add(np.array([1, 2], dtype=np.uint64))
+    fingerprint_index.commit()
+    fingerprint_index.add(np.array([3], dtype=np.uint64))
+    fingerprint_index.discard()
+
+    assert len(fingerprint_index) == 2
+    assert list(fingerprint_index.add(np.array([2, 3], dtype=np.uint64))) == [False, True]
+
+
+def test_persistent_index_outlives_the_process(tmp_path):
+    index_file = str(tmp_path / 'fingerprints.sqlite')
+    index = FingerprintIndex(index_file)
+    index.add(np.array([7, 8], dtype=np.uint64))
+    index.commit()
+    index.close()
+
+    index = FingerprintIndex(index_file)
+    assert list(index.add(np.array([8, 9], dtype=np.uint64))) == [False, True]
+    index.close()
+
+
+def test_hash_does_not_depend_on_the_inferred_dtype():
+    text = pd.DataFrame({'id': [1, 2], 'grade': ['A', None], 'note': [None, None]})
+    typed = pd.DataFrame({'id': np.array([1, 2], dtype=np.int32), 'grade': pd.Categorical(['A', None]), 'note': [np.nan, np.nan]})
+
+    np.testing.assert_array_equal(hash_rows(text), hash_rows(typed))
+
+
+def test_streaming_etl_drops_duplicates_across_chunks(loan_csv, logger):
+    batch_df = ETL(logger).clean_and_validate(read_loan_csv(loan_csv, logger))
+
+    etl = ETL(logger, streaming=True)
+    chunks = []
+    for chunk in read_loan_csv(loan_csv, logger, chunksize=300):
+        chunks.append(etl.clean_and_validate(chunk))
+        etl.commit_fingerprints()
+    streamed_df = pd.concat(chunks)
+
+    assert len(streamed_df) == len(batch_df)
+    assert not pd.Series(hash_rows(streamed_df)).duplicated().any()
+    np.testing.assert_array_equal(np.sort(hash_rows(streamed_df)), np.sort(hash_rows(batch_df)))
+
+
+def test_key_columns_keep_the_first_version_of_a_row(logger):
+    df = pd.DataFrame({'id': [1, 2, 1], 'loan_amnt': [100.0, 200.0, 150.0]})
+
+    kept, fingerprints = ETL(logger, key_columns=['id']).remove_duplicates(df)
+
+    assert list(kept['loan_amnt']) == [100.0, 200.0]
+    assert len(fingerprints) == 2
+
+
+def test_fingerprints_of_a_failed_chunk_are_discarded(logger):
+    df = pd.DataFrame({'id': [1, 2], 'loan_amnt': [100.0, 200.0]})
+    etl = ETL(logger, streaming=True)
+
+    assert len(etl.deduplicate_and_validate(df)) == 2
+    etl.discard_fingerprints()
+    assert len(etl.deduplicate_and_validate(df)) == 2
+    etl.commit_fingerprints()
+    assert len(etl.deduplicate_and_validate(df)) == 0
+
+
+def test_corrected_version_of_a_rejected_row_is_kept(logger):
+    etl = ETL(logger, streaming=True, key_columns=['id'])
+
+    assert len(etl.deduplicate_and_validate(pd.DataFrame({'id': [1, 2], 'loan_amnt': [-100.0, 200.0]}))) == 1
+    etl.commit_fingerprints()
+    kept = etl.deduplicate_and_validate(pd.DataFrame({'id': [1, 2], 'loan_amnt': [100.0, 250.0]}))
+
+    assert list(kept['loan_amnt']) == [100.0]
+    np.testing.assert_array_equal(etl.get_pending_fingerprints(), hash_rows(kept[['id']]))
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+
+""" Incremental loads upsert the rows that are new or changed since the rows stored in the table, also after the table has been replaced """
+
+import pandas as pd
+import pytest
+import sqlalchemy
+
+
+def read_loan_amounts(metadata_service):
+    return pd.read_sql('SELECT id, loan_amnt FROM loan', metadata_service.get_engine()).set_index('id')['loan_amnt']
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_incremental_load_after_replace_load_updates_rows_changed_by_it(metadata_service, cleaned_frames, insertion_method, workers):
+    a_df, rejected_df = cleaned_frames
+    no_rejected_df = rejected_df.iloc[:0]
+    b_df = a_df.copy()
+    b_df.loc[b_df.index[0], 'loan_amnt'] += 1
+    changed_id = b_df['id'].iloc[0]
+
+    metadata_service.initialize_metadata_source()
+    metadata_service.load_chunk(a_df, no_rejected_df, 1000, 'loan', insertion_method, 'incremental')
+    metadata_service.load_chunk(b_df, no_rejected_df, 1000, 'loan', insertion_method, 'replace', 'replace', workers)
+    assert read_loan_amounts(metadata_service)[changed_id] == b_df['loan_amnt'].iloc[0]
+
+    # The replaced table no longer holds the rows of a.csv, whose hashes must not be compared with the ones of a.csv again
+    metadata_service.load_chunk(a_df, no_rejected_df, 1000, 'loan', insertion_method, 'incremental')
+
+    loan_amounts = read_loan_amounts(metadata_service)
+    assert loan_amounts[changed_id] == a_df['loan_amnt'].iloc[0]
+    assert len(loan_amounts) == len(a_df)
+
+
+def test_replace_load_drops_stored_row_hashes(metadata_service, cleaned_frames):
+    loan_df, rejected_df = cleaned_frames
+    metadata_service.initialize_metadata_source()
+    metadata_service.load_chunk(loan_df, rejected_df.iloc[:0], 1000, 'loan', 'copy', 'incremental')
+    assert len(pd.read_sql('SELECT * FROM loan_row_hash', metadata_service.get_engine())) == len(loan_df)
+
+    metadata_service.write_frame(loan_df, 1000, 'loan', 'copy', 'replace')
+
+    assert not sqlalchemy.inspect(metadata_service.get_engine()).has_table('loan_row_hash')
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+
+""" The ingestion service discards the fingerprints of chunks that could not be cleaned or inserted, in the order they were queued,
+and reports how many chunks of a failed file stay in the table """
+
+import asyncio
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+# Import user-defined libraries
+from etl.compaction import compact_frame
+from service.ingestion_service import FAILED_DIR_NAME, IngestionService
+
+# Number of csv rows of every chunk, and the chunk that can not be compacted
+STREAMING_CHUNKSIZE = 300
+FAILED_CHUNK = 2
+
+
+async def ingest(service, csv_filenames):
+    """ Runs the read, clean and insert stages of the service on the given files instead of watching its folder """
+    file_queue = asyncio.Queue()
+    for csv_filename in csv_filenames + [None]:
+        file_queue.put_nowait(csv_filename)
+    read_queue = asyncio.Queue(maxsize=1)
+    clean_queue = asyncio.Queue(maxsize=1)
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        await asyncio.gather(service.read(executor, file_queue, read_queue), service.clean(executor, read_queue, clean_queue),
+                             service.insert(executor, clean_queue))
+
+
+def test_chunk_failing_after_validation_does_not_leave_fingerprints_behind(metadata_service, loan_csv, logger, tmp_path, monkeypatch,
+                                                                            caplog):
+    csv_filename = str(tmp_path / 'loan.csv')
+    shutil.copy(loan_csv, csv_filename)
+    service = IngestionService(logger, metadata_service, str(tmp_path), STREAMING_CHUNKSIZE, etl_workers=1, chunksize=1000,
+                               table_name='loan', method='copy', load_mode='replace', load_workers=1, poll_interval=0, queue_size=1,
+                               profiling_enabled=False)
+
+    calls = []
+
+    def fail_at_chunk(df):
+        calls.append(None)
+        if len(calls) > FAILED_CHUNK:
+            raise MemoryError("injected failure")
+        return compact_frame(df)
+    monkeypatch.setattr('service.ingestion_service.compact_frame', fail_at_chunk)
+
+    with caplog.at_level('INFO', logger=logger.name):
+        asyncio.run(ingest(service, [csv_filename]))
+
+    loaded_rows = len(pd.read_sql('SELECT id FROM loan', metadata_service.get_engine()))
+    assert loaded_rows > 0
+    assert len(service.etl.fingerprint_index.pending) == 0
+    assert len(service.etl.fingerprint_index) == loaded_rows
+    # The chunks cleaned before the failing one are no longer inserted once the file has failed
+    inserted_chunks = caplog.text.count("has been cleaned, validated and inserted to DB")
+    assert 0 < inserted_chunks <= FAILED_CHUNK
+    assert "Its first " + str(inserted_chunks) + " chunks had been inserted and stay in loan" in caplog.text
+    assert os.path.exists(os.path.join(str(tmp_path), FAILED_DIR_NAME, 'loan.csv'))
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+""" Warnings logged by the worker processes of the parallel and out-of-core ETL are rate limited like the ones of the parent process """
+
+import logging
+import queue
+
+import pytest
+
+# Import user-defined libraries
+from logger.logger import get_logger, start_worker_logging, stop_logging
+
+# Number of warnings logged from the same line of code per period
+MAX_MESSAGES = 2
+
+
+class ListHandler(logging.Handler):
+    """ Keeps the messages it handles """
+
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+@pytest.fixture
+def rate_limited_logger():
+    logger = get_logger(logging.INFO, logs_rate_limit=(MAX_MESSAGES, 60))
+    handler = ListHandler()
+    logger.addHandler(handler)
+    yield logger, handler
+
+    stop_logging()
+    for log_filter in list(logger.filters):
+        logger.removeFilter(log_filter)
+    for log_handler in list(logger.handlers):
+        logger.removeHandler(log_handler)
+
+
+def test_worker_warnings_are_rate_limited(rate_limited_logger):
+    logger, handler = rate_limited_logger
+    log_queue = queue.Queue()
+
+    listener = start_worker_logging(logger, log_queue)
+    for number in range(5):
+        log_queue.put(logging.LogRecord('etl.parallel_etl', logging.WARNING, 'parallel_etl.py', 42, "Bad value " + str(number), None, None))
+    listener.stop()
+
+    assert handler.messages == ["Bad value 0", "Bad value 1"]
+    stop_logging()
+    assert handler.messages[-1] == "Bad value 4 (3 similar messages were suppressed)"
+
+
+def test_worker_info_messages_are_not_rate_limited(rate_limited_logger):
+    logger, handler = rate_limited_logger
+    log_queue = queue.Queue()
+
+    listener = start_worker_logging(logger, log_queue)
+    for number in range(5):
+        log_queue.put(logging.LogRecord('etl.parallel_etl', logging.INFO, 'parallel_etl.py', 42, "Partition " + str(number), None, None))
+    listener.stop()
+
+    assert len(handler.messages) == 5
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+
+""" Partitions cleaned in worker processes are handed back as Arrow buffers and converted to a single dataframe once """
+
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+# Import user-defined libraries
+from etl.ETL import ETL
+from etl.parallel_etl import ParallelETL, concat_serialized_frames, read_serialized_table, serialize_frame
+from etl.schema import read_loan_csv
+
+
+def test_parallel_etl_matches_a_single_process(loan_csv, logger):
+    loan_df = read_loan_csv(loan_csv, logger)
+
+    expected = ETL(logger).clean_and_validate(loan_df.copy())
+    cleaned = ParallelETL(logger, workers=2).clean_and_validate(loan_df.copy())
+
+    pd.testing.assert_frame_equal(cleaned, expected)
+
+
+def test_partitions_are_not_copied_through_pandas(loan_csv, logger):
+    loan_df = read_loan_csv(loan_csv, logger)
+    serialized_frames = [serialize_frame(ETL(logger).clean(partition.copy())) for partition in np.array_split(loan_df, 4)]
+
+    tracemalloc.start()
+    try:
+        df = concat_serialized_frames(serialized_frames)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    pd.testing.assert_frame_equal(df, pd.concat([read_serialized_table(serialized).to_pandas() for serialized in serialized_frames]))
+
+    # Converting every partition and concatenating the dataframes allocates more than the size of the result.
+    # Arrow allocates the numeric blocks of a single conversion, so only the text values are allocated by Python.
+    assert peak < 0.6 * df.memory_usage(deep=True).sum()
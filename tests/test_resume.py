@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+""" Interrupted streaming loads of app.py are resumed after their last committed chunk, or started over with --restart,
+and end with the same rows as an uninterrupted load. The fingerprints of the chunk that failed are discarded. """
+
+import pandas as pd
+import pytest
+import sqlalchemy
+
+# Import user-defined libraries
+import app
+from db.sql_metadata_service import SQLMetadataService
+from logger.profiler import StageProfiler
+
+# Chunk whose load fails
+FAILED_CHUNK = 3
+
+
+def load(csv_filename, logger, restart=False):
+    app.load(csv_filename, rebuild_cache=False, restart=restart, profiler=StageProfiler(logger, enabled=False))
+
+
+def read_table(db_uri, table_name, sort_column):
+    engine = sqlalchemy.create_engine(db_uri)
+    return pd.read_sql_table(table_name, engine).drop(columns=['quarantined_at'], errors='ignore') \
+        .sort_values(sort_column).reset_index(drop=True)
+
+
+@pytest.fixture
+def uninterrupted_db_uri(streaming_configuration, configure, loan_csv, logger, tmp_path):
+    """ Database loaded from the synthetic file without interruption """
+    db_uri = 'sqlite:///' + str(tmp_path / 'uninterrupted.db')
+    test_db_uri = streaming_configuration.get_db_uri()
+    configure(get_db_uri=db_uri)
+    load(loan_csv, logger)
+    configure(get_db_uri=test_db_uri)
+    return db_uri
+
+
+def interrupt_load(loan_csv, logger, monkeypatch):
+    """ Loads the synthetic file until the load of FAILED_CHUNK fails, and returns the number of chunks loaded before """
+    load_chunk = SQLMetadataService.load_chunk
+    calls = []
+
+    def fail_at_chunk(self, *args, **kwargs):
+        calls.append(None)
+        if len(calls) > FAILED_CHUNK:
+            raise RuntimeError("injected failure")
+        return load_chunk(self, *args, **kwargs)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(SQLMetadataService, 'load_chunk', fail_at_chunk)
+        load(loan_csv, logger)
+
+    return len(calls) - 1
+
+
+@pytest.mark.parametrize('restart', [False, True])
+def test_interrupted_load_ends_with_the_rows_of_an_uninterrupted_load(streaming_configuration, uninterrupted_db_uri, loan_csv, logger,
+                                                                      monkeypatch, caplog, restart):
+    db_uri = streaming_configuration.get_db_uri()
+    assert interrupt_load(loan_csv, logger, monkeypatch) == FAILED_CHUNK
+    assert len(read_table(db_uri, 'load_checkpoint', 'chunk_start')) == FAILED_CHUNK
+
+    with caplog.at_level('INFO', logger=logger.name):
+        load(loan_csv, logger, restart=restart)
+
+    resumed_rows = FAILED_CHUNK * streaming_configuration.get_streaming_chunksize()
+    resumed = "Resuming the interrupted load of " + loan_csv + " after its first " + str(resumed_rows) + " rows"
+    assert (resumed in caplog.text) != restart
+    for table_name, sort_column in [('loan', 'id'), ('loan_quarantine', 'row_hash')]:
+        pd.testing.assert_frame_equal(read_table(db_uri, table_name, sort_column), read_table(uninterrupted_db_uri, table_name, sort_column))
+    assert read_table(db_uri, 'load_checkpoint', 'chunk_start').empty
+
+
+def test_failed_chunk_does_not_leave_fingerprints_behind(streaming_configuration, loan_csv, logger, monkeypatch):
+    etls = []
+    stream_csv_into_db = app.stream_csv_into_db
+
+    def keep_etl(chunks, etl, *args):
+        etls.append(etl)
+        return stream_csv_into_db(chunks, etl, *args)
+    monkeypatch.setattr(app, 'stream_csv_into_db', keep_etl)
+
+    interrupt_load(loan_csv, logger, monkeypatch)
+
+    assert len(etls[0].fingerprint_index.pending) == 0
+    assert len(etls[0].fingerprint_index) == len(read_table(streaming_configuration.get_db_uri(), 'loan', 'id'))
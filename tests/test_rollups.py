@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+""" The rollup tables hold the counts and sums of the loan table, also after rows have been updated by incremental loads """
+
+import numpy as np
+import pandas as pd
+
+# Import user-defined libraries
+from etl.rollups import ROLLUP_DIMENSIONS, ROLLUP_MEASURES, compute_rollups, subtract_rollups
+
+
+def sort_rollup(rollup, name):
+    columns = ROLLUP_DIMENSIONS[name] + ['loan_count'] + [measure + '_sum' for measure in ROLLUP_MEASURES]
+    return rollup[columns].sort_values(ROLLUP_DIMENSIONS[name]).reset_index(drop=True)
+
+
+def test_rollups_match_group_by(cleaned_frames):
+    loan_df, _ = cleaned_frames
+    df = loan_df.assign(issue_year=pd.to_datetime(loan_df['issue_d']).dt.year.fillna(0).astype('int64'),
+                        grade=loan_df['grade'].astype(object).fillna(''))
+
+    rollup = compute_rollups(loan_df)['year_grade']
+    expected = df.groupby(['issue_year', 'grade']).agg(loan_count=('id', 'size'),
+                                                       **{m + '_sum': (m, 'sum') for m in ROLLUP_MEASURES}).reset_index()
+
+    assert rollup['loan_count'].sum() == len(loan_df)
+    pd.testing.assert_frame_equal(sort_rollup(rollup, 'year_grade'), sort_rollup(expected, 'year_grade'), check_dtype=False)
+
+
+def test_subtracted_rollups_equal_rollups_of_remaining_rows(cleaned_frames):
+    loan_df, _ = cleaned_frames
+    removed_df = loan_df.iloc[::3]
+
+    differences = subtract_rollups(compute_rollups(loan_df), compute_rollups(removed_df))
+    expected = compute_rollups(loan_df.drop(removed_df.index))
+
+    for name in ROLLUP_DIMENSIONS:
+        difference = differences[name][differences[name]['loan_count'] > 0]
+        pd.testing.assert_frame_equal(sort_rollup(difference, name), sort_rollup(expected[name], name), check_dtype=False)
+
+
+def test_rollup_tables_follow_incremental_updates(metadata_service, cleaned_frames, insertion_method):
+    loan_df, rejected_df = cleaned_frames
+    metadata_service.load_chunk(loan_df, rejected_df, 1000, 'loan', insertion_method, 'replace', 'replace')
+
+    # Every fifth loan is updated, moving it to another grade and year, and every seventh loan is new
+    updated_df = loan_df.iloc[::5].copy()
+    updated_df['loan_amnt'] = updated_df['loan_amnt'] + 100
+    updated_df['grade'] = np.where(updated_df['grade'].astype(object) == 'A', 'B', 'A')
+    updated_df['issue_d'] = pd.to_datetime(updated_df['issue_d']) - pd.DateOffset(years=1)
+    new_df = loan_df.iloc[::7].copy()
+    new_df['id'] = new_df['id'] + 10 ** 9
+    new_df['member_id'] = new_df['member_id'] + 10 ** 9
+    metadata_service.load_chunk(pd.concat([updated_df, new_df]), rejected_df.iloc[:0], 1000, 'loan', insertion_method, 'incremental')
+
+    final_df = pd.read_sql_table('loan', metadata_service.engine)
+    assert len(final_df) == len(loan_df) + len(new_df)
+    expected = compute_rollups(final_df)
+    for name in ROLLUP_DIMENSIONS:
+        pd.testing.assert_frame_equal(sort_rollup(metadata_service.get_rollup('loan', name), name), sort_rollup(expected[name], name),
+                                      check_dtype=False)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+""" Rows failing a validation rule are rejected with the reason codes of every rule they fail, and counted per rule """
+
+import numpy as np
+import pandas as pd
+
+# Import user-defined libraries
+from etl.validation import REASON_CODES_COLUMN, compile_validation_rules, validate_frame
+
+
+def test_rejected_rows_carry_every_reason_code():
+    df = pd.DataFrame({
+        'loan_amnt': [1000.0, -5.0, 2000.0, 3000.0],
+        'funded_amnt': [1000.0, 10.0, 2500.0, 3000.0],
+        'int_rate': [10.0, 150.0, 12.0, 15.0],
+        'term': [36, 36, 48, 60],
+        'grade': ['A', 'B', 'C', 'H'],
+    })
+
+    valid_df, rejected_df, violation_counts = validate_frame(df, compile_validation_rules(df.columns))
+
+    assert list(valid_df.index) == [0]
+    assert list(rejected_df[REASON_CODES_COLUMN]) == [
+        'loan_amnt_not_positive,int_rate_out_of_range,funded_amnt_above_loan_amnt',
+        'term_not_allowed,funded_amnt_above_loan_amnt',
+        'grade_not_allowed',
+    ]
+    assert violation_counts == {'loan_amnt_not_positive': 1, 'int_rate_out_of_range': 1, 'term_not_allowed': 1,
+                                'grade_not_allowed': 1, 'funded_amnt_above_loan_amnt': 2}
+
+
+def test_columns_that_are_not_nullable_in_the_model_are_required():
+    df = pd.DataFrame({'member_id': [1.0, np.nan], 'emp_title': [None, None]})
+
+    valid_df, rejected_df, violation_counts = validate_frame(df, compile_validation_rules(df.columns))
+
+    assert len(valid_df) == 1
+    assert list(rejected_df[REASON_CODES_COLUMN]) == ['missing_member_id']
+    assert violation_counts == {'missing_member_id': 1}
+
+
+def test_valid_frame_is_passed_on_without_rejected_rows():
+    df = pd.DataFrame({'loan_amnt': [1000.0], 'grade': ['A']})
+
+    valid_df, rejected_df, violation_counts = validate_frame(df, compile_validation_rules(df.columns))
+
+    assert valid_df is df
+    assert rejected_df.empty and REASON_CODES_COLUMN in rejected_df.columns
+    assert violation_counts == {}
+
+
+def test_synthetic_file_splits_into_valid_and_rejected_rows(cleaned_frames):
+    loan_df, rejected_df = cleaned_frames
+
+    assert len(rejected_df) > 0
+    assert rejected_df[REASON_CODES_COLUMN].str.len().gt(0).all()
+    assert set(loan_df['id']).isdisjoint(set(rejected_df['id']))
+    assert validate_frame(loan_df, compile_validation_rules(loan_df.columns))[1].empty